@@ -1,5 +1,11 @@
 # /bin/bash
 
+# compile the cities of the geocoding cache
+poetry run compile_cities
+
+# compile the reference data (ROME, NAF, OGR...)
+poetry run compile_reference_data
+
 # create the index in elastic search
 poetry run create_index --full
 
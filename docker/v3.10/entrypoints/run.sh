@@ -16,5 +16,11 @@ if [ ! -z "$(ls -A /sql)" ]; then
     done
 fi;
 
+# compile the cities of the geocoding cache, shared by the workers
+poetry run compile_cities
+
+# compile the reference data (ROME, NAF, OGR...) loaded when importing the app
+poetry run compile_reference_data
+
 # run the server
 poetry run gunicorn --config python:labonneboite.wsgi-conf labonneboite.web.app:app
\ No newline at end of file
@@ -0,0 +1,35 @@
+"""
+add_index_high_water_marks
+
+Revision ID: 5b3c1f2e9a7d
+Revises: 66af73e521cb
+Create Date: 2026-10-18 10:12:41.207316
+"""
+from alembic import op
+
+import sqlalchemy as sa
+from sqlalchemy.dialects import mysql
+
+# Revision identifiers, used by Alembic.
+revision = '5b3c1f2e9a7d'
+down_revision = '66af73e521cb'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('index_high_water_marks',
+                    sa.Column('id', mysql.INTEGER(display_width=11), autoincrement=True, nullable=False),
+                    sa.Column('table_name', mysql.VARCHAR(collation='utf8mb4_unicode_ci', length=191), nullable=False),
+                    sa.Column('high_water_mark', mysql.DATETIME(), nullable=False),
+                    sa.Column('date_updated', mysql.DATETIME(), nullable=False),
+                    sa.PrimaryKeyConstraint('id'),
+                    sa.UniqueConstraint('table_name'),
+                    mysql_collate='utf8mb4_unicode_ci',
+                    mysql_default_charset='utf8mb4',
+                    mysql_engine='InnoDB'
+                    )
+
+
+def downgrade():
+    op.drop_table('index_high_water_marks')
@@ -1,12 +1,27 @@
 from functools import lru_cache
+import re
+import unicodedata
+from typing import Dict, List, Tuple
+
+import numpy as np
 from slugify import slugify
 import unidecode
 from labonneboite.common.es import Elasticsearch
 from labonneboite.common.conf import settings
+from labonneboite.common.load_data import load_ogr_labels, load_ogr_rome_mapping
 
 MAX_JOBS = 10
 MAX_LOCATIONS = 10
 
+# Same as the `edge_ngram_filter` of the ES index: longer words are matched by their first characters.
+MAX_PREFIX_LENGTH = 20
+
+# Words of job labels that are not indexed, as the `stop_francais` and `elision` filters of the ES index do.
+FRENCH_STOP_WORDS = {
+    'a', 'au', 'aux', 'c', 'd', 'de', 'des', 'du', 'en', 'et', 'j', 'l', 'la', 'le', 'les', 'm', 'n', 'ou',
+    'par', 'pour', 'qu', 's', 'sur', 't', 'un', 'une',
+}
+
 # This file is a fallback which uses ES, we normally use the "address API" from beta.gouv.fr
 
 
@@ -111,10 +126,184 @@ def enrich_job_term_with_thesaurus(term):
     return term
 
 
+def get_words(text: str) -> List[str]:
+    """
+    Accent-folded, lowercase words of the given text, without stop words.
+    Accents are removed by Unicode decomposition, much faster than `unidecode` on the whole job labels.
+    """
+    text = text.lower().replace('œ', 'oe').replace('æ', 'ae')
+    text = unicodedata.normalize('NFKD', text).encode('ascii', 'ignore').decode('ascii')
+    words = re.findall(r'[a-z0-9]+', text)
+    return [word[:MAX_PREFIX_LENGTH] for word in words if word not in FRENCH_STOP_WORDS]
+
+
+class JobLabelIndex(object):
+    """
+    In-memory autocomplete index of job labels: OGR labels along with the label of their ROME.
+
+    Every prefix of every word of a job label is mapped to the sorted positions of the job labels that
+    contain it, and to their weights (an edge-ngram index, i.e. a flattened prefix trie). The weight of a
+    prefix for a job label mimics the TF-IDF of ES:
+
+        idf(prefix) * len(prefix) / len(shortest word starting with prefix) / sqrt(number of words)
+
+    so that complete words score higher than the beginning of longer words, and short labels higher than
+    long ones. A job label scores the sum of the weights of the searched words it contains, multiplied by
+    the fraction of the searched words it contains. ROMEs are ranked by the score of their best job label.
+    """
+
+    def __init__(self, job_labels: List[Dict[str, str]]) -> None:
+        """
+        `job_labels` are dicts with the `ogr_description`, `rome_code` and `rome_description` keys, as the
+        `ogr` documents of ES.
+        """
+        self.job_labels = job_labels
+        rome_codes = sorted({job_label['rome_code'] for job_label in job_labels})
+        rome_indexes = {rome_code: index for index, rome_code in enumerate(rome_codes)}
+        self.job_label_romes = np.array([rome_indexes[job_label['rome_code']] for job_label in job_labels],
+                                        dtype=np.int64)
+        # Occupation slugs are computed once per ROME
+        rome_descriptions = {job_label['rome_code']: job_label['rome_description'] for job_label in job_labels}
+        self.occupations = {
+            rome_code: slugify(rome_description.lower())
+            for rome_code, rome_description in rome_descriptions.items()
+        }
+
+        # (job label, word) pairs
+        word_ids: Dict[str, int] = {}
+        pair_positions = []
+        pair_words = []
+        word_counts = np.ones(len(job_labels), dtype=np.float64)
+        for position, job_label in enumerate(job_labels):
+            words = get_words(job_label['ogr_description'] + ' ' + job_label['rome_description'])
+            word_counts[position] = max(len(words), 1)
+            for word in set(words):
+                pair_positions.append(position)
+                pair_words.append(word_ids.setdefault(word, len(word_ids)))
+
+        # Job labels of each word, CSR-like
+        pair_positions = np.array(pair_positions, dtype=np.int64)
+        pair_words = np.array(pair_words, dtype=np.int64)
+        order = np.lexsort((pair_positions, pair_words))
+        word_positions = pair_positions[order]
+        word_sizes = np.bincount(pair_words, minlength=len(word_ids))
+        word_starts = np.cumsum(word_sizes) - word_sizes
+
+        # (word, prefix) pairs
+        self.prefix_ids: Dict[str, int] = {}
+        prefix_words = []
+        prefix_ids = []
+        prefix_coverages = []
+        for word, word_id in word_ids.items():
+            for length in range(1, len(word) + 1):
+                prefix_words.append(word_id)
+                prefix_ids.append(self.prefix_ids.setdefault(word[:length], len(self.prefix_ids)))
+                prefix_coverages.append(length / len(word))
+        prefix_words = np.array(prefix_words, dtype=np.int64)
+
+        # (prefix, job label, coverage) entries, keeping the best coverage of each (prefix, job label)
+        sizes = word_sizes[prefix_words]
+        entry_pairs = np.repeat(np.arange(len(prefix_words)), sizes)
+        entry_positions = word_positions[
+            np.arange(sizes.sum()) + np.repeat(word_starts[prefix_words] - (np.cumsum(sizes) - sizes), sizes)]
+        entry_prefixes = np.array(prefix_ids, dtype=np.int64)[entry_pairs]
+        entry_coverages = np.array(prefix_coverages, dtype=np.float64)[entry_pairs]
+        order = np.lexsort((-entry_coverages, entry_positions, entry_prefixes))
+        entry_prefixes = entry_prefixes[order]
+        entry_positions = entry_positions[order]
+        entry_coverages = entry_coverages[order]
+        best = np.ones(len(order), dtype=bool)
+        best[1:] = (entry_prefixes[1:] != entry_prefixes[:-1]) | (entry_positions[1:] != entry_positions[:-1])
+
+        # Postings of each prefix, sorted by job label position
+        self.positions = entry_positions[best]
+        prefix_sizes = np.bincount(entry_prefixes[best], minlength=len(self.prefix_ids))
+        self.offsets = np.zeros(len(self.prefix_ids) + 1, dtype=np.int64)
+        np.cumsum(prefix_sizes, out=self.offsets[1:])
+        idfs = np.log(1 + len(job_labels) / np.maximum(prefix_sizes, 1))
+        self.weights = idfs[entry_prefixes[best]] * entry_coverages[best] / np.sqrt(word_counts[self.positions])
+
+    def get_scores(self, term: str) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Return the positions of the job labels matching the term, sorted, and their scores.
+        """
+        words = get_words(term)
+        postings = [(self.offsets[prefix_id], self.offsets[prefix_id + 1])
+                    for prefix_id in [self.prefix_ids.get(word) for word in words] if prefix_id is not None]
+        if not postings:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float64)
+        if len(words) == 1:
+            start, end = postings[0]
+            return self.positions[start:end], self.weights[start:end]
+        positions, inverse = np.unique(
+            np.concatenate([self.positions[start:end] for start, end in postings]), return_inverse=True)
+        weights = np.concatenate([self.weights[start:end] for start, end in postings])
+        return positions, np.bincount(inverse, weights=weights) * np.bincount(inverse) / len(words)
+
+    def suggest(self, term: str, size: int = MAX_JOBS) -> List[Dict]:
+        """
+        Return the suggestions of `build_job_label_suggestions` for the given term: the best job label of
+        the `size` best ROMEs.
+        """
+        positions, scores = self.get_scores(term)
+        # Best job labels first; on equal scores, job labels keep their order.
+        order = np.argsort(-scores, kind='stable')
+        positions = positions[order]
+        scores = scores[order]
+        # Best job label of each ROME, in the order of job labels
+        _, firsts = np.unique(self.job_label_romes[positions], return_index=True)
+        firsts = np.sort(firsts)[:size]
+
+        suggestions = []
+        for position, score in zip(positions[firsts].tolist(), scores[firsts].tolist()):
+            job_label = self.job_labels[position]
+            label = "%s (%s, ...)" % (job_label['rome_description'], job_label['ogr_description'])
+            suggestions.append({
+                'id': job_label['rome_code'],
+                'label': label,
+                'value': label,
+                'occupation': self.occupations[job_label['rome_code']],
+                'score': round(score, 1),
+            })
+        return suggestions
+
+
+def get_job_labels() -> List[Dict[str, str]]:
+    """
+    Job labels, as indexed in the ES `ogr` documents by `create_index.create_job_codes`.
+    """
+    ogr_rome_codes = load_ogr_rome_mapping()
+    return [{
+        'ogr_code': ogr,
+        'ogr_description': description,
+        'rome_code': ogr_rome_codes[ogr],
+        'rome_description': settings.ROME_DESCRIPTIONS[ogr_rome_codes[ogr]],
+    } for ogr, description in load_ogr_labels().items() if ogr in ogr_rome_codes]
+
+
+@lru_cache(maxsize=None)
+def get_job_label_index() -> JobLabelIndex:
+    return JobLabelIndex(get_job_labels())
+
+
 @lru_cache(maxsize=8 * 1024)
 def build_job_label_suggestions(term, size=MAX_JOBS):
+    """
+    Suggestions are found in memory (see `JobLabelIndex`), unless `JOB_AUTOCOMPLETE_IN_MEMORY` is disabled.
+    ES is used as a fallback when no job label starts with the searched words: its ngrams also match
+    the middle of words.
+    """
     term = enrich_job_term_with_thesaurus(term)
 
+    if settings.JOB_AUTOCOMPLETE_IN_MEMORY:
+        suggestions = get_job_label_index().suggest(term, size)
+        if suggestions:
+            return suggestions
+
+    return build_job_label_suggestions_from_es(term, size)
+
+
+def build_job_label_suggestions_from_es(term, size=MAX_JOBS):
     es = Elasticsearch()
 
     body = {
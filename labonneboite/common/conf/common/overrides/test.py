@@ -15,6 +15,12 @@ DB_USER = os.environ.get('DB_USER', 'lbb_test')
 DB_PASSWORD = os.environ.get('DB_PASSWORD', '')
 REDIS_HOST = 'incorrecthost'
 
+# Tests index and search offices over and over again
+SEARCH_CACHE_ENABLED = False
+GEOCODING_CACHE_ENABLED = False
+# Tests index their own job labels in Elasticsearch
+JOB_AUTOCOMPLETE_IN_MEMORY = False
+
 LOG_LEVEL_USER_ACTIVITY = logging.ERROR
 
 ENABLE_TIMEIT_TIMERS = False
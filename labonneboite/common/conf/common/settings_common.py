@@ -138,6 +138,17 @@ ES_INDEX = "labonneboite"
 # Set ES_TIMEOUT environment variable to 0 to remove ES timeouts entirely
 ES_TIMEOUT = int(os.environ.get("ES_TIMEOUT", 10)) or None
 ES_HOST = os.environ.get("ES_HOST", "localhost:9200")
+# Route office documents to shards by departement (see `es.get_office_routing`), so that searches only query
+# the shards of the departements around them. Offices must be reindexed (`create_index --full`) after changing it.
+ES_OFFICES_ROUTED_BY_DEPARTEMENT = False
+# Number of shards of the indexes whose offices are routed by departement
+ES_ROUTED_INDEX_SHARDS = 24
+# Searches are routed to the departements whose cities are within their distance plus this margin
+ES_ROUTING_MARGIN_KM = 10
+# Declare the scores by ROME of offices as doc values fields instead of mapping them dynamically, and filter
+# searches on the ROME codes of offices (see `es.add_rome_codes`). Offices must be reindexed after changing it.
+# Experimental: not validated against Elasticsearch 1.7 yet, run the `rome_scores_schema` benchmark before enabling it.
+ES_EXPLICIT_ROME_SCORES_MAPPING = False
 DB_HOST = os.environ.get("DB_HOST", "localhost")
 DB_PORT = os.environ.get("DB_PORT", 3306)
 DB_NAME = os.environ.get("DB_NAME", "labonneboite")
@@ -145,6 +156,27 @@ DB_USER = os.environ.get("DB_USER", "labonneboite")
 DB_PASSWORD = os.environ.get("DB_PASSWORD", "labonneboite")
 OFFICE_TABLE = os.environ.get("OFFICE_TABLE", "etablissements")
 
+# Cache of search results, see labonneboite/common/search_cache.py
+SEARCH_CACHE_ENABLED = True
+SEARCH_CACHE_MAXSIZE = 2048
+# Coordinates are rounded to this number of decimals in cache keys (4 decimals ~ 10 meters)
+SEARCH_CACHE_COORDINATES_PRECISION = 4
+# The index behind the ES alias is part of cache keys: workers look it up at most once per interval (in seconds)
+SEARCH_CACHE_INDEX_CHECK_INTERVAL = 60
+# Share the search and geocoding caches of all processes (web workers, `create_index`...) in this Redis server,
+# e.g. "redis://localhost:6379/0" (requires redis-py). Each process has its own in-memory caches otherwise.
+CACHE_REDIS_URL = os.environ.get("CACHE_REDIS_URL")
+
+# Suggest job labels from an in-memory index (see `autocomplete.JobLabelIndex`) instead of Elasticsearch
+JOB_AUTOCOMPLETE_IN_MEMORY = True
+
+# Build search results from a projection of the office columns instead of full Office ORM objects
+SEARCH_USE_OFFICE_RECORDS = True
+
+# Build search results from the office fields stored in Elasticsearch (`es.OFFICE_RESULT_FIELD`),
+# without querying the database. Offices indexed without these fields are still read from the database.
+SEARCH_HYDRATE_FROM_ES = False
+
 # 2020-05-13: The tile API of OpenRouteService (api.openrouteservice.org) will be discontinued in June 2020.
 TILE_SERVER_URL = "http://openmapsurfer.uni-hd.de/tiles/roads/x={x}&y={y}&z={z}"
 
@@ -173,6 +205,21 @@ FROM_EMAIL = "<set it>"
 TAG_MANAGER_URL = ""
 
 API_ADRESSE_BASE_URL = "https://api-adresse.data.gouv.fr"
+# Addresses of gps coordinates are found offline, among the bundled cities (see `geocoding.get_address`).
+# Set this to True to prefer the street level addresses of the api-adresse.data.gouv.fr `/reverse` API
+# when it responds.
+REVERSE_GEOCODING_USE_API = False
+# Gps coordinates farther than this from any city have no offline address.
+REVERSE_GEOCODING_MAX_DISTANCE_KM = 20
+
+# Cache of the api-adresse.data.gouv.fr and geo.api.gouv.fr lookups, see labonneboite/common/geocoding/cache.py
+GEOCODING_CACHE_ENABLED = True
+GEOCODING_CACHE_MAXSIZE = 10000
+GEOCODING_CACHE_TTL = 24 * 3600
+# Empty results, which include failed requests, are kept for a shorter time
+GEOCODING_CACHE_NEGATIVE_TTL = 5 * 60
+# Coordinates are rounded to this number of decimals in cache keys (4 decimals ~ 10 meters)
+GEOCODING_CACHE_COORDINATES_PRECISION = 4
 API_DEPARTMENTS_URL = "https://geo.api.gouv.fr/departements"
 
 # Je postule
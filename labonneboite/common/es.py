@@ -1,7 +1,8 @@
+from collections import OrderedDict
 import random
 import string
 from datetime import datetime
-from typing import Optional
+from typing import Dict, Hashable, Iterable, Optional, Tuple
 
 import elasticsearch
 
@@ -11,6 +12,20 @@ OFFICE_TYPE = 'office'
 OGR_TYPE = 'ogr'
 LOCATION_TYPE = 'location'
 
+# Office field holding the columns needed to display a search result, see `settings.SEARCH_HYDRATE_FROM_ES`
+OFFICE_RESULT_FIELD = 'office_result'
+
+# Routing key of the offices having extra geolocations, which may be in other departements than their own, when
+# offices are routed by departement: searches routed by departement always include it.
+MULTI_GEOLOCATIONS_ROUTING = 'multi'
+
+# Office fields holding the ROME codes which an office has scores for, by scores field, see
+# `settings.ES_EXPLICIT_ROME_SCORES_MAPPING`.
+ROME_CODES_FIELDS = {
+    'scores_by_rome': 'rome_codes',
+    'scores_alternance_by_rome': 'alternance_rome_codes',
+}
+
 
 class ConnectionPool(object):
     ELASTICSEARCH_INSTANCE: Optional[elasticsearch.Elasticsearch] = None
@@ -35,6 +50,120 @@ def new_elasticsearch_instance() -> elasticsearch.Elasticsearch:
     return elasticsearch.Elasticsearch(hosts=[settings.ES_HOST], timeout=settings.ES_TIMEOUT)
 
 
+class MultiSearchError(Exception):
+    """
+    Raised when one of the requests of a `MultiSearch` batch failed.
+    """
+
+    def __init__(self, key, error):
+        super().__init__(f"msearch request {key!r} failed: {error}")
+        self.key = key
+        self.error = error
+
+
+class MultiSearch(object):
+    """
+    Collect several search requests and send them to Elasticsearch in a single
+    `_msearch` round trip. Responses are given back by the key each request was
+    added with, so that callers can demultiplex them.
+    """
+
+    def __init__(self, index=None, doc_type=OFFICE_TYPE):
+        # Read at runtime, so that `settings.ES_INDEX` may be overridden after import (e.g. by benchmarks).
+        self.index = index or settings.ES_INDEX
+        self.doc_type = doc_type
+        self.requests: 'OrderedDict[Hashable, Tuple[Dict, Dict]]' = OrderedDict()
+
+    def __len__(self):
+        return len(self.requests)
+
+    def add(self, key: Hashable, body: Dict, count_only: bool = False, routing: Optional[str] = None):
+        header = {}
+        if count_only:
+            # Only `hits.total` will be read: do not fetch any document.
+            header['search_type'] = 'count'
+        header.update(routing_params(routing))
+        self.requests[key] = (header, body)
+
+    def execute(self) -> Dict[Hashable, Dict]:
+        if not self.requests:
+            return {}
+
+        body = []
+        for header, query in self.requests.values():
+            body.append(header)
+            body.append(query)
+
+        res = Elasticsearch().msearch(index=self.index, doc_type=self.doc_type, body=body)
+
+        responses = {}
+        for key, response in zip(self.requests, res['responses']):
+            if 'error' in response:
+                raise MultiSearchError(key, response['error'])
+            responses[key] = response
+        return responses
+
+
+def get_office_routing(department: str, has_multi_geolocations: bool = False) -> Optional[str]:
+    """
+    Routing key of the document of an office, or None if offices are not routed by departement
+    (see `settings.ES_OFFICES_ROUTED_BY_DEPARTEMENT`).
+    """
+    if not settings.ES_OFFICES_ROUTED_BY_DEPARTEMENT:
+        return None
+    return MULTI_GEOLOCATIONS_ROUTING if has_multi_geolocations else department
+
+
+def get_office_doc_routing(doc: Dict) -> Optional[str]:
+    """
+    Routing key of an office document (as returned by `create_index.get_office_as_es_doc`).
+    """
+    return get_office_routing(doc['department'], doc.get(OFFICE_RESULT_FIELD, {}).get('has_multi_geolocations', False))
+
+
+def get_search_routing(departements: Iterable[str]) -> str:
+    """
+    Routing of the searches of offices located in the given departements.
+    """
+    return ','.join(sorted(set(departements)) + [MULTI_GEOLOCATIONS_ROUTING])
+
+
+def routing_params(routing: Optional[str], key: str = 'routing') -> Dict[str, str]:
+    """
+    Keyword arguments routing a request (or fields routing a bulk action, with `key='_routing'`), if `routing` is
+    not None.
+    """
+    return {key: routing} if routing is not None else {}
+
+
+def add_rome_codes(doc: Dict) -> Dict:
+    """
+    Add to an office document the ROME codes it has scores for (see `ROME_CODES_FIELDS`), when offices are indexed
+    with explicit scores by ROME fields (see `settings.ES_EXPLICIT_ROME_SCORES_MAPPING`).
+    """
+    if settings.ES_EXPLICIT_ROME_SCORES_MAPPING:
+        for scores_field, rome_codes_field in ROME_CODES_FIELDS.items():
+            if doc.get(scores_field):
+                doc[rome_codes_field] = sorted(doc[scores_field])
+    return doc
+
+
+def get_rome_scores_mapping() -> Dict:
+    """
+    Mapping of the scores of offices by ROME, with one integer field per known ROME, stored as doc values: sorting
+    and scoring on them do not load the scores of all offices in the heap.
+    """
+    return {
+        "type": "object",
+        "properties": {
+            rome: {
+                "type": "integer",
+                "doc_values": True,
+            } for rome in settings.ROME_DESCRIPTIONS
+        },
+    }
+
+
 def drop_and_create_index():
     """
     Delete all indexes associated to reference alias and create a new index
@@ -76,10 +205,21 @@ def add_alias_to_index(index, name=settings.ES_INDEX):
     Elasticsearch().indices.put_alias(index=index, name=name)
 
 
-def create_index(index):
+def create_index(index, routed_by_departement=None, explicit_rome_scores=None):
     """
     Create index with the right settings.
+
+    Office documents of indexes `routed_by_departement` (defaults to `settings.ES_OFFICES_ROUTED_BY_DEPARTEMENT`)
+    must be indexed, read, updated and deleted with their routing, see `get_office_routing`.
+
+    Indexes with `explicit_rome_scores` (defaults to `settings.ES_EXPLICIT_ROME_SCORES_MAPPING`) declare the scores
+    by ROME fields instead of mapping them dynamically, along with the ROME codes fields, see `add_rome_codes`.
     """
+    if routed_by_departement is None:
+        routed_by_departement = settings.ES_OFFICES_ROUTED_BY_DEPARTEMENT
+    if explicit_rome_scores is None:
+        explicit_rome_scores = settings.ES_EXPLICIT_ROME_SCORES_MAPPING
+
     filters = {
         "stop_francais": {
             "type": "stop",
@@ -270,6 +410,11 @@ def create_index(index):
             "locations": {
                 "type": "geo_point",
             },
+            # Only stored in _source to build search results, never searched.
+            OFFICE_RESULT_FIELD: {
+                "type": "object",
+                "enabled": False,
+            },
         },
     }
     create_body = {
@@ -288,10 +433,27 @@ def create_index(index):
         },
     }
 
+    if explicit_rome_scores:
+        for scores_field, rome_codes_field in ROME_CODES_FIELDS.items():
+            mapping_office["properties"][scores_field] = get_rome_scores_mapping()
+            mapping_office["properties"][rome_codes_field] = {
+                "type": "string",
+                "index": "not_analyzed",
+                "doc_values": True,
+            }
+
+    fake_doc_routing = None
+    if routed_by_departement:
+        # Requests missing the routing of an office fail instead of silently reaching the wrong shard.
+        mapping_office["_routing"] = {"required": True}
+        create_body["settings"]["index"]["number_of_shards"] = settings.ES_ROUTED_INDEX_SHARDS
+        fake_doc_routing = MULTI_GEOLOCATIONS_ROUTING
+
     Elasticsearch().indices.create(index=index, body=create_body)
 
     fake_doc = fake_office()
-    Elasticsearch().index(index=index, doc_type=OFFICE_TYPE, id=fake_doc['siret'], body=fake_doc)
+    Elasticsearch().index(index=index, doc_type=OFFICE_TYPE, id=fake_doc['siret'], body=fake_doc,
+                          **routing_params(fake_doc_routing))
 
 
 # This fake office having a zero but existing score for each rome is designed
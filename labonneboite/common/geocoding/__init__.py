@@ -1,6 +1,6 @@
 from functools import wraps
-import collections
 import json
+import logging
 import os
 import geopy.distance
 
@@ -8,7 +8,19 @@ from slugify import slugify
 
 from labonneboite_common import departements
 
+from labonneboite.common.conf import settings
+from labonneboite.common.load_data import get_file_stamps
 from . import datagouv
+from .compiled import COMPILED_CITIES_DIR, CompiledCities, compile_cities, load_compiled_cities, save_compiled_cities
+from .spatial import BoundingBoxes, CitiesIndex
+
+logger = logging.getLogger('main')
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), "data")
+CITIES_JSON_FILES = [
+    os.path.join(DATA_DIR, "cities.json"),
+    os.path.join(DATA_DIR, "arrondissements_as_cities.json"),
+]
 
 CACHE = {}
 
@@ -38,9 +50,9 @@ def city_as_dict(item):
     }
 
 
-def load_cities_cache():
+def read_cities():
     """
-    Populates the cities cache with all cities in France (with their geographical coordinates and more).
+    Returns the list of all cities in France (with their geographical coordinates and more).
 
     The data source is a JSON file that comes from api.gouv.fr's GeoAPI: https://geo.api.gouv.fr/
     The JSON file is generated with the following bash command:
@@ -92,29 +104,48 @@ def load_cities_cache():
 
     cities = []
 
-    json_file = os.path.join(os.path.dirname(os.path.realpath(__file__)), "data/cities.json")
-    with open(json_file, 'r') as json_data:
+    with open(CITIES_JSON_FILES[0], 'r') as json_data:
         for item in json.load(json_data):
             if item['code'] not in COMMUNES_TO_SKIP:
                 cities.append(city_as_dict(item))
 
-    json_file = os.path.join(os.path.dirname(os.path.realpath(__file__)), "data/arrondissements_as_cities.json")
-    with open(json_file, 'r') as json_data:
+    with open(CITIES_JSON_FILES[1], 'r') as json_data:
         for item in json.load(json_data):
             cities.append(city_as_dict(item))
 
-    CACHE['cities'] = cities
+    return cities
+
+
+def get_cities_sources():
+    """
+    Returns the stamps of the JSON files the cities are read from, see `load_data.get_file_stamps`.
+    """
+    return get_file_stamps(CITIES_JSON_FILES)
+
+
+def compile_cities_cache(path=COMPILED_CITIES_DIR):
+    """
+    Compiles the cities to the arrays loaded by `load_cities_cache`, in the `path` directory.
+    """
+    save_compiled_cities(compile_cities(read_cities()), path, get_cities_sources())
+
 
-    # Create a dict where each "code commune (INSEE)" is mapped to its corresponding city.
-    # This works because a code commune is unique for each city.
-    CACHE['cities_by_commune_id'] = {city['commune_id']: city for city in cities}
+def load_cities_cache():
+    """
+    Populates the cities cache.
 
-    # Create a dict where each "zipcode" is mapped to its corresponding cities.
-    # Since the zipcode is not unique, it can be mapped to several cities.
-    CACHE['cities_by_zipcode'] = collections.defaultdict(list)
-    for city in cities:
-        key = city['zipcode']
-        CACHE['cities_by_zipcode'][key].append(city)
+    Cities are memory-mapped from the directory written by `compile_cities_cache` (see the `compile_cities`
+    script). When this directory is missing or outdated, cities are read and compiled from the JSON files.
+    """
+    cities = load_compiled_cities(COMPILED_CITIES_DIR, get_cities_sources())
+    if cities is None:
+        logger.info("compiled cities are missing or outdated in %s, reading them from JSON files", COMPILED_CITIES_DIR)
+        cities = CompiledCities(compile_cities(read_cities()))
+
+    # Cities are unique by "code commune (INSEE)", but a zipcode can be mapped to several cities:
+    # both are looked up by binary search.
+    CACHE['cities'] = cities
+    CACHE['cities_index'] = CitiesIndex(cities, cities.latitudes, cities.longitudes)
 
 
 def cities_cache_required(function):
@@ -143,7 +174,8 @@ def get_city_by_commune_id(commune_id):
     """
     if isinstance(commune_id, int):
         commune_id = str(commune_id)
-    return CACHE['cities_by_commune_id'].get(commune_id)
+    position = CACHE['cities'].get_position_by_commune_id(commune_id)
+    return None if position is None else CACHE['cities'][position]
 
 
 @cities_cache_required
@@ -152,7 +184,7 @@ def get_city_by_zipcode(zipcode, slug=''):
     Returns the city corresponding to the given `zipcode` string and `city_name_slug`.
     `city_name_slug` is required to deal with situations where a zipcode is not unique for a city.
     """
-    cities = CACHE['cities_by_zipcode'].get(zipcode)
+    cities = [CACHE['cities'][position] for position in CACHE['cities'].get_positions_by_zipcode(zipcode)]
     if not cities:
         return None
     if len(cities) > 1:
@@ -167,9 +199,48 @@ def get_all_cities_from_departement(departement):
     """
     Returns a list of all cities for the given departement.
     """
-    return [
-        city for commune_id, city in list(CACHE['cities_by_commune_id'].items()) if commune_id.startswith(departement)
-    ]
+    cities = CACHE['cities']
+    return [cities[position] for position in cities.get_positions_by_commune_id_prefix(departement)]
+
+
+@cities_cache_required
+def nearest_city(latitude, longitude):
+    """
+    Returns the city nearest to the given gps coordinates, or None.
+    """
+    return CACHE['cities_index'].nearest_city(latitude, longitude)
+
+
+@cities_cache_required
+def cities_within(latitude, longitude, km):
+    """
+    Returns the list of `(city, distance)` tuples of all cities within `km` kilometers of the given gps coordinates,
+    nearest first. Distances (float, kilometers) are great-circle distances.
+    """
+    return CACHE['cities_index'].cities_within(latitude, longitude, km)
+
+
+def get_departements_of_commune_ids(commune_ids):
+    """
+    Returns the departements of an array of "codes commune (INSEE)" (bytes), as in the `departement` of offices:
+    Corsican communes are in departement 20, and all overseas communes in departement 97.
+    """
+    prefixes = commune_ids.astype('S2')
+    prefixes[(prefixes == b'2A') | (prefixes == b'2B')] = b'20'
+    return prefixes
+
+
+@cities_cache_required
+def departements_within(latitude, longitude, km):
+    """
+    Returns the sorted list of the departements whose cities have a bounding box within `km` kilometers of the given
+    gps coordinates.
+    """
+    if 'departement_boxes' not in CACHE:
+        cities = CACHE['cities']
+        CACHE['departement_boxes'] = BoundingBoxes(
+            get_departements_of_commune_ids(cities.commune_ids), cities.latitudes, cities.longitudes)
+    return [departement.decode('utf-8') for departement in CACHE['departement_boxes'].within(latitude, longitude, km)]
 
 
 @cities_cache_required
@@ -188,7 +259,7 @@ def is_commune_id(value):
     """
     Returns true if the given string is a "code commune (INSEE)", false otherwise.
     """
-    return value in CACHE['cities_by_commune_id']
+    return CACHE['cities'].get_position_by_commune_id(value) is not None
 
 
 def is_departement(value):
@@ -218,5 +289,28 @@ def get_address(latitude, longitude, limit=10):
         label (str)
         zipcode (str)
         city (str)
+        city_code (str)
+
+    Addresses are the nearest cities, found offline. When `REVERSE_GEOCODING_USE_API` is enabled,
+    the street level addresses of the remote API are returned instead, unless it fails.
+    """
+    if settings.REVERSE_GEOCODING_USE_API:
+        addresses = datagouv.reverse(latitude, longitude, limit=limit)
+        if addresses:
+            return addresses
+    return get_offline_address(latitude, longitude, limit=limit)
+
+
+@cities_cache_required
+def get_offline_address(latitude, longitude, limit=10):
+    """
+    Returns the nearest cities within `REVERSE_GEOCODING_MAX_DISTANCE_KM` of the given gps coordinates,
+    in the format of `get_address`.
     """
-    return datagouv.reverse(latitude, longitude, limit=limit)
+    cities = cities_within(latitude, longitude, settings.REVERSE_GEOCODING_MAX_DISTANCE_KM)
+    return [{
+        'label': "%s %s" % (city['name'], city['zipcode']),
+        'zipcode': city['zipcode'],
+        'city': city['name'],
+        'city_code': city['commune_id'],
+    } for city, _ in cities[:limit]]
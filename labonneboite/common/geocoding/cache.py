@@ -0,0 +1,169 @@
+"""
+Cache of the api-adresse.data.gouv.fr lookups of `datagouv.search` and `datagouv.reverse`.
+
+Keys are normalized, so that queries which only differ by case, accents or
+spaces share their cache entries, and coordinates are rounded. Empty results
+(which include failed requests) are cached too, with a shorter TTL.
+
+Concurrent identical lookups of a process are coalesced: only the first one
+requests the API, the other ones wait for its result.
+
+The backends are the ones of the search cache (see `search_cache`): the
+default in-process LRU, or a `RedisCacheBackend` shared by all workers when
+`settings.CACHE_REDIS_URL` is set. Hit and miss counters of the process are returned by `get_stats()`.
+"""
+from collections import Counter
+import copy
+import hashlib
+import json
+import logging
+import threading
+import unicodedata
+from typing import Any, Callable, Dict, Optional
+
+from labonneboite.common.conf import settings
+from labonneboite.common.search_cache import CacheBackendPool
+
+logger = logging.getLogger('main')
+
+
+BACKEND_POOL = CacheBackendPool('GEOCODING_CACHE_MAXSIZE', 'lbb:geocoding')
+
+
+def get_backend() -> Any:
+    return BACKEND_POOL.get_backend()
+
+
+def set_backend(backend: Any) -> None:
+    BACKEND_POOL.set_backend(backend)
+
+
+class Stats(object):
+    """
+    Thread-safe counters of the cache lookups of the process:
+
+    - `hits`: lookups answered by the cache, including `negative_hits` (empty results),
+    - `misses`: lookups that were not in the cache, including `coalesced` ones which
+      waited for an identical lookup instead of requesting the API.
+    """
+
+    def __init__(self) -> None:
+        self.counter: Counter = Counter()
+        self.lock = threading.Lock()
+
+    def incr(self, *names: str) -> None:
+        with self.lock:
+            self.counter.update(names)
+
+    def as_dict(self) -> Dict[str, int]:
+        with self.lock:
+            return {name: self.counter[name] for name in ['hits', 'negative_hits', 'misses', 'coalesced']}
+
+    def reset(self) -> None:
+        with self.lock:
+            self.counter.clear()
+
+
+STATS = Stats()
+
+
+def get_stats() -> Dict[str, int]:
+    return STATS.as_dict()
+
+
+class Call(object):
+
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.value: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight(object):
+    """
+    Run a single call at a time for each key: concurrent calls with the same key get the result
+    (or the exception) of the call in progress.
+    """
+
+    def __init__(self) -> None:
+        self.calls: Dict[str, Call] = {}
+        self.lock = threading.Lock()
+
+    def do(self, key: str, function: Callable[[], Any]) -> Any:
+        with self.lock:
+            call = self.calls.get(key)
+            is_leader = call is None
+            if is_leader:
+                call = self.calls[key] = Call()
+
+        if not is_leader:
+            STATS.incr('coalesced')
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.value
+
+        try:
+            call.value = function()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+            call.done.set()
+        return call.value
+
+
+SINGLE_FLIGHT = SingleFlight()
+
+
+def normalize_query(query: str) -> str:
+    """
+    Casefolded query without accents nor redundant spaces.
+    """
+    decomposed = unicodedata.normalize('NFKD', query.casefold())
+    without_accents = ''.join(char for char in decomposed if not unicodedata.combining(char))
+    return ' '.join(without_accents.split())
+
+
+def make_key(endpoint: str, **params: Any) -> str:
+    def canonical(value: Any) -> Any:
+        if isinstance(value, str):
+            return normalize_query(value)
+        if isinstance(value, float):
+            return round(value, settings.GEOCODING_CACHE_COORDINATES_PRECISION)
+        return value
+
+    serialized = json.dumps({key: canonical(value) for key, value in params.items()}, sort_keys=True)
+    return endpoint + ':' + hashlib.sha1(serialized.encode('utf-8')).hexdigest()
+
+
+def get_or_fetch(key: str, fetch: Callable[[], Any]) -> Any:
+    """
+    Return the cached value of `key`, or fetch, cache and return it.
+    Callers get their own copy of the value, which they may modify.
+    """
+    if not settings.GEOCODING_CACHE_ENABLED:
+        return fetch()
+
+    backend = get_backend()
+    value = backend.get(key)
+    if value is not None:
+        STATS.incr('hits', *(['negative_hits'] if not value else []))
+        logger.debug("geocoding cache hit for key %s", key)
+        return copy.deepcopy(value)
+    STATS.incr('misses')
+    logger.debug("geocoding cache miss for key %s", key)
+
+    def fetch_and_store() -> Any:
+        value = fetch()
+        ttl = settings.GEOCODING_CACHE_TTL if value else settings.GEOCODING_CACHE_NEGATIVE_TTL
+        backend.set(key, value, ttl)
+        return value
+
+    return copy.deepcopy(SINGLE_FLIGHT.do(key, fetch_and_store))
+
+
+def clear() -> None:
+    get_backend().clear()
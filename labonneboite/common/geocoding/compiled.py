@@ -0,0 +1,182 @@
+"""
+Compact, columnar storage of the cities of the geocoding cache.
+
+Cities are stored as NumPy arrays: coordinates and population, fixed width
+commune_ids and zipcodes, and UTF-8 blobs with offset tables for names, slugs
+and the lists of zipcodes. Lookups by commune_id and zipcode are binary
+searches in sorted copies of the keys.
+
+`save_compiled_cities` writes these arrays as `.npy` files in a directory,
+which `load_compiled_cities` memory-maps (see `npy_directory`): loading is
+almost free, and the pages of the files are shared by all the processes (e.g.
+the web workers) reading them. City dicts are only built when they are looked
+up.
+"""
+from collections.abc import Sequence
+import os
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from labonneboite.common import npy_directory
+
+COMPILED_CITIES_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), "data/cities_compiled")
+
+# Bump this when the arrays change, so that outdated compiled directories are ignored.
+FORMAT_VERSION = 1
+
+ARRAY_NAMES = [
+    'latitudes',
+    'longitudes',
+    'populations',
+    'commune_ids',
+    'zipcodes',
+    'names_data',
+    'names_offsets',
+    'slugs_data',
+    'slugs_offsets',
+    'all_zipcodes',
+    'all_zipcodes_offsets',
+    'sorted_commune_ids',
+    'commune_id_positions',
+    'sorted_zipcodes',
+    'zipcode_positions',
+]
+
+
+def get_blob(values: List[str]):
+    """
+    Concatenate UTF-8 encoded strings in a single bytes array, with the array of their offsets.
+    """
+    encoded = [value.encode('utf-8') for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(value) for value in encoded], out=offsets[1:])
+    return np.frombuffer(b''.join(encoded), dtype=np.uint8), offsets
+
+
+def get_keys(values: List[str]) -> np.ndarray:
+    # Fixed width bytes arrays can be sorted and binary searched
+    return np.array([value.encode('utf-8') for value in values], dtype=bytes)
+
+
+def compile_cities(cities: List[Dict]) -> Dict[str, np.ndarray]:
+    """
+    Convert city dicts (as returned by `geocoding.city_as_dict`) to the arrays of `CompiledCities`.
+    """
+    commune_ids = get_keys([city['commune_id'] for city in cities])
+    if len(np.unique(commune_ids)) != len(commune_ids):
+        raise ValueError("commune_ids of cities should be unique")
+    zipcodes = get_keys([city['zipcode'] for city in cities])
+    names_data, names_offsets = get_blob([city['name'] for city in cities])
+    slugs_data, slugs_offsets = get_blob([city['slug'] for city in cities])
+    all_zipcodes_offsets = np.zeros(len(cities) + 1, dtype=np.int64)
+    np.cumsum([len(city['zipcodes']) for city in cities], out=all_zipcodes_offsets[1:])
+    # Stable sorts: cities with the same zipcode keep their original order
+    commune_id_positions = np.argsort(commune_ids, kind='stable')
+    zipcode_positions = np.argsort(zipcodes, kind='stable')
+
+    return {
+        'latitudes': np.array([city['coords']['lat'] for city in cities], dtype=np.float64),
+        'longitudes': np.array([city['coords']['lon'] for city in cities], dtype=np.float64),
+        'populations': np.array([city['population'] for city in cities], dtype=np.int64),
+        'commune_ids': commune_ids,
+        'zipcodes': zipcodes,
+        'names_data': names_data,
+        'names_offsets': names_offsets,
+        'slugs_data': slugs_data,
+        'slugs_offsets': slugs_offsets,
+        'all_zipcodes': get_keys([zipcode for city in cities for zipcode in city['zipcodes']]),
+        'all_zipcodes_offsets': all_zipcodes_offsets,
+        'sorted_commune_ids': commune_ids[commune_id_positions],
+        'commune_id_positions': commune_id_positions,
+        'sorted_zipcodes': zipcodes[zipcode_positions],
+        'zipcode_positions': zipcode_positions,
+    }
+
+
+def save_compiled_cities(arrays: Dict[str, np.ndarray], path: str, sources: Dict) -> None:
+    """
+    Write compiled arrays in the `path` directory, see `npy_directory.save_arrays`.
+    """
+    npy_directory.save_arrays(arrays, ARRAY_NAMES, path, FORMAT_VERSION, sources)
+
+
+def load_compiled_cities(path: str, sources: Dict) -> Optional['CompiledCities']:
+    """
+    Memory-map the compiled arrays of the `path` directory.
+    Return None if they are missing or were compiled from other files.
+    """
+    arrays = npy_directory.load_arrays(ARRAY_NAMES, path, FORMAT_VERSION, sources)
+    return CompiledCities(arrays) if arrays is not None else None
+
+
+class CompiledCities(Sequence):
+    """
+    Read-only sequence of city dicts, backed by the arrays of `compile_cities`.
+    """
+
+    def __init__(self, arrays: Dict[str, np.ndarray]) -> None:
+        for name in ARRAY_NAMES:
+            setattr(self, name, arrays[name])
+        # City dicts that were already looked up, by position
+        self._cities: Dict[int, Dict] = {}
+
+    def __len__(self) -> int:
+        return len(self.commune_ids)
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            return [self[index] for index in range(*position.indices(len(self)))]
+        if position < 0:
+            position += len(self)
+        if not 0 <= position < len(self):
+            raise IndexError("city position out of range")
+        city = self._cities.get(position)
+        if city is None:
+            city = self._cities[position] = self._build_city(position)
+        return city
+
+    @staticmethod
+    def _get_string(data: np.ndarray, offsets: np.ndarray, position: int) -> str:
+        return data[offsets[position]:offsets[position + 1]].tobytes().decode('utf-8')
+
+    def _build_city(self, position: int) -> Dict:
+        return {
+            'name': self._get_string(self.names_data, self.names_offsets, position),
+            'slug': self._get_string(self.slugs_data, self.slugs_offsets, position),
+            'commune_id': self.commune_ids[position].decode('utf-8'),
+            'zipcodes': [
+                zipcode.decode('utf-8')
+                for zipcode in self.all_zipcodes[self.all_zipcodes_offsets[position]:
+                                                 self.all_zipcodes_offsets[position + 1]]
+            ],
+            'zipcode': self.zipcodes[position].decode('utf-8'),
+            'population': int(self.populations[position]),
+            'coords': {
+                'lon': float(self.longitudes[position]),
+                'lat': float(self.latitudes[position]),
+            },
+        }
+
+    def get_position_by_commune_id(self, commune_id: str) -> Optional[int]:
+        key = commune_id.encode('utf-8')
+        index = int(np.searchsorted(self.sorted_commune_ids, key))
+        if index < len(self) and self.sorted_commune_ids[index] == key:
+            return int(self.commune_id_positions[index])
+        return None
+
+    def get_positions_by_zipcode(self, zipcode: str) -> List[int]:
+        key = zipcode.encode('utf-8')
+        start = np.searchsorted(self.sorted_zipcodes, key, 'left')
+        end = np.searchsorted(self.sorted_zipcodes, key, 'right')
+        return self.zipcode_positions[start:end].tolist()
+
+    def get_positions_by_commune_id_prefix(self, prefix: str) -> List[int]:
+        """
+        Positions of the cities whose commune_id starts with `prefix`, in their original order.
+        """
+        key = prefix.encode('utf-8')
+        start = np.searchsorted(self.sorted_commune_ids, key, 'left')
+        # Commune ids are made of ASCII characters, all lower than 0xff
+        end = np.searchsorted(self.sorted_commune_ids, key + b'\xff', 'right')
+        return np.sort(self.commune_id_positions[start:end]).tolist()
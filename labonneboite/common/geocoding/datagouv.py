@@ -1,11 +1,11 @@
 import logging
 
-from functools import lru_cache
 import requests
 from requests.exceptions import ConnectionError, ReadTimeout
 
 from labonneboite.common.util import unique_elements
 from labonneboite.common.conf import settings
+from . import cache
 
 logger = logging.getLogger('main')
 
@@ -19,14 +19,24 @@ def search(address, limit=10):
 
     This API mixess the results of the address API (https://api-adresse.data.gouv.fr/)
     with the departments API (https://geo.api.gouv.fr/departements)
+
+    Results are cached, see `geocoding.cache`.
     """
     if not address:
         return []
 
+    address = address[:200]  # Longer requests cause a 413 error
+    return cache.get_or_fetch(
+        cache.make_key('search', address=address, limit=limit),
+        lambda: fetch_search(address, limit),
+    )
+
+
+def fetch_search(address, limit):
     addresses = get_addresses(
         '/search',
         **{
-            'q': address[:200],  # Longer requests cause a 413 error
+            'q': address,
             'limit': limit
         })
     departments = get_departments(address, 2)
@@ -39,9 +49,12 @@ def search(address, limit=10):
 def reverse(latitude, longitude, limit=10):
     """
     Find the candidate addresses associated to given latitude/longitude
-    coordinates.
+    coordinates. Results are cached, see `geocoding.cache`.
     """
-    return get_addresses('/reverse', **{'lat': latitude, 'lon': longitude, 'limit': limit})
+    return cache.get_or_fetch(
+        cache.make_key('reverse', latitude=float(latitude), longitude=float(longitude), limit=limit),
+        lambda: get_addresses('/reverse', **{'lat': latitude, 'lon': longitude, 'limit': limit}),
+    )
 
 
 def get_addresses(endpoint, **params):
@@ -136,12 +149,15 @@ def get_department_by_code(code):
     Args:
         code (str): the code of a department (département)
     """
-    department = fetch_json(
-        url=settings.API_DEPARTMENTS_URL + '/' + code,
-        name='geo.api.gouv.fr/departements',
-        is_array=False,
+    return cache.get_or_fetch(
+        cache.make_key('department', code=code),
+        lambda: format_single_department(
+            fetch_json(
+                url=settings.API_DEPARTMENTS_URL + '/' + code,
+                name='geo.api.gouv.fr/departements',
+                is_array=False,
+            )),
     )
-    return format_single_department(department)
 
 
 def format_departments(departments):
@@ -157,7 +173,6 @@ def format_single_department(department):
     }
 
 
-@lru_cache(1000)
 def fetch_json(url, name, is_array=False, **params):
     """
     Request the desired API and handle errors
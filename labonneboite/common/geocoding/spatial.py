@@ -0,0 +1,169 @@
+"""
+Spatial index over the cities of the geocoding cache.
+
+Cities are bucketed in a regular latitude/longitude grid: they are sorted by
+grid cell, so that the cities of consecutive cells of a grid row are a
+contiguous slice of the sorted arrays. Finding the cities around a point then
+requires one binary search per grid row in the searched area, followed by a
+vectorized distance computation on the (few) candidate cities.
+"""
+import math
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0
+
+# Grid cells are about 11km high.
+CELL_SIZE_DEGREES = 0.1
+ROW_COUNT = int(round(180 / CELL_SIZE_DEGREES))
+COLUMN_COUNT = int(round(360 / CELL_SIZE_DEGREES))
+
+# `nearest_city` searches cities within this radius, then doubles it until a city is found.
+NEAREST_CITY_START_KM = 10
+# Half the circumference of the Earth (plus rounding errors): every city is within a circle of this radius.
+NEAREST_CITY_MAX_KM = math.pi * EARTH_RADIUS_KM + 1
+
+
+def get_rows(latitudes: np.ndarray) -> np.ndarray:
+    return np.clip(((latitudes + 90) // CELL_SIZE_DEGREES).astype(np.int64), 0, ROW_COUNT - 1)
+
+
+def get_columns(longitudes: np.ndarray) -> np.ndarray:
+    return (((longitudes + 180) // CELL_SIZE_DEGREES).astype(np.int64)) % COLUMN_COUNT
+
+
+def get_distances_km(latitude: float, longitude: float, latitudes: np.ndarray, longitudes: np.ndarray) -> np.ndarray:
+    """
+    Haversine distances (km) between a point and arrays of points, in degrees.
+    """
+    latitude_rad = math.radians(latitude)
+    latitudes_rad = np.radians(latitudes)
+    half_delta_lat = (latitudes_rad - latitude_rad) / 2
+    half_delta_lon = np.radians(longitudes - longitude) / 2
+    a = np.sin(half_delta_lat)**2 + math.cos(latitude_rad) * np.cos(latitudes_rad) * np.sin(half_delta_lon)**2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+class CitiesIndex(object):
+    """
+    Grid index of cities (as returned by `geocoding.city_as_dict`) by coordinates.
+    """
+
+    def __init__(self, cities: Sequence[Dict], latitudes: np.ndarray, longitudes: np.ndarray) -> None:
+        """
+        `latitudes` and `longitudes` are the coordinates of `cities`, in the same order.
+        """
+        cells = get_rows(latitudes) * COLUMN_COUNT + get_columns(longitudes)
+        # Stable sort, so that cities of a same cell keep their original order.
+        self.positions = np.argsort(cells, kind='stable')
+
+        self.cities = cities
+        self.cells = cells[self.positions]
+        self.latitudes = np.asarray(latitudes, dtype=np.float64)[self.positions]
+        self.longitudes = np.asarray(longitudes, dtype=np.float64)[self.positions]
+
+    @classmethod
+    def from_cities(cls, cities: Sequence[Dict]) -> 'CitiesIndex':
+        return cls(
+            cities,
+            np.array([city['coords']['lat'] for city in cities], dtype=np.float64),
+            np.array([city['coords']['lon'] for city in cities], dtype=np.float64),
+        )
+
+    def __len__(self) -> int:
+        return len(self.cities)
+
+    def _get_column_ranges(self, latitude: float, longitude: float, km: float) -> List[Tuple[int, int]]:
+        """
+        Ranges of grid columns (both included) that contain all points within `km` of the given point, at any
+        latitude of the searched area.
+        """
+        max_latitude = min(90.0, abs(latitude) + math.degrees(km / EARTH_RADIUS_KM))
+        cos_latitude = math.cos(math.radians(max_latitude))
+        if cos_latitude < 1e-9:
+            return [(0, COLUMN_COUNT - 1)]
+        delta_lon = math.degrees(km / (EARTH_RADIUS_KM * cos_latitude))
+        if 2 * delta_lon >= 360:
+            return [(0, COLUMN_COUNT - 1)]
+        first = int(get_columns(np.array([longitude - delta_lon]))[0])
+        last = int(get_columns(np.array([longitude + delta_lon]))[0])
+        if first <= last:
+            return [(first, last)]
+        # The searched area crosses the antimeridian.
+        return [(first, COLUMN_COUNT - 1), (0, last)]
+
+    def _get_candidates(self, latitude: float, longitude: float, km: float) -> np.ndarray:
+        """
+        Positions of the cities of all grid cells that intersect the bounding box of the searched circle.
+        """
+        delta_lat = math.degrees(km / EARTH_RADIUS_KM)
+        first_row, last_row = get_rows(np.array([latitude - delta_lat, latitude + delta_lat]))
+        rows = np.arange(first_row, last_row + 1) * COLUMN_COUNT
+        candidates = []
+        for first_column, last_column in self._get_column_ranges(latitude, longitude, km):
+            starts = np.searchsorted(self.cells, rows + first_column, side='left')
+            ends = np.searchsorted(self.cells, rows + last_column, side='right')
+            lengths = ends - starts
+            candidates.append(np.arange(lengths.sum()) + np.repeat(starts - (np.cumsum(lengths) - lengths), lengths))
+        return np.concatenate(candidates)
+
+    def cities_within(self, latitude: float, longitude: float, km: float) -> List[Tuple[Dict, float]]:
+        """
+        Return the `(city, distance in km)` pairs of all cities within `km` of the given point, nearest first.
+        """
+        candidates = self._get_candidates(latitude, longitude, km)
+        distances = get_distances_km(latitude, longitude, self.latitudes[candidates], self.longitudes[candidates])
+        within = distances <= km
+        candidates = candidates[within]
+        distances = distances[within]
+        order = np.lexsort((candidates, distances))
+        return [(self.cities[position], distance)
+                for position, distance in zip(self.positions[candidates[order]].tolist(), distances[order].tolist())]
+
+    def nearest_city(self, latitude: float, longitude: float) -> Optional[Dict]:
+        """
+        Return the city nearest to the given point, or None if there is no city at all.
+
+        Any city out of a searched circle is farther than the cities in it: the circle radius is
+        doubled until the circle contains a city.
+        """
+        if not len(self.cities):
+            return None
+        km = NEAREST_CITY_START_KM
+        while True:
+            cities = self.cities_within(latitude, longitude, km)
+            if cities or km >= NEAREST_CITY_MAX_KM:
+                return cities[0][0] if cities else None
+            km = min(2 * km, NEAREST_CITY_MAX_KM)
+
+
+class BoundingBoxes(object):
+    """
+    Latitude/longitude bounding boxes of groups of points, e.g. of the cities of each departement.
+    """
+
+    def __init__(self, keys: np.ndarray, latitudes: np.ndarray, longitudes: np.ndarray) -> None:
+        """
+        `keys[i]` is the group of the point `(latitudes[i], longitudes[i])`.
+        """
+        self.keys, groups = np.unique(keys, return_inverse=True)
+        self.min_latitudes = np.full(len(self.keys), np.inf)
+        self.max_latitudes = np.full(len(self.keys), -np.inf)
+        self.min_longitudes = np.full(len(self.keys), np.inf)
+        self.max_longitudes = np.full(len(self.keys), -np.inf)
+        np.minimum.at(self.min_latitudes, groups, latitudes)
+        np.maximum.at(self.max_latitudes, groups, latitudes)
+        np.minimum.at(self.min_longitudes, groups, longitudes)
+        np.maximum.at(self.max_longitudes, groups, longitudes)
+
+    def within(self, latitude: float, longitude: float, km: float) -> List:
+        """
+        Keys of the boxes within `km` of the given point, i.e. whose nearest point is. Boxes are not expected to
+        cross the antimeridian, and distances to boxes are approximated by the distances to the box corner or edge
+        nearest in latitude and longitude.
+        """
+        nearest_latitudes = np.clip(latitude, self.min_latitudes, self.max_latitudes)
+        nearest_longitudes = np.clip(longitude, self.min_longitudes, self.max_longitudes)
+        distances = get_distances_km(latitude, longitude, nearest_latitudes, nearest_longitudes)
+        return self.keys[distances <= km].tolist()
@@ -1,11 +1,14 @@
 import os
 import pickle
 import csv
+import logging
 
 
 from functools import lru_cache, reduce
 from collections import defaultdict
 
+logger = logging.getLogger('main')
+
 USE_ROME_SLICING_DATASET = False  # Rome slicing dataset is not ready yet
 
 if USE_ROME_SLICING_DATASET:
@@ -18,9 +21,11 @@ else:
     ROME_NAF_FILE = "rome_naf_mapping.csv"
 
 
+DATA_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), "data")
+
+
 def load_file(func, filename):
-    full_filename = os.path.join(os.path.dirname(
-        os.path.realpath(__file__)), "data/%s" % filename)
+    full_filename = os.path.join(DATA_DIR, filename)
     return func(full_filename)
 
 
@@ -143,6 +148,10 @@ def load_city_codes():
 
 @lru_cache(maxsize=None)
 def load_contact_modes():
+    return load_reference_table('contact_modes')
+
+
+def read_contact_modes():
     """
     Use comma delimiter instead of pipe so that it is recognized by github
     and can easily be edited online by the intrapreneurs.
@@ -154,6 +163,10 @@ def load_contact_modes():
 
 @lru_cache(maxsize=None)
 def load_ogr_labels():
+    return load_reference_table('ogr_labels')
+
+
+def read_ogr_labels():
     rows = load_csv_file("ogr_labels.csv")
     ogr_to_label = load_rows_as_dict(rows)
     return ogr_to_label
@@ -168,6 +181,15 @@ def load_groupements_employeurs():
 
 @lru_cache(maxsize=None)
 def load_ogr_rome_mapping():
+    return load_reference_table('ogr_rome_mapping')
+
+
+@lru_cache(maxsize=None)
+def load_rome_codes():
+    return list(load_ogr_rome_mapping().values())
+
+
+def read_ogr_rome_mapping():
     rows = load_csv_file(OGR_ROME_FILE)
 
     OGR_COLUMN = 0
@@ -190,6 +212,10 @@ def load_ogr_rome_mapping():
 
 @lru_cache(maxsize=None)
 def load_rome_labels():
+    return load_reference_table('rome_labels')
+
+
+def read_rome_labels():
     rows = load_csv_file(ROME_FILE)
     rome_to_label = load_rows_as_dict(rows)
     return rome_to_label
@@ -197,6 +223,10 @@ def load_rome_labels():
 
 @lru_cache(maxsize=None)
 def load_naf_labels():
+    return load_reference_table('naf_labels')
+
+
+def read_naf_labels():
     rows = load_csv_file("naf_labels.csv")
     naf_to_label = load_rows_as_dict(rows)
     return naf_to_label
@@ -207,8 +237,95 @@ def load_rome_naf_mapping():
     return load_csv_file(ROME_NAF_FILE, delimiter=',')
 
 
+ENSURE_LABELS_IN_MAPPING_MATCH = False  # FIXME resolve pending issue of non matching label data
+
+
+@lru_cache(maxsize=None)
+def load_rome_naf_mappings():
+    """
+    Return the hirings of the ROME NAF mapping as two dicts: hirings by NAF by ROME, and hirings by ROME by NAF.
+    """
+    return load_reference_table('rome_naf_mappings')
+
+
+def read_rome_naf_mappings():
+    rows = load_rome_naf_mapping()
+    rome_labels = load_rome_labels()
+    naf_labels = load_naf_labels()
+    rome_naf_mapping = {}
+    naf_rome_mapping = {}
+
+    ROME_COLUMN = 0
+    ROME_LABEL_COLUMN = 1
+    NAF_COLUMN = 2
+    NAF_LABEL_COLUMN = 3
+    HIRINGS_COLUMN = 4
+
+    for row in rows:
+
+        rome = row[ROME_COLUMN].strip().upper()
+        rome_label = row[ROME_LABEL_COLUMN]
+        naf = row[NAF_COLUMN].strip().upper()
+        naf_label = row[NAF_LABEL_COLUMN]
+        hirings = int(row[HIRINGS_COLUMN].strip())
+
+        if rome not in rome_labels:
+            raise Exception("missing label for ROME %s" % rome)
+
+        if naf not in naf_labels:
+            raise Exception("missing label for NAF %s" % naf)
+
+        if ENSURE_LABELS_IN_MAPPING_MATCH:
+
+            if naf_label != naf_labels[naf].encode('utf8'):
+                raise Exception("labels '%s' and '%s' do not match for NAF %s" % (
+                    naf_label,
+                    naf_labels[naf].encode('utf8'),
+                    naf,
+                ))
+
+            if rome_label != rome_labels[rome].encode('utf8'):
+                raise Exception("labels '%s' and '%s' do not match for ROME %s" % (
+                    rome_label,
+                    rome_labels[rome].encode('utf8'),
+                    rome,
+                ))
+
+        rome_naf_mapping.setdefault(rome, {})
+        if naf not in rome_naf_mapping[rome]:
+            rome_naf_mapping[rome][naf] = hirings
+        else:
+            raise Exception("duplicate mapping")
+
+        naf_rome_mapping.setdefault(naf, {})
+        if rome not in naf_rome_mapping[naf]:
+            naf_rome_mapping[naf][rome] = hirings
+        else:
+            raise Exception("duplicate mapping")
+
+    return rome_naf_mapping, naf_rome_mapping
+
+
+@lru_cache(maxsize=None)
+def load_slugified_rome_labels():
+    """
+    Dict of ROME codes by slugified label.
+    """
+    return load_reference_table('slugified_rome_labels')
+
+
+def read_slugified_rome_labels():
+    # slugify takes a while to import: reference data loaded from the bundle do not need it
+    from slugify import slugify
+    return {slugify(label): rome for rome, label in load_rome_labels().items()}
+
+
 @lru_cache(maxsize=None)
 def load_metiers_tension():
+    return load_reference_table('metiers_tension')
+
+
+def read_metiers_tension():
     csv_metiers_tension = load_csv_file("metiers_tension.csv", ',')
     rome_to_tension = defaultdict(int)
 
@@ -237,5 +354,108 @@ def load_siret_to_remove():
     return sirets_to_remove
 
 
-OGR_ROME_CODES = load_ogr_rome_mapping()
-ROME_CODES = list(OGR_ROME_CODES.values())
+# Reference data bundle
+#
+# Reading and checking the CSV files above takes a significant part of the import time of
+# `labonneboite.common`. The `compile_reference_data` script writes the tables read from them in a single
+# pickle file, which is used instead as long as it was compiled from the same CSV files. Each table is only
+# unpickled on its first use.
+
+REFERENCE_DATA_FILE = os.path.join(DATA_DIR, "reference_data.pickle")
+
+# Bump this when a table changes, so that outdated bundles are ignored.
+REFERENCE_DATA_VERSION = 1
+
+# Functions reading each table from the CSV files
+REFERENCE_TABLES = {
+    'rome_labels': read_rome_labels,
+    'naf_labels': read_naf_labels,
+    'ogr_labels': read_ogr_labels,
+    'ogr_rome_mapping': read_ogr_rome_mapping,
+    'rome_naf_mappings': read_rome_naf_mappings,
+    'slugified_rome_labels': read_slugified_rome_labels,
+    'metiers_tension': read_metiers_tension,
+    'contact_modes': read_contact_modes,
+}
+
+REFERENCE_DATA_SOURCES = [
+    ROME_FILE,
+    "naf_labels.csv",
+    "ogr_labels.csv",
+    OGR_ROME_FILE,
+    ROME_NAF_FILE,
+    "metiers_tension.csv",
+    "contact_modes.csv",
+]
+
+
+def get_file_stamps(paths):
+    """
+    Size and modification time of the given files, by filename.
+
+    Compiled data stores the stamps of the files it was compiled from, and is only used while they
+    are unchanged. Unlike checksums, stamps are checked at every start without reading the files.
+    """
+    stamps = {}
+    for path in paths:
+        stat = os.stat(path)
+        stamps[os.path.basename(path)] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+    return stamps
+
+
+def get_reference_data_sources():
+    """
+    Stamps of the CSV files of the reference data, see `get_file_stamps`.
+    """
+    return get_file_stamps([os.path.join(DATA_DIR, filename) for filename in REFERENCE_DATA_SOURCES])
+
+
+def compile_reference_data(path=REFERENCE_DATA_FILE):
+    """
+    Read all the reference data tables from the CSV files and write them to the `path` bundle.
+    """
+    tables = {
+        name: pickle.dumps(read_table(), protocol=pickle.HIGHEST_PROTOCOL)
+        for name, read_table in REFERENCE_TABLES.items()
+    }
+    bundle = {
+        'version': REFERENCE_DATA_VERSION,
+        'sources': get_reference_data_sources(),
+        'tables': tables,
+    }
+    # Write to a temporary file first, so that processes never read a partial bundle.
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(bundle, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+
+
+def read_reference_data(path=REFERENCE_DATA_FILE):
+    """
+    Return the pickled tables of the `path` bundle, by name. Return None if the bundle is missing or was
+    compiled from other CSV files.
+    """
+    try:
+        with open(path, 'rb') as f:
+            bundle = pickle.load(f)
+    except FileNotFoundError:
+        return None
+    if bundle.get('version') != REFERENCE_DATA_VERSION or bundle.get('sources') != get_reference_data_sources():
+        logger.warning("ignoring outdated reference data bundle %s, run the compile_reference_data script", path)
+        return None
+    return bundle['tables']
+
+
+@lru_cache(maxsize=None)
+def load_reference_data():
+    return read_reference_data()
+
+
+def load_reference_table(name):
+    """
+    Return a reference data table from the bundle if it is up to date, else from the CSV files.
+    """
+    tables = load_reference_data()
+    if tables is not None and name in tables:
+        return pickle.loads(tables[name])
+    return REFERENCE_TABLES[name]()
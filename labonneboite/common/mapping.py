@@ -3,10 +3,18 @@ import logging
 from functools import lru_cache
 from typing import Dict, List, Optional, Iterable, Container
 
-from slugify import slugify
-
-from labonneboite.common.load_data import load_rome_naf_mapping
+from labonneboite.common.load_data import (
+    get_reference_data_sources,
+    load_rome_naf_mappings,
+    load_slugified_rome_labels,
+)
 from labonneboite.common.conf import settings
+from labonneboite.common.rome_naf_matrix import (
+    ROME_NAF_MATRIX_DIR,
+    RomeNafMatrix,
+    compile_rome_naf_matrix,
+    load_rome_naf_matrix,
+)
 
 Naf = str
 Rome = str
@@ -15,93 +23,55 @@ NafTuple = namedtuple('NafTuple', ['code', 'name', 'hirings', 'affinity'])
 
 logger = logging.getLogger('main')
 
-SLUGIFIED_ROME_LABELS = {slugify(v): k for k, v in list(settings.ROME_DESCRIPTIONS.items())}
+SLUGIFIED_ROME_LABELS = load_slugified_rome_labels()
 
 MANUAL_ROME_NAF_MAPPING: Dict[Rome, Dict[Naf, int]] = {}
 MANUAL_NAF_ROME_MAPPING: Dict[Naf, Dict[Rome, int]] = {}
 
-ENSURE_LABELS_IN_MAPPING_MATCH = False  # FIXME resolve pending issue of non matching label data
-
 
 def populate_rome_naf_mapping():
-    rows = load_rome_naf_mapping()
-
-    ROME_COLUMN = 0
-    ROME_LABEL_COLUMN = 1
-    NAF_COLUMN = 2
-    NAF_LABEL_COLUMN = 3
-    HIRINGS_COLUMN = 4
-
-    for row in rows:
-
-        rome = row[ROME_COLUMN].strip().upper()
-        rome_label = row[ROME_LABEL_COLUMN]
-        naf = row[NAF_COLUMN].strip().upper()
-        naf_label = row[NAF_LABEL_COLUMN]
-        hirings = int(row[HIRINGS_COLUMN].strip())
-
-        if rome not in settings.ROME_DESCRIPTIONS:
-            raise Exception("missing label for ROME %s" % rome)
-
-        if naf not in settings.NAF_CODES:
-            raise Exception("missing label for NAF %s" % naf)
+    rome_naf_mapping, naf_rome_mapping = load_rome_naf_mappings()
+    MANUAL_ROME_NAF_MAPPING.update(rome_naf_mapping)
+    MANUAL_NAF_ROME_MAPPING.update(naf_rome_mapping)
 
-        if ENSURE_LABELS_IN_MAPPING_MATCH:
 
-            if naf_label != settings.NAF_CODES[naf].encode('utf8'):
-                raise Exception("labels '%s' and '%s' do not match for NAF %s" % (
-                    naf_label,
-                    settings.NAF_CODES[naf].encode('utf8'),
-                    naf,
-                ))
-
-            if rome_label != settings.ROME_DESCRIPTIONS[rome].encode('utf8'):
-                raise Exception("labels '%s' and '%s' do not match for ROME %s" % (
-                    rome_label,
-                    settings.ROME_DESCRIPTIONS[rome].encode('utf8'),
-                    rome,
-                ))
+populate_rome_naf_mapping()  # populates once all variables above
 
-        MANUAL_ROME_NAF_MAPPING.setdefault(rome, {})
-        if naf not in MANUAL_ROME_NAF_MAPPING[rome]:
-            MANUAL_ROME_NAF_MAPPING[rome][naf] = hirings
-        else:
-            raise Exception("duplicate mapping")
 
-        MANUAL_NAF_ROME_MAPPING.setdefault(naf, {})
-        if rome not in MANUAL_NAF_ROME_MAPPING[naf]:
-            MANUAL_NAF_ROME_MAPPING[naf][rome] = hirings
-        else:
-            raise Exception("duplicate mapping")
+def get_rome_naf_matrix() -> RomeNafMatrix:
+    """
+    Memory-map the matrix compiled by the `compile_reference_data` script, or compile it if it is outdated.
+    """
+    matrix = load_rome_naf_matrix(ROME_NAF_MATRIX_DIR, get_reference_data_sources())
+    if matrix is None:
+        matrix = RomeNafMatrix(compile_rome_naf_matrix(MANUAL_ROME_NAF_MAPPING, MANUAL_NAF_ROME_MAPPING))
+    return matrix
 
 
-populate_rome_naf_mapping()  # populates once all variables above
+ROME_NAF_MATRIX = get_rome_naf_matrix()
 
 
 @lru_cache(maxsize=1024)
 def get_romes_for_naf(naf: Naf) -> List[Rome]:
-    return list(MANUAL_NAF_ROME_MAPPING[naf].keys())
+    if naf not in ROME_NAF_MATRIX.naf_indexes:
+        raise KeyError(naf)
+    return [rome for rome, _hirings, _affinity in ROME_NAF_MATRIX.get_romes_for_naf(naf)]
 
 
-@lru_cache(maxsize=1024)
 def get_total_naf_hirings(naf) -> int:
-    romes = get_romes_for_naf(naf)
-    return sum(MANUAL_NAF_ROME_MAPPING[naf][rome] for rome in romes)
+    return ROME_NAF_MATRIX.get_total_naf_hirings(naf)
 
 
-@lru_cache(maxsize=32 * 1024)
 def get_affinity_between_rome_and_naf(rome_code: Rome, naf_code: Naf) -> float:
     """
     Ratio of hirings of this NAF made by this ROME.
     """
-    current_rome_hirings = MANUAL_NAF_ROME_MAPPING[naf_code][rome_code]
-    total_naf_hirings = get_total_naf_hirings(naf_code)
+    affinity = ROME_NAF_MATRIX.get_affinity(rome_code, naf_code)
 
-    if not (current_rome_hirings >= 1 and current_rome_hirings <= total_naf_hirings):
+    if not 0 < affinity <= 1:
         raise Exception("error in hiring data for rome_code=%s and naf_code=%s" % (rome_code, naf_code))
 
-    # 1.0 used to force float result, otherwise int/int like 30/100 give... zero
-    return 1.0 * current_rome_hirings / total_naf_hirings
+    return affinity
 
 
 def map_romes_to_nafs(rome_codes: Iterable[Rome], optional_naf_codes: Optional[Container[Naf]] = None) -> List[Naf]:
@@ -109,12 +79,9 @@ def map_romes_to_nafs(rome_codes: Iterable[Rome], optional_naf_codes: Optional[C
     for rome in rome_codes:
         if rome not in settings.ROME_DESCRIPTIONS:
             raise ValueError('bad rome code : %s' % rome)
-        try:
-            naf_codes_with_hirings = MANUAL_ROME_NAF_MAPPING[rome]
-        except KeyError:
+        if rome not in ROME_NAF_MATRIX.rome_indexes:
             logger.error('soft fail: no NAF codes for ROME %s', rome)
-            naf_codes_with_hirings = {}
-        for naf in naf_codes_with_hirings.keys():
+        for naf, _hirings, _affinity in ROME_NAF_MATRIX.get_nafs_for_rome(rome):
             if optional_naf_codes:
                 if naf in optional_naf_codes:
                     naf_codes.add(naf)
@@ -135,9 +102,10 @@ def romes_for_naf(naf: Naf) -> List[RomeTuple]:
         ...
     ]
     """
-    filtered_romes = {k: v for (k, v) in list(MANUAL_ROME_NAF_MAPPING.items()) if naf in v}
-    romes = sorted(list(filtered_romes.items()), key=lambda k_v: k_v[1][naf], reverse=True)
-    return [RomeTuple(rome[0], settings.ROME_DESCRIPTIONS[rome[0]], rome[1]) for rome in romes]
+    return [
+        RomeTuple(rome, settings.ROME_DESCRIPTIONS[rome], MANUAL_ROME_NAF_MAPPING[rome])
+        for rome, _hirings, _affinity in ROME_NAF_MATRIX.get_romes_for_naf(naf, by_hirings=True)
+    ]
 
 
 @lru_cache(maxsize=8 * 1024)  # about 500 rome_codes in current dataset and 5000 in sliced dataset
@@ -152,15 +120,9 @@ def nafs_for_rome(rome: Rome) -> List[NafTuple]:
         ...
     ]
     """
-    naf_mapping = MANUAL_ROME_NAF_MAPPING.get(rome, {})
-    nafs = sorted(list(naf_mapping.items()), key=lambda k_v1: k_v1[1], reverse=True)
     return [
-        NafTuple(
-            naf[0],
-            settings.NAF_CODES[naf[0]],
-            naf[1],
-            get_affinity_between_rome_and_naf(rome, naf[0]),
-        ) for naf in nafs
+        NafTuple(naf, settings.NAF_CODES[naf], hirings, affinity)
+        for naf, hirings, affinity in ROME_NAF_MATRIX.get_nafs_for_rome(rome, by_hirings=True)
     ]
 
 
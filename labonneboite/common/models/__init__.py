@@ -23,12 +23,13 @@ from labonneboite.common.models.office_mixin import PrimitiveOfficeMixin, Office
 from labonneboite.common.models.office_admin import OfficeAdminAdd, OfficeAdminRemove, OfficeUpdateMixin, \
     OfficeAdminUpdate, OfficeAdminExtraGeoLocation
 from labonneboite.common.models.office_third_party import OfficeThirdPartyUpdate
-from labonneboite.common.models.office import Office, OfficeResult
+from labonneboite.common.models.office import Office, OfficeResult, OfficeResultRecord
 from labonneboite.common.models.auth import TokenRefreshFailure, User, get_user_social_auth
 from labonneboite.common.models.user_favorite_offices import UserFavoriteOffice
 from labonneboite.common.models.recruiter_message import NoOfficeFoundException, RecruiterMessageCommon, \
     OtherRecruiterMessage, RemoveRecruiterMessage, UpdateCoordinatesRecruiterMessage, UpdateJobsRecruiterMessage
 from labonneboite.common.models.history_blacklist import HistoryBlacklist
+from labonneboite.common.models.index_high_water_mark import IndexHighWaterMark
 
 # pylint: enable=wildcard-import
 
@@ -36,10 +37,11 @@ __all__ = [
     "PrimitiveOfficeMixin", "OfficeMixin", "FinalOfficeMixin",
     "OfficeAdminAdd", "OfficeAdminRemove", "OfficeUpdateMixin", "OfficeAdminUpdate", "OfficeAdminExtraGeoLocation",
     "OfficeThirdPartyUpdate",
-    "Office", "OfficeResult",
+    "Office", "OfficeResult", "OfficeResultRecord",
     "TokenRefreshFailure", "User", "get_user_social_auth",
     "UserFavoriteOffice",
     "NoOfficeFoundException", "RecruiterMessageCommon", "OtherRecruiterMessage", "RemoveRecruiterMessage",
     "UpdateCoordinatesRecruiterMessage", "UpdateJobsRecruiterMessage",
     "HistoryBlacklist",
+    "IndexHighWaterMark",
 ]
@@ -0,0 +1,19 @@
+import datetime
+
+from sqlalchemy import Column
+from sqlalchemy import DateTime, Integer, String
+from labonneboite.common.database import Base
+from labonneboite.common.models.base import CRUDMixin
+
+
+class IndexHighWaterMark(CRUDMixin, Base):
+    """
+    Most recent `date_created` or `date_updated` of the rows of an admin table whose
+    changes were applied to the offices index, see `create_index.update_offices_delta`.
+    """
+    __tablename__ = 'index_high_water_marks'
+
+    id = Column(Integer, primary_key=True)
+    table_name = Column(String(191), nullable=False, unique=True)
+    high_water_mark = Column(DateTime, nullable=False)
+    date_updated = Column(DateTime, default=datetime.datetime.utcnow, nullable=False)
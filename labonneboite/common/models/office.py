@@ -19,7 +19,7 @@ from labonneboite.common.load_data import load_city_codes, load_groupements_empl
 from labonneboite.common.mapping import RomeTuple
 from labonneboite.common.models.base import CRUDMixin
 from labonneboite.common.conf import settings
-from labonneboite.common.models import FinalOfficeMixin, OfficeAdminUpdate
+from labonneboite.common.models import FinalOfficeMixin, OfficeAdminUpdate, OfficeMixin
 from labonneboite.common.scoring import get_score_from_hirings
 
 logger = logging.getLogger('main')
@@ -401,8 +401,9 @@ class OfficeResult(Office):
             zipcode: Optional[str] = None,
             extra_query_string: Optional[Dict[str, Any]] = None,
     ) -> JsonType:
-        json = dict(super().as_json(rome_codes=rome_codes, hiring_type=hiring_type, distance=distance, zipcode=zipcode,
-                                    extra_query_string=extra_query_string))
+        # Not using super() as this method is shared with OfficeResultRecord
+        json = dict(Office.as_json(self, rome_codes=rome_codes, hiring_type=hiring_type, distance=distance,
+                                   zipcode=zipcode, extra_query_string=extra_query_string))
         if self.distance is not None:
             json['distance'] = self.distance
 
@@ -423,3 +424,80 @@ class OfficeResult(Office):
         else:  # multi rome search context
             rome_code = self.matched_rome
         return rome_code
+
+
+# Office columns needed to display a search result, see `Office.as_json` and the results templates.
+OFFICE_RESULT_COLUMNS = (
+    'siret', 'company_name', 'office_name', 'naf', 'street_number', 'street_name', 'city_code', 'zipcode',
+    'departement', 'headcount', 'email', 'tel', 'website', 'social_network', 'email_alternance',
+    'phone_alternance', 'website_alternance', 'contact_mode', 'flag_alternance', 'flag_junior', 'flag_senior',
+    'flag_handicap', 'flag_pmsmp', 'score_alternance', 'x', 'y', 'hiring', 'has_multi_geolocations',
+)
+
+
+class OfficeResultRecord(object):
+    """
+    Lightweight read-only counterpart of `OfficeResult`, built from a row of
+    `OFFICE_RESULT_COLUMNS` (see `get_columns`) instead of a full `Office` instance.
+
+    It has no SQLAlchemy instance state, is not tracked by the session identity
+    map and has no per-instance `__dict__`, while exposing the same attributes
+    and presentation logic as `OfficeResult`.
+    """
+    __slots__ = OFFICE_RESULT_COLUMNS + ('matched_rome', 'distance', 'boost', 'offers_count', 'position', 'offers')
+
+    def __init__(self, row: Sequence[Any], *, position: Optional[int] = None) -> None:
+        for column, value in zip(OFFICE_RESULT_COLUMNS, row):
+            setattr(self, column, value)
+        self.matched_rome: Optional[str] = None
+        self.distance: Optional[float] = None
+        self.boost: Optional[bool] = False
+        self.offers_count: Optional[int] = None
+        self.position = position
+        self.offers: Optional[Sequence[Dict[str, Union[str, int]]]] = None
+
+    @staticmethod
+    def get_columns() -> List[Any]:
+        """
+        Office model attributes to query in order to build records.
+        """
+        return [getattr(Office, column) for column in OFFICE_RESULT_COLUMNS]
+
+    @staticmethod
+    def get_fields(office: OfficeMixin) -> Dict[str, Any]:
+        """
+        Values of `OFFICE_RESULT_COLUMNS` for the given office, as stored in Elasticsearch
+        to build records without querying the database (see `from_fields`).
+        """
+        return {column: getattr(office, column, None) for column in OFFICE_RESULT_COLUMNS}
+
+    @classmethod
+    def from_fields(cls, fields: Mapping[str, Any], *, position: Optional[int] = None) -> 'OfficeResultRecord':
+        return cls([fields.get(column) for column in OFFICE_RESULT_COLUMNS], position=position)
+
+    # Presentation logic shared with the Office model.
+    __unicode__ = Office.__unicode__
+    as_json = OfficeResult.as_json
+    get_matched_rome = OfficeResult.get_matched_rome
+    score = Office.score
+    longitude = Office.longitude
+    latitude = Office.latitude
+    address_fields = Office.address_fields
+    address_as_text = Office.address_as_text
+    phone = Office.phone
+    name = Office.name
+    google_url = Office.google_url
+    kompass_url = Office.kompass_url
+    is_groupement_employeurs = Office.is_groupement_employeurs
+    headcount_text = Office.headcount_text
+    is_small = Office.is_small
+    has_city = Office.has_city
+    city = Office.city
+    naf_text = Office.naf_text
+    stars = Office.stars
+    get_score_for_rome_code = Office.get_score_for_rome_code
+    get_stars_for_rome_code = Office.get_stars_for_rome_code
+    get_stars_for_rome_code_as_percentage = Office.get_stars_for_rome_code_as_percentage
+    url = Office.url
+    get_url_for_rome_code = Office.get_url_for_rome_code
+    show_multi_geolocations_msg = Office.show_multi_geolocations_msg
@@ -0,0 +1,45 @@
+"""
+Directories of NumPy arrays compiled from data files, e.g. the cities of the
+geocoding cache (`geocoding.compiled`) and the ROME NAF mapping
+(`rome_naf_matrix`).
+
+Each array is an `.npy` file, and a meta file holds the version of the
+format and a description of the files the arrays were compiled from. Arrays
+are memory-mapped when they are loaded: loading is almost free, and the pages
+of the files are shared by all the processes reading them.
+"""
+import json
+import os
+from typing import Dict, List, Optional
+
+import numpy as np
+
+META_FILENAME = 'meta.json'
+
+
+def save_arrays(arrays: Dict[str, np.ndarray], names: List[str], path: str, version: int, sources: Dict) -> None:
+    """
+    Write the `names` arrays in the `path` directory. `sources` describes the files they were compiled from:
+    `load_arrays` ignores the directory when these files or the `version` change.
+    """
+    os.makedirs(path, exist_ok=True)
+    for name in names:
+        np.save(os.path.join(path, name + '.npy'), arrays[name], allow_pickle=False)
+    # The meta file is written last: a directory without it is incomplete.
+    with open(os.path.join(path, META_FILENAME), 'w') as meta_file:
+        json.dump({'version': version, 'sources': sources}, meta_file)
+
+
+def load_arrays(names: List[str], path: str, version: int, sources: Dict) -> Optional[Dict[str, np.ndarray]]:
+    """
+    Memory-map the `names` arrays of the `path` directory.
+    Return None if they are missing or were compiled from other files or with another version.
+    """
+    try:
+        with open(os.path.join(path, META_FILENAME)) as meta_file:
+            meta = json.load(meta_file)
+    except FileNotFoundError:
+        return None
+    if meta != {'version': version, 'sources': sources}:
+        return None
+    return {name: np.load(os.path.join(path, name + '.npy'), mmap_mode='r', allow_pickle=False) for name in names}
@@ -0,0 +1,223 @@
+"""
+Compiled ROME NAF mapping: hirings of each (ROME, NAF) pair as a sparse matrix.
+
+ROME and NAF codes are numbered in their order of first appearance in the
+mapping. Pairs are stored row by row (one row per ROME, in CSR layout) with
+their hirings and affinities, and are also indexed column by column (one
+column per NAF). Rows and columns have a second view of their pairs sorted by
+decreasing hirings, and a dense table gives the position of any pair: every
+lookup is either O(1) or O(number of results).
+
+`save_rome_naf_matrix` writes the arrays as `.npy` files in a directory, which
+`load_rome_naf_matrix` memory-maps (see `npy_directory`), so that all processes
+share them.
+"""
+import os
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from labonneboite.common import npy_directory
+
+ROME_NAF_MATRIX_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), "data/rome_naf_matrix")
+
+# Bump this when the arrays change, so that outdated compiled directories are ignored.
+FORMAT_VERSION = 1
+
+ARRAY_NAMES = [
+    'rome_codes',
+    'naf_codes',
+    'row_offsets',
+    'entry_romes',
+    'entry_nafs',
+    'entry_hirings',
+    'entry_affinities',
+    'row_sorted_entries',
+    'column_offsets',
+    'column_entries',
+    'column_sorted_entries',
+    'rome_totals',
+    'naf_totals',
+    'entry_positions',
+]
+
+
+def compile_rome_naf_matrix(rome_naf_mapping: Dict[str, Dict[str, int]],
+                            naf_rome_mapping: Dict[str, Dict[str, int]]) -> Dict[str, np.ndarray]:
+    """
+    Convert the hirings by NAF by ROME and by ROME by NAF (as returned by
+    `load_data.load_rome_naf_mappings`) to the arrays of `RomeNafMatrix`.
+    """
+    rome_indexes = {rome: index for index, rome in enumerate(rome_naf_mapping)}
+    naf_indexes = {naf: index for index, naf in enumerate(naf_rome_mapping)}
+
+    row_offsets = np.zeros(len(rome_indexes) + 1, dtype=np.int64)
+    np.cumsum([len(hirings_by_naf) for hirings_by_naf in rome_naf_mapping.values()], out=row_offsets[1:])
+    entry_romes = np.repeat(np.arange(len(rome_indexes), dtype=np.int32), np.diff(row_offsets))
+    entry_nafs = np.array(
+        [naf_indexes[naf] for hirings_by_naf in rome_naf_mapping.values() for naf in hirings_by_naf],
+        dtype=np.int32,
+    )
+    entry_hirings = np.array(
+        [hirings for hirings_by_naf in rome_naf_mapping.values() for hirings in hirings_by_naf.values()],
+        dtype=np.int64,
+    )
+    entry_positions = np.full((len(rome_indexes), len(naf_indexes)), -1, dtype=np.int32)
+    entry_positions[entry_romes, entry_nafs] = np.arange(len(entry_hirings), dtype=np.int32)
+
+    column_offsets = np.zeros(len(naf_indexes) + 1, dtype=np.int64)
+    np.cumsum([len(hirings_by_rome) for hirings_by_rome in naf_rome_mapping.values()], out=column_offsets[1:])
+    column_entries = np.array([
+        entry_positions[rome_indexes[rome], naf_indexes[naf]]
+        for naf, hirings_by_rome in naf_rome_mapping.items() for rome in hirings_by_rome
+    ], dtype=np.int64)
+    if (column_entries < 0).any():
+        raise ValueError("ROME NAF pairs of both mappings should be the same")
+
+    rome_totals = np.bincount(entry_romes, weights=entry_hirings, minlength=len(rome_indexes)).astype(np.int64)
+    naf_totals = np.bincount(entry_nafs, weights=entry_hirings, minlength=len(naf_indexes)).astype(np.int64)
+
+    # Stable sorts: pairs with the same hirings are sorted by position in a row, and by ROME in a column.
+    row_sorted_entries = np.lexsort((np.arange(len(entry_hirings)), -entry_hirings, entry_romes))
+    column_sorted_entries = np.lexsort((entry_romes, -entry_hirings, entry_nafs))
+
+    return {
+        'rome_codes': np.array([rome.encode('utf-8') for rome in rome_indexes], dtype=bytes),
+        'naf_codes': np.array([naf.encode('utf-8') for naf in naf_indexes], dtype=bytes),
+        'row_offsets': row_offsets,
+        'entry_romes': entry_romes,
+        'entry_nafs': entry_nafs,
+        'entry_hirings': entry_hirings,
+        'entry_affinities': entry_hirings / naf_totals[entry_nafs],
+        'row_sorted_entries': row_sorted_entries,
+        'column_offsets': column_offsets,
+        'column_entries': column_entries,
+        'column_sorted_entries': column_sorted_entries,
+        'rome_totals': rome_totals,
+        'naf_totals': naf_totals,
+        'entry_positions': entry_positions,
+    }
+
+
+def save_rome_naf_matrix(arrays: Dict[str, np.ndarray], path: str, sources: Dict) -> None:
+    """
+    Write compiled arrays in the `path` directory, see `npy_directory.save_arrays`.
+    """
+    npy_directory.save_arrays(arrays, ARRAY_NAMES, path, FORMAT_VERSION, sources)
+
+
+def load_rome_naf_matrix(path: str, sources: Dict) -> Optional['RomeNafMatrix']:
+    """
+    Memory-map the compiled arrays of the `path` directory.
+    Return None if they are missing or were compiled from other files.
+    """
+    arrays = npy_directory.load_arrays(ARRAY_NAMES, path, FORMAT_VERSION, sources)
+    return RomeNafMatrix(arrays) if arrays is not None else None
+
+
+class RomeNafMatrix(object):
+    """
+    Read-only hirings and affinities of the ROME NAF pairs, backed by the arrays of `compile_rome_naf_matrix`.
+
+    The affinity of a pair is the ratio of the hirings of its NAF made by its ROME.
+    """
+
+    def __init__(self, arrays: Dict[str, np.ndarray]) -> None:
+        for name in ARRAY_NAMES:
+            # Plain ndarray views of memory-mapped arrays: indexing np.memmap instances is much slower.
+            setattr(self, name, np.asarray(arrays[name]))
+        self.romes: List[str] = [rome.decode('utf-8') for rome in self.rome_codes.tolist()]
+        self.nafs: List[str] = [naf.decode('utf-8') for naf in self.naf_codes.tolist()]
+        self.rome_indexes: Dict[str, int] = {rome: index for index, rome in enumerate(self.romes)}
+        self.naf_indexes: Dict[str, int] = {naf: index for index, naf in enumerate(self.nafs)}
+
+    def __len__(self) -> int:
+        """
+        Number of ROME NAF pairs.
+        """
+        return len(self.entry_hirings)
+
+    def get_position(self, rome: str, naf: str) -> Optional[int]:
+        """
+        Position of the pair in the entry arrays, or None if the ROME is not mapped to the NAF.
+        """
+        rome_index = self.rome_indexes.get(rome)
+        naf_index = self.naf_indexes.get(naf)
+        if rome_index is None or naf_index is None:
+            return None
+        position = int(self.entry_positions[rome_index, naf_index])
+        return position if position >= 0 else None
+
+    def get_hirings(self, rome: str, naf: str) -> int:
+        """
+        Raise KeyError if the ROME is not mapped to the NAF.
+        """
+        position = self.get_position(rome, naf)
+        if position is None:
+            raise KeyError((rome, naf))
+        return int(self.entry_hirings[position])
+
+    def get_affinity(self, rome: str, naf: str) -> float:
+        """
+        Raise KeyError if the ROME is not mapped to the NAF.
+        """
+        position = self.get_position(rome, naf)
+        if position is None:
+            raise KeyError((rome, naf))
+        return float(self.entry_affinities[position])
+
+    def get_total_rome_hirings(self, rome: str) -> int:
+        return int(self.rome_totals[self.rome_indexes[rome]])
+
+    def get_total_naf_hirings(self, naf: str) -> int:
+        return int(self.naf_totals[self.naf_indexes[naf]])
+
+    def get_row_entries(self, rome: str, by_hirings: bool = False) -> np.ndarray:
+        """
+        Positions of the pairs of a ROME, in the order of the mapping or by decreasing hirings.
+        Empty for unknown ROME codes.
+        """
+        rome_index = self.rome_indexes.get(rome)
+        if rome_index is None:
+            return np.empty(0, dtype=np.int64)
+        start, end = self.row_offsets[rome_index], self.row_offsets[rome_index + 1]
+        return self.row_sorted_entries[start:end] if by_hirings else np.arange(start, end)
+
+    def get_column_entries(self, naf: str, by_hirings: bool = False) -> np.ndarray:
+        """
+        Positions of the pairs of a NAF, in the order of the mapping or by decreasing hirings.
+        Empty for unknown NAF codes.
+        """
+        naf_index = self.naf_indexes.get(naf)
+        if naf_index is None:
+            return np.empty(0, dtype=np.int64)
+        start, end = self.column_offsets[naf_index], self.column_offsets[naf_index + 1]
+        return (self.column_sorted_entries if by_hirings else self.column_entries)[start:end]
+
+    def get_nafs_for_rome(self, rome: str, by_hirings: bool = False) -> List[Tuple[str, int, float]]:
+        """
+        `(naf, hirings, affinity)` of the pairs of a ROME.
+        """
+        entries = self.get_row_entries(rome, by_hirings)
+        nafs = self.nafs
+        return [
+            (nafs[naf_index], hirings, affinity) for naf_index, hirings, affinity in zip(
+                self.entry_nafs[entries].tolist(),
+                self.entry_hirings[entries].tolist(),
+                self.entry_affinities[entries].tolist(),
+            )
+        ]
+
+    def get_romes_for_naf(self, naf: str, by_hirings: bool = False) -> List[Tuple[str, int, float]]:
+        """
+        `(rome, hirings, affinity)` of the pairs of a NAF.
+        """
+        entries = self.get_column_entries(naf, by_hirings)
+        romes = self.romes
+        return [
+            (romes[rome_index], hirings, affinity) for rome_index, hirings, affinity in zip(
+                self.entry_romes[entries].tolist(),
+                self.entry_hirings[entries].tolist(),
+                self.entry_affinities[entries].tolist(),
+            )
+        ]
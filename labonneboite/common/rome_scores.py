@@ -0,0 +1,114 @@
+"""
+Vectorized computation of the scores by ROME of offices, as indexed in Elasticsearch.
+
+The score of an office for a ROME only depends on its NAF and its hirings:
+
+    score = get_score_from_hirings(hiring * affinity(rome, naf))
+
+and it is kept if it is at least `get_score_minimum_for_rome(rome)`.
+
+`RomeScoresTable` computes once the arrays of the ROME codes, affinities and
+minimum scores of every NAF. The scores of many offices are then computed by a
+single array operation instead of one function call per office and ROME.
+"""
+import struct
+from typing import Dict, List, Sequence
+
+import numpy as np
+
+from labonneboite.common import mapping as mapping_util
+from labonneboite.common import scoring as scoring_util
+from labonneboite.common.mapping import Naf, Rome
+
+MAX_SCORE = 100
+
+
+def _float_to_bits(value: float) -> int:
+    return struct.unpack('<q', struct.pack('<d', value))[0]
+
+
+def _bits_to_float(bits: int) -> float:
+    return struct.unpack('<d', struct.pack('<q', bits))[0]
+
+
+def get_score_thresholds() -> np.ndarray:
+    """
+    Return the array `thresholds` such that `thresholds[s - 1]` is the lowest hirings value
+    whose score is at least `s`, for `s` between 1 and 100.
+
+    `get_score_from_hirings` is non-decreasing, so the score of any hirings value `h` is the
+    number of thresholds lower than or equal to `h`, i.e. `np.searchsorted(thresholds, h, 'right')`.
+    Thresholds are found by bisection on the (ordered) binary representation of positive
+    floats, so that vectorized scores are exactly the ones of `get_score_from_hirings`.
+    """
+    upper_bits = _float_to_bits(float(scoring_util.get_hirings_from_score(MAX_SCORE)))
+    while scoring_util.get_score_from_hirings(_bits_to_float(upper_bits)) < MAX_SCORE:
+        upper_bits = _float_to_bits(2 * _bits_to_float(upper_bits))
+
+    thresholds = np.empty(MAX_SCORE, dtype=np.float64)
+    low_bits = 0
+    for score in range(1, MAX_SCORE + 1):
+        # Lowest float with at least this score, thresholds are non-decreasing.
+        high_bits = upper_bits
+        while low_bits < high_bits:
+            middle_bits = (low_bits + high_bits) // 2
+            if scoring_util.get_score_from_hirings(_bits_to_float(middle_bits)) >= score:
+                high_bits = middle_bits
+            else:
+                low_bits = middle_bits + 1
+        thresholds[score - 1] = _bits_to_float(low_bits)
+    return thresholds
+
+
+class RomeScoresTable(object):
+    """
+    ROME codes, affinities and minimum scores of all NAF codes, stored as flat arrays:
+    the ROME codes of the NAF `naf` are at positions `offsets[naf_indexes[naf]]` to
+    `offsets[naf_indexes[naf] + 1]` (excluded).
+
+    Minimum scores are read once, when the table is built: build a new table when
+    `scoring.SCORE_FOR_ROME_MINIMUM` or the metiers en tension change.
+    """
+
+    def __init__(self) -> None:
+        self.thresholds = get_score_thresholds()
+        matrix = mapping_util.ROME_NAF_MATRIX
+        self.naf_indexes: Dict[Naf, int] = dict(matrix.naf_indexes)
+        # The ROME codes of a NAF are the ones of its column in the ROME NAF matrix.
+        self.romes: List[Rome] = [matrix.romes[index] for index in matrix.entry_romes[matrix.column_entries].tolist()]
+        self.affinities = np.asarray(matrix.entry_affinities[matrix.column_entries], dtype=np.float64)
+        # Unfortunately some NAF codes have no matching ROME at all: they all share this last empty range.
+        self.missing_naf_index = len(matrix.nafs)
+        self.offsets = np.append(matrix.column_offsets, len(self.romes)).astype(np.int64)
+        self.minimums = np.array([scoring_util.get_score_minimum_for_rome(rome) for rome in self.romes])
+
+    def get_scores(self, hirings: np.ndarray, affinities: np.ndarray) -> np.ndarray:
+        """
+        Vectorized `get_score_from_hirings(hiring * affinity)`.
+        """
+        return np.searchsorted(self.thresholds, hirings.astype(np.float64) * affinities, side='right')
+
+    def get_scores_by_rome(self, nafs: Sequence[Naf], hirings: Sequence[int]) -> List[Dict[Rome, int]]:
+        """
+        Return the `scores_by_rome` of offices having the given NAF codes and hirings.
+        Scores of all (office, ROME of its NAF) pairs are computed at once.
+        """
+        office_count = len(nafs)
+        naf_indexes = np.array([self.naf_indexes.get(naf, self.missing_naf_index) for naf in nafs], dtype=np.int64)
+        starts = self.offsets[naf_indexes]
+        lengths = self.offsets[naf_indexes + 1] - starts
+
+        # One entry per (office, ROME of its NAF) pair.
+        entry_offices = np.repeat(np.arange(office_count), lengths)
+        entry_positions = np.arange(lengths.sum()) + np.repeat(starts - (np.cumsum(lengths) - lengths), lengths)
+        scores = self.get_scores(np.asarray(hirings, dtype=np.int64)[entry_offices], self.affinities[entry_positions])
+        reachable = scores >= self.minimums[entry_positions]
+
+        reachable_positions = entry_positions[reachable].tolist()
+        reachable_scores = scores[reachable].tolist()
+        bounds = np.searchsorted(entry_offices[reachable], np.arange(office_count + 1)).tolist()
+        romes = self.romes
+        return [{
+            romes[position]: score
+            for position, score in zip(reachable_positions[start:end], reachable_scores[start:end])
+        } for start, end in zip(bounds[:-1], bounds[1:])]
@@ -159,8 +159,7 @@ def get_score_adjusted_to_rome_code_and_naf_code(*, rome_code: Rome, naf_code: N
     # - no rome_code in context (favorites page, office page...)
     # - orphaned naf_code (no related rome_code)
     # - rome_code is not related to the naf_code (custom ROME via SAVE)
-    if (not rome_code or naf_code not in mapping_util.MANUAL_NAF_ROME_MAPPING
-            or rome_code not in mapping_util.MANUAL_NAF_ROME_MAPPING[naf_code]):
+    if not rome_code or mapping_util.ROME_NAF_MATRIX.get_position(rome_code, naf_code) is None:
         return get_score_from_hirings(hiring) if hiring is not None else score
 
     total_office_hirings = hiring if hiring is not None else get_hirings_from_score(score)
@@ -3,17 +3,19 @@ import logging
 from collections import OrderedDict
 from datetime import datetime
 from enum import Enum
-from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple, Union
 
 from astroid import decorators
 from slugify import slugify
 
 from labonneboite.common import mapping as mapping_util
-from labonneboite.common import hiring_type_util, sorting, util
+from labonneboite.common import geocoding, hiring_type_util, search_cache, sorting, util
 from labonneboite.common.conf import settings
-from labonneboite.common.es import Elasticsearch
+from labonneboite.common.database import db_session
+from labonneboite.common.es import (Elasticsearch, MultiSearch, OFFICE_RESULT_FIELD, ROME_CODES_FIELDS,
+                                    get_search_routing, routing_params)
 from labonneboite.common.fetcher import Fetcher
-from labonneboite.common.models import Office, OfficeResult
+from labonneboite.common.models import Office, OfficeResult, OfficeResultRecord
 from labonneboite.common.pagination import OFFICES_PER_PAGE
 from labonneboite.common.rome_mobilities import ROME_MOBILITIES
 
@@ -35,7 +37,7 @@ RangeType = Dict[str, int]
 ValueType = Union[TermsType, TermType, RangeType]
 Filter = Dict[str, Dict[str, Any]]
 
-OfficesType = Sequence[OfficeResult]
+OfficesType = Sequence[Union[OfficeResult, OfficeResultRecord]]
 NafAggregationType = Sequence[Dict]
 HeadcountAggregationType = Dict
 DistanceAggregationType = Dict
@@ -54,10 +56,30 @@ KEY_TO_LABEL_DISTANCES = {
 FILTERS = ['naf', 'headcount', 'hiring_type', 'distance']
 DISTANCE_FILTER_MAX = 3000
 
+# Filters which have their own facet, see `HiddenMarketFetcher.get_facets`.
+# The `hiring_type` facet is returned under the `contract` key.
+FACETS = ['naf', 'headcount', 'hiring_type', 'distance']
+CONTRACT_FACET_KEY = 'contract'
+
+# Suggested distances (in km) when a search has few results.
+ALTERNATIVE_DISTANCES = [(30, '30 km'), (50, '50 km'), (3000, 'France entière')]
+
+# Keys of the requests sent in `_msearch` batches by `get_offices`.
+OFFICES_REQUEST = 'offices'
+SUGGESTIONS_REQUEST = 'suggestions'
+ALTERNATIVE_ROME_REQUEST = 'alternative_rome'
+ALTERNATIVE_DISTANCE_REQUEST = 'alternative_distance'
+
 DPAE_SCORE_FIELD_NAME = 'scores_by_rome'
 ALTERNANCE_SCORE_FIELD_NAME = 'scores_alternance_by_rome'
 
 
+def get_randomization_seed() -> str:
+    # Use a different seed every day. This way results are shuffled again
+    # every 24 hours.
+    return datetime.today().strftime('%Y-%m-%d')
+
+
 class HiddenMarketFetcher(Fetcher):
     """
     Fetch offices having a high hiring potential whether or not they
@@ -158,74 +180,186 @@ class HiddenMarketFetcher(Fetcher):
         return self.audience == AudienceFilter.SENIOR
 
     def update_aggregations(self, aggregations):
+        """
+        Aggregations returned by `get_offices` are filtered by all active filters.
+        Replace the ones whose own filter is active by their facet.
+        """
+        facets = []
         if self.headcount and 'headcount' in aggregations:
-            aggregations['headcount'] = self.get_headcount_aggregations()
+            facets.append('headcount')
         if self.distance != DISTANCE_FILTER_MAX and 'distance' in aggregations:
-            aggregations['distance'] = self.get_distance_aggregations()
+            facets.append('distance')
         if self.naf and 'naf' in aggregations:
-            aggregations['naf'] = self.get_naf_aggregations()
+            facets.append('naf')
+        if facets:
+            aggregations.update(self.get_facets(facets))
+
+    def _build_count_query(self):
+        return self._build_elastic_search_query(omit_sort=True, omit_aggretation=True, omit_pagination=True)
 
     def _get_office_count(self):
-        query = self._build_elastic_search_query(omit_sort=True, omit_aggretation=True, omit_pagination=True)
-        return self._count_offices_from_es(query)
+        return self._count_offices_from_es(self._build_count_query(), self._get_routing())
 
     @staticmethod
-    def _count_offices_from_es(json_body) -> int:
+    def _count_offices_from_es(json_body, routing: Optional[str] = None) -> int:
         es = Elasticsearch()
-        res = es.count(index=settings.ES_INDEX, doc_type="office", body=json_body)
+        res = es.count(index=settings.ES_INDEX, doc_type="office", body=json_body, **routing_params(routing))
         return res["count"]
 
+    def _get_routing(self, distance=unset) -> Optional[str]:
+        """
+        Routing of the searches of offices within `distance` (defaults to the searched distance), when offices are
+        routed by departement (see `es.get_office_routing`): only the shards of the departements which may have
+        offices in the searched area are queried. None if all shards should be queried.
+        """
+        if not settings.ES_OFFICES_ROUTED_BY_DEPARTEMENT:
+            return None
+        departements = None
+        if self.gps_available:
+            distance = self.distance if distance is unset else distance
+            departements = set(geocoding.departements_within(
+                self.latitude, self.longitude, distance + settings.ES_ROUTING_MARGIN_KM))
+        if self.departments:
+            searched_departements = {str(departement) for departement in self.departments}
+            departements = searched_departements if departements is None else departements & searched_departements
+        if departements is None:
+            return None
+        return get_search_routing(departements)
+
     def get_naf_aggregations(self):
-        clone = self.clone(
-            naf_codes={},  # No naf filter
-            aggregate_by=["naf"],  # Only naf aggregate
-        )
-        _, aggregations = clone.get_offices()
-        return aggregations['naf']
+        return self.get_facets(['naf'])['naf']
 
     def get_headcount_aggregations(self):
-        clone = self.clone(
-            aggregate_by=["headcount"],  # Only headcount aggregate
-            headcount=settings.HEADCOUNT_WHATEVER,  # No headcount filter
-        )
-        _, aggregations = clone.get_offices()
-        return aggregations['headcount']
+        return self.get_facets(['headcount'])['headcount']
 
     def get_contract_aggregations(self):
+        return self.get_facets(['hiring_type'])[CONTRACT_FACET_KEY]
+
+    def get_distance_aggregations(self):
+        return self.get_facets(['distance'])['distance']
+
+    def get_facets(self, facets: Optional[Sequence[str]] = None) -> AggregationsType:
         """
-        As contract/hiring_type (dpae/alternance) is not technically a filter,
-        we cannot do a regular aggregation about it. Instead we manually
-        do two ES calls everytime.
+        Compute the aggregations of the given `facets` (defaults to `aggregate_by`)
+        in a single Elasticsearch request.
+
+        Each facet is counted with all active filters but its own, so that users
+        can see what they would get by changing it: facet filters are moved from
+        the query to the `post_filter` and each facet is a `filter` aggregation
+        excluding its own filter.
+
+        As contract/hiring_type (dpae/alternance) is not technically a field, its
+        facet counts the offices having a score for any of the searched romes for
+        each hiring type. It is returned under the `contract` key.
+
+        `office_count` is set as a side effect.
         """
-        total_dpae = self.clone(hiring_type=hiring_type_util.DPAE)._get_office_count()
+        facets = [facet for facet in (facets or self.aggregate_by or []) if facet in FACETS]
+        cache_key = self._get_cache_key('facets', facets=facets)
+        es_res = search_cache.get(cache_key)
+        if es_res is None:
+            # The distance facet is computed for the whole France
+            es_res = self._get_offices_from_es(self._build_facets_query(facets), self._get_routing(DISTANCE_FILTER_MAX))
+            search_cache.store(cache_key, es_res)
+
+        self.office_count = es_res['hits']['total']
+        logger.debug("set office_count to %s", self.office_count)
 
-        total_alternance = self.clone(hiring_type=hiring_type_util.ALTERNANCE)._get_office_count()
+        aggregations_raw = es_res.get('aggregations', {})
+        aggregations: AggregationsType = {}
+        if 'naf' in facets:
+            aggregations['naf'] = self._aggregate_naf(aggregations_raw['naf'])
+        if 'headcount' in facets:
+            aggregations['headcount'] = self._aggregate_headcount(aggregations_raw['headcount'])
+        if 'hiring_type' in facets:
+            aggregations[CONTRACT_FACET_KEY] = {
+                contract: aggregations_raw['hiring_type'][contract]['doc_count']
+                for contract in hiring_type_util.CONTRACT_VALUES
+            }
+        if 'distance' in facets:
+            # Distance is not an ES field: it can only be aggregated around a GPS location.
+            aggregations['distance'] = (self._aggregate_distance(aggregations_raw['distance'])
+                                        if self.gps_available else {})
+        return aggregations
+
+    def _build_facets_query(self, facets: Sequence[str]) -> Dict:
+        filters_by_facet = {facet: self._build_es_facet_filters(facet) for facet in FACETS}
+
+        def filters_excluding(excluded_facet=None):
+            return [
+                facet_filter for facet, facet_filters in filters_by_facet.items() if facet != excluded_facet
+                for facet_filter in facet_filters
+            ]
+
+        query: Dict = {
+            "query": {"filtered": {"filter": {"bool": {"must": self._build_es_query_filters(exclude=FACETS)}}}},
+            "post_filter": self._all_filters(filters_excluding()),
+            "size": 0,
+            "aggs": {},
+        }
 
-        return {'alternance': total_alternance, 'dpae': total_dpae}
+        for facet in facets:
+            if facet == 'distance' and not self.gps_available:
+                continue
+            if facet == 'hiring_type':
+                facet_aggregations = {
+                    contract: {
+                        "filter": self._build_rome_in_scores_filter(self.romes, hiring_type),
+                    } for contract, hiring_type in hiring_type_util.CONTRACT_TO_HIRING_TYPE.items()
+                }
+            else:
+                facet_aggregations = {facet: self._build_aggregation(facet)}
+            query['aggs'][facet] = {
+                "filter": self._all_filters(filters_excluding(facet)),
+                "aggs": facet_aggregations,
+            }
 
-    def get_distance_aggregations(self):
-        clone = self.clone(
-            distance=DISTANCE_FILTER_MAX,  # France
-            aggregate_by=["distance"],
-        )
-        _, aggregations = clone.get_offices()
-        return aggregations['distance']
+        return query
+
+    @staticmethod
+    def _all_filters(filters: Sequence[Filter]) -> Filter:
+        if not filters:
+            return {"match_all": {}}
+        return {"bool": {"must": filters}}
 
     def compute_office_count(self):
         self.office_count = self._get_office_count()
         logger.debug("set office_count to %s", self.office_count)
 
     def get_offices(self, add_suggestions=False) -> Tuple[OfficesType, AggregationsType]:
-        self.compute_office_count()
+        """
+        Fetch the current page of offices and, if `add_suggestions` is set, the
+        counts of alternative romes and distances.
 
+        The page is fetched speculatively: the office count is read from the
+        `hits.total` of the search response instead of a dedicated count query.
+        The page is only fetched again in the rare case it turns out to be out
+        of range.
+
+        Suggestion counts are only needed when the search has less results than
+        a page: they are then sent to Elasticsearch in a single `_msearch`, in a
+        second round trip.
+
+        Responses are cached until the randomization seed rolls over, see
+        `search_cache`.
+        """
         current_page_size = self.to_number - self.from_number + 1
 
+        query = self._build_elastic_search_query()
+        responses = self._execute_multi_search(
+            OFFICES_REQUEST, lambda planner: planner.add(OFFICES_REQUEST, query, routing=self._get_routing()))
+
+        es_res: Optional[Dict] = responses[OFFICES_REQUEST]
+        self.office_count = es_res['hits']['total']
+        logger.debug("set office_count to %s", self.office_count)
+
         # Needed in rare case when an old page is accessed (via user bookmark and/or crawling bot)
         # which no longer exists due to newer office dataset having less result pages than before
-        # for this search.
+        # for this search. The speculatively fetched page is empty: it has to be fetched again.
         if self.from_number > self.office_count:
             self.from_number = 1
             self.to_number = current_page_size
+            es_res = None
 
         # Adjustement needed when the last page is requested and does not have exactly page_size items.
         if self.to_number > self.office_count + 1:
@@ -234,27 +368,80 @@ class HiddenMarketFetcher(Fetcher):
         result: OfficesType = []
         aggregations: AggregationsType = {}
         if self.office_count:
-            result, aggregations = self._fetch_offices()
+            result, aggregations = self._fetch_offices(es_res)
 
         if self.office_count <= current_page_size and add_suggestions:
-
-            # Suggest other jobs.
-            # Build a flat list of all the alternative romes of all searched romes.
-            alternative_rome_codes = [alt_rome for rome in self.romes for alt_rome in ROME_MOBILITIES[rome]]
-            for rome in set(alternative_rome_codes) - set(self.romes):
-                office_count = self.clone(romes=[rome])._get_office_count()
-                self.alternative_rome_codes[rome] = office_count
-
-            # Suggest other distances.
-            last_count = 0
-            for distance, distance_label in [(30, '30 km'), (50, '50 km'), (3000, 'France entière')]:
-                office_count = self.clone(distance=distance)._get_office_count()
-                if office_count > last_count:
-                    last_count = office_count
-                    self.alternative_distances[distance] = (distance_label, last_count)
+            self._set_suggestions(self._execute_multi_search(SUGGESTIONS_REQUEST, self._plan_suggestions))
 
         return result, aggregations
 
+    def _execute_multi_search(self, request: str, plan: Callable[[MultiSearch], None]) -> Dict:
+        """
+        Send the searches added by `plan` in a single `_msearch`, unless their
+        responses are cached under the given `request` name.
+        """
+        cache_key = self._get_cache_key(request)
+        responses = search_cache.get(cache_key)
+        if responses is None:
+            planner = MultiSearch()
+            plan(planner)
+            responses = planner.execute()
+            search_cache.store(cache_key, responses)
+        return responses
+
+    def _get_cache_key(self, request: str, **params) -> str:
+        """
+        Key of the responses of the given `request` in the search cache: it
+        identifies all the parameters the request depends on.
+        """
+        return search_cache.make_key(
+            index=search_cache.get_live_index(),
+            request=request,
+            romes=self.romes,
+            latitude=self.latitude,
+            longitude=self.longitude,
+            departments=self.departments,
+            distance=self.distance,
+            naf_codes=self.naf_codes,
+            headcount=self.headcount,
+            audience=self.audience,
+            flag_pmsmp=self.flag_pmsmp,
+            hiring_type=self.hiring_type,
+            sort=self.sort,
+            from_number=self.from_number,
+            to_number=self.to_number,
+            aggregate_by=self.aggregate_by,
+            seed=get_randomization_seed(),
+            **params,
+        )
+
+    def _alternative_romes(self) -> Sequence[str]:
+        # Build a flat list of all the alternative romes of all searched romes.
+        alternative_rome_codes = [alt_rome for rome in self.romes for alt_rome in ROME_MOBILITIES[rome]]
+        return sorted(set(alternative_rome_codes) - set(self.romes))
+
+    def _plan_suggestions(self, planner: MultiSearch):
+        for rome in self._alternative_romes():
+            planner.add((ALTERNATIVE_ROME_REQUEST, rome), self.clone(romes=[rome])._build_count_query(),
+                        count_only=True, routing=self._get_routing())
+        for distance, _ in ALTERNATIVE_DISTANCES:
+            planner.add((ALTERNATIVE_DISTANCE_REQUEST, distance),
+                        self.clone(distance=distance)._build_count_query(),
+                        count_only=True, routing=self._get_routing(distance))
+
+    def _set_suggestions(self, responses: Dict):
+        # Suggest other jobs.
+        for rome in self._alternative_romes():
+            self.alternative_rome_codes[rome] = responses[(ALTERNATIVE_ROME_REQUEST, rome)]['hits']['total']
+
+        # Suggest other distances.
+        last_count = 0
+        for distance, distance_label in ALTERNATIVE_DISTANCES:
+            office_count = responses[(ALTERNATIVE_DISTANCE_REQUEST, distance)]['hits']['total']
+            if office_count > last_count:
+                last_count = office_count
+                self.alternative_distances[distance] = (distance_label, last_count)
+
     def get_alternative_rome_descriptions(self):
         alternative_rome_descriptions = []
         for alternative, count in self.alternative_rome_codes.items():
@@ -264,10 +451,14 @@ class HiddenMarketFetcher(Fetcher):
                 alternative_rome_descriptions.append([alternative, desc, slug, count])
         return alternative_rome_descriptions
 
-    def _fetch_offices(self) -> Tuple[OfficesType, AggregationsType]:
-        query = self._build_elastic_search_query()
+    def _fetch_offices(self, es_res: Optional[Dict] = None) -> Tuple[OfficesType, AggregationsType]:
+        """
+        `es_res`: optional response of an already sent search request (see `get_offices`).
+        """
+        if es_res is None:
+            es_res = self._get_offices_from_es(self._build_elastic_search_query(), self._get_routing())
 
-        offices, aggregations_raw = self._get_offices_from_es_and_db(query)
+        offices, aggregations_raw = self._get_offices_from_es_and_db(es_res)
 
         # Extract aggregations
         aggregations: AggregationsType = {}
@@ -409,9 +600,7 @@ class HiddenMarketFetcher(Fetcher):
                 "functions": [
                     {
                         "random_score": {
-                            # Use a different seed every day. This way results are shuffled again
-                            # every 24 hours.
-                            "seed": datetime.today().strftime('%Y-%m-%d'),
+                            "seed": get_randomization_seed(),
                         },
                     },
                 ],
@@ -474,35 +663,37 @@ class HiddenMarketFetcher(Fetcher):
         if self.aggregate_by:
             json_body['aggs'] = {}
             for aggregate in self.aggregate_by:
-                # Distance is not an ES field, so we have to do a specific aggregation.
-                if aggregate == 'distance' and self.gps_available:
-                    json_body['aggs']['distance'] = {
-                        'geo_distance': {
-                            "field": "locations",
-                            "origin": f"{self.latitude},{self.longitude}",
-                            'unit': 'km',
-                            'ranges': [{
-                                'to': 10
-                            }, {
-                                'to': 30
-                            }, {
-                                'to': 50
-                            }, {
-                                'to': 100
-                            }, {
-                                'to': 3000
-                            }],
-                        }
-                    }
                 # We cannot use aggregation for contract=dpae/alternance, as both kinds use different
                 # logics and are not simply two different values of the same field.
-                elif aggregate == 'contract':
-                    pass
-                else:
-                    json_body['aggs'][aggregate] = {"terms": {"field": aggregate, }}
+                if aggregate == 'contract':
+                    continue
+                json_body['aggs'][aggregate] = self._build_aggregation(aggregate)
 
         return json_body
 
+    def _build_aggregation(self, aggregate: str) -> Dict:
+        # Distance is not an ES field, so we have to do a specific aggregation.
+        if aggregate == 'distance' and self.gps_available:
+            return {
+                'geo_distance': {
+                    "field": "locations",
+                    "origin": f"{self.latitude},{self.longitude}",
+                    'unit': 'km',
+                    'ranges': [{
+                        'to': 10
+                    }, {
+                        'to': 30
+                    }, {
+                        'to': 50
+                    }, {
+                        'to': 100
+                    }, {
+                        'to': 3000
+                    }],
+                }
+            }
+        return {"terms": {"field": aggregate, }}
+
     def _add_pagination(self, json_body):
         # Process from_number and to_number.
         if self.from_number:
@@ -516,46 +707,72 @@ class HiddenMarketFetcher(Fetcher):
 
         return json_body
 
-    def _build_es_query_filters(self) -> Sequence[Filter]:
+    def _build_es_query_filters(self, exclude: Sequence[str] = ()) -> Sequence[Filter]:
+        """
+        `exclude`: facets whose filters should be left out, see `get_facets`.
+        """
         filters: List[Filter] = []
         self._add_filter_range('score', gt=0, to=filters)
-        self._add_filter_terms('naf', self.naf_codes, to=filters, if_=bool(self.naf_codes))
-
-        self._add_headcount_filter(self.headcount, to=filters)
+        self._add_facet_filters('naf', to=filters, if_='naf' not in exclude)
+        self._add_facet_filters('headcount', to=filters, if_='headcount' not in exclude)
 
         self._add_filter_term('flag_junior', to=filters, if_=self.flag_junior == 1)
         self._add_filter_term('flag_senior', to=filters, if_=self.flag_senior == 1)
         self._add_filter_term('flag_handicap', to=filters, if_=self.flag_handicap == 1)
 
         # at least one of these fields should exist
-        self._unsure_rome_is_in_scores(self.romes, self.hiring_type, to=filters)
+        self._add_facet_filters('hiring_type', to=filters, if_='hiring_type' not in exclude)
 
-        if self.gps_available:
-            filters.append({
-                "geo_distance": {
-                    "distance": "%skm" % self.distance,
-                    "locations": {
-                        "lat": self.latitude,
-                        "lon": self.longitude,
-                    }
-                }
-            })
+        if 'distance' not in exclude:
+            self._add_facet_filters('distance', to=filters)
+        elif self.gps_available:
+            # Distance facet is computed for the whole France
+            filters.append(self._build_geo_distance_filter(DISTANCE_FILTER_MAX))
 
         self._add_filter_terms('department', self.departments, to=filters, if_=self.departments)
         self._add_filter_term('flag_pmsmp', 1, to=filters, if_=self.flag_pmsmp == 1)
         return filters
 
-    def _get_offices_from_es_and_db(self, query) -> Tuple[OfficesType, Sequence[Dict]]:
+    def _add_facet_filters(self, facet: str, *, to: List[Filter], if_=True):
+        if if_:
+            to.extend(self._build_es_facet_filters(facet))
+
+    def _build_es_facet_filters(self, facet: str) -> List[Filter]:
+        filters: List[Filter] = []
+        if facet == 'naf':
+            self._add_filter_terms('naf', self.naf_codes, to=filters, if_=bool(self.naf_codes))
+        elif facet == 'headcount':
+            self._add_headcount_filter(self.headcount, to=filters)
+        elif facet == 'hiring_type':
+            self._unsure_rome_is_in_scores(self.romes, self.hiring_type, to=filters)
+        elif facet == 'distance':
+            if self.gps_available:
+                filters.append(self._build_geo_distance_filter(self.distance))
+        else:
+            raise ValueError(f'unknown facet {facet!r}')
+        return filters
+
+    def _build_geo_distance_filter(self, distance) -> Filter:
+        return {
+            "geo_distance": {
+                "distance": "%skm" % distance,
+                "locations": {
+                    "lat": self.latitude,
+                    "lon": self.longitude,
+                }
+            }
+        }
+
+    def _get_offices_from_es_and_db(self, es_res: Dict) -> Tuple[OfficesType, Sequence[Dict]]:
         """
-        Fetch offices first from Elasticsearch, then from the database.
+        Complete the offices of an Elasticsearch response with the database.
 
-        Returns a tuple of (offices, office_count), where `offices` is a
+        Returns a tuple of (offices, aggregations), where `offices` is a
         list of results as Office instances (with some extra attributes only available
-        in Elasticsearch) and `office_count` an integer of the results number.
+        in Elasticsearch) and `aggregations` the raw ES aggregations.
         """
         assert self._distance_sort_index is not None, 'did you remove it from the sorts ?'
 
-        es_res: Dict = self._get_offices_from_es(query)
         office_results: OfficesType = self._get_office_results_from_es_results(es_res)
         aggregations: Sequence[Dict] = es_res.get('aggregations', list())
 
@@ -565,11 +782,71 @@ class HiddenMarketFetcher(Fetcher):
         office_count: int = es_res['hits']['total']
         es_offices_by_siret: 'OrderedDict[str, Dict]' = self._es_office_to_office_by_siret(es_res)
 
-        offices: List[Office] = self._get_offices_from_db(es_offices_by_siret)
+        offices: Sequence[Union[Office, OfficeResultRecord]]
+        if settings.SEARCH_HYDRATE_FROM_ES:
+            offices = self._get_office_records_from_es(es_offices_by_siret)
+        elif settings.SEARCH_USE_OFFICE_RECORDS:
+            offices = self._get_office_records_from_db(es_offices_by_siret)
+        else:
+            offices = self._get_offices_from_db(es_offices_by_siret)
         office_results: OfficesType = self._format_offices_in_office_results(offices, es_offices_by_siret, office_count)
 
         return office_results
 
+    @staticmethod
+    def _get_office_records_from_db(es_offices_by_siret: 'OrderedDict[str, Dict]') -> List[OfficeResultRecord]:
+        """
+        Lightweight alternative to `_get_offices_from_db`: only the columns needed to display
+        results are selected, and rows are turned into `OfficeResultRecord` instead of ORM objects.
+        """
+        records: List[OfficeResultRecord] = []
+        if es_offices_by_siret:
+            rows = db_session.query(*OfficeResultRecord.get_columns()).filter(
+                Office.siret.in_(es_offices_by_siret.keys()))
+            records_by_siret: Dict[str, OfficeResultRecord] = {
+                record.siret: record for record in map(OfficeResultRecord, rows)
+            }
+            for siret in es_offices_by_siret:
+                record = records_by_siret.get(siret)
+                if record is None:
+                    continue
+                if record.has_city():
+                    records.append(record)
+                else:
+                    logging.info("office siret %s does not have city, ignoring...", siret)
+        return records
+
+    @classmethod
+    def _get_office_records_from_es(cls, es_offices_by_siret: 'OrderedDict[str, Dict]') -> List[OfficeResultRecord]:
+        """
+        DB-free alternative to `_get_office_records_from_db`: records are built from the office
+        fields indexed along the scores. Offices indexed without them are read from the database.
+        """
+        missing_offices_by_siret: 'OrderedDict[str, Dict]' = OrderedDict(
+            (siret, es_office)
+            for siret, es_office in es_offices_by_siret.items()
+            if OFFICE_RESULT_FIELD not in es_office['_source'])
+        records_by_siret: Dict[str, OfficeResultRecord] = {}
+        if missing_offices_by_siret:
+            logger.warning("%s offices were indexed without their result fields", len(missing_offices_by_siret))
+            records_by_siret = {
+                record.siret: record
+                for record in cls._get_office_records_from_db(missing_offices_by_siret)
+            }
+
+        records: List[OfficeResultRecord] = []
+        for siret, es_office in es_offices_by_siret.items():
+            if siret in missing_offices_by_siret:
+                if siret in records_by_siret:
+                    records.append(records_by_siret[siret])
+                continue
+            record = OfficeResultRecord.from_fields(es_office['_source'][OFFICE_RESULT_FIELD])
+            if record.has_city():
+                records.append(record)
+            else:
+                logging.info("office siret %s does not have city, ignoring...", siret)
+        return records
+
     def _get_offices_from_db(self, es_offices_by_siret: 'OrderedDict[str, Dict]') -> List[Office]:
         offices: List[Office] = []
         if es_offices_by_siret:
@@ -585,11 +862,11 @@ class HiddenMarketFetcher(Fetcher):
                     logging.info("office siret %s does not have city, ignoring...", office.siret)
         return offices
 
-    def _get_offices_from_es(self, query) -> Dict:
+    def _get_offices_from_es(self, query, routing: Optional[str] = None) -> Dict:
         res: Dict
         es = Elasticsearch()
         logger.debug("Elastic Search request : %s", query)
-        res = es.search(index=settings.ES_INDEX, doc_type="office", body=query)
+        res = es.search(index=settings.ES_INDEX, doc_type="office", body=query, **routing_params(routing))
         return res
 
     def _es_office_to_office_by_siret(self, es_res: Dict) -> 'OrderedDict[str, Dict]':
@@ -622,15 +899,19 @@ class HiddenMarketFetcher(Fetcher):
 
     def _format_offices_in_office_results(
             self,
-            offices: Sequence[Office],
+            offices: Sequence[Union[Office, OfficeResultRecord]],
             es_offices_by_siret: Dict[str, Dict],
             office_count: int,
     ) -> OfficesType:
-        office_results: List[OfficeResult] = []
+        office_results: List[Union[OfficeResult, OfficeResultRecord]] = []
 
         # Check each office in the results and add some fields
         for position, office in enumerate(offices, start=1):
-            result = OfficeResult(office, position=position)
+            if isinstance(office, OfficeResultRecord):
+                result = office
+                result.position = position
+            else:
+                result = OfficeResult(office, position=position)
 
             # Get the corresponding item from the Elasticsearch results.
             es_office = es_offices_by_siret[office.siret]
@@ -710,6 +991,10 @@ class HiddenMarketFetcher(Fetcher):
         field_name = cls._get_score_field_name(hiring_type)
         return f"{field_name}.{rome_code}"
 
+    @classmethod
+    def _get_rome_codes_field_name(cls, hiring_type: str):
+        return ROME_CODES_FIELDS[cls._get_score_field_name(hiring_type)]
+
     @staticmethod
     def _get_boosted_rome_field_name(hiring_type, rome_code):
         hiring_type = hiring_type or hiring_type_util.DEFAULT
@@ -763,7 +1048,18 @@ class HiddenMarketFetcher(Fetcher):
 
     @classmethod
     def _unsure_rome_is_in_scores(cls, rome_codes: Sequence[str], hiring_type: str, to: list):
-        to.append({
+        to.append(cls._build_rome_in_scores_filter(rome_codes, hiring_type))
+
+    @classmethod
+    def _build_rome_in_scores_filter(cls, rome_codes: Sequence[str], hiring_type: str) -> Filter:
+        if settings.ES_EXPLICIT_ROME_SCORES_MAPPING:
+            # A single terms filter on the ROME codes of offices instead of one exists filter by ROME.
+            return {
+                "terms": {
+                    cls._get_rome_codes_field_name(hiring_type): list(rome_codes),
+                }
+            }
+        return {
             "bool": {
                 "should": [{
                     "exists": {
@@ -771,4 +1067,4 @@ class HiddenMarketFetcher(Fetcher):
                     }
                 } for rome_code in rome_codes]
             }
-        })
+        }
@@ -0,0 +1,221 @@
+"""
+Cache of the Elasticsearch responses of office searches.
+
+Smart sort uses a per-day random seed: identical searches made the same day
+return identical results. Responses are thus cached until the seed rolls over,
+keyed on a canonical hash of the search parameters.
+
+The cache backend is pluggable:
+
+- `LocalCacheBackend` (default) is an in-process LRU, private to each worker.
+- `RedisCacheBackend` wraps any client exposing the `get`, `set` and `incr`
+  commands of redis-py, so that workers share their hits. It is used by all
+  processes when `settings.CACHE_REDIS_URL` is set.
+
+Keys include the index behind the ES alias (see `get_live_index`), so that
+putting a new index behind the alias invalidates the cache of every worker,
+whatever the backend. The other updates of the index (e.g. `create_index
+--delta`) invalidate the whole cache with `clear()`: only the cache of the
+calling process is cleared with a `LocalCacheBackend`, every process shares
+the cleared cache with a `RedisCacheBackend`.
+"""
+from datetime import datetime, timedelta
+import hashlib
+import json
+import logging
+import pickle
+import threading
+import time
+from typing import Any, Optional
+
+from cachetools import LRUCache
+import elasticsearch
+
+from labonneboite.common import es
+from labonneboite.common.conf import settings
+
+logger = logging.getLogger('main')
+
+
+class LocalCacheBackend(object):
+    """
+    In-process LRU cache whose items expire after their own TTL.
+    """
+
+    def __init__(self, maxsize: int) -> None:
+        self.items: LRUCache = LRUCache(maxsize=maxsize)
+        self.lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self.lock:
+            item = self.items.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at <= time.time():
+                del self.items[key]
+                return None
+            return value
+
+    def set(self, key: str, value: Any, ttl: int) -> None:
+        with self.lock:
+            self.items[key] = (time.time() + ttl, value)
+
+    def clear(self) -> None:
+        with self.lock:
+            self.items.clear()
+
+
+class RedisCacheBackend(object):
+    """
+    Cache stored in Redis, shared by all workers.
+
+    `client` only needs the `get`, `set` (with `ex`) and `incr` commands of
+    redis-py, which allows replacing it by a local fake in tests.
+
+    Clearing the cache does not scan keys: it bumps a generation number which
+    is part of every key, and stale entries expire by themselves.
+    """
+
+    def __init__(self, client: Any, prefix: str = 'lbb:search') -> None:
+        self.client = client
+        self.prefix = prefix
+
+    @property
+    def generation_key(self) -> str:
+        return f'{self.prefix}:generation'
+
+    def _key(self, key: str) -> str:
+        generation = int(self.client.get(self.generation_key) or 0)
+        return f'{self.prefix}:{generation}:{key}'
+
+    def get(self, key: str) -> Optional[Any]:
+        value = self.client.get(self._key(key))
+        if value is None:
+            return None
+        return pickle.loads(value)
+
+    def set(self, key: str, value: Any, ttl: int) -> None:
+        self.client.set(self._key(key), pickle.dumps(value), ex=ttl)
+
+    def clear(self) -> None:
+        self.client.incr(self.generation_key)
+
+
+def new_redis_client() -> Any:
+    """
+    Client of the Redis server of `settings.CACHE_REDIS_URL`. redis-py is
+    only needed when this setting is used.
+    """
+    import redis
+    return redis.Redis.from_url(settings.CACHE_REDIS_URL)
+
+
+class CacheBackendPool(object):
+    """
+    Backend of a cache, created on first use: a `RedisCacheBackend` with the
+    given key prefix when `settings.CACHE_REDIS_URL` is set, a
+    `LocalCacheBackend` of `settings.<maxsize_setting>` items otherwise.
+    """
+
+    def __init__(self, maxsize_setting: str, prefix: str) -> None:
+        self.maxsize_setting = maxsize_setting
+        self.prefix = prefix
+        self.backend: Optional[Any] = None
+
+    def get_backend(self) -> Any:
+        if self.backend is None:
+            if settings.CACHE_REDIS_URL:
+                self.backend = RedisCacheBackend(new_redis_client(), prefix=self.prefix)
+            else:
+                self.backend = LocalCacheBackend(getattr(settings, self.maxsize_setting))
+        return self.backend
+
+    def set_backend(self, backend: Any) -> None:
+        """
+        Replace the backend, e.g. by a `RedisCacheBackend`.
+        """
+        self.backend = backend
+
+
+BACKEND_POOL = CacheBackendPool('SEARCH_CACHE_MAXSIZE', 'lbb:search')
+
+
+def get_backend() -> Any:
+    return BACKEND_POOL.get_backend()
+
+
+def set_backend(backend: Any) -> None:
+    BACKEND_POOL.set_backend(backend)
+
+
+class LiveIndex(object):
+    NAME: Optional[str] = None
+    CHECKED_AT: float = 0
+
+
+def get_live_index() -> str:
+    """
+    Name of the index behind the ES alias. It is looked up at most once every
+    `settings.SEARCH_CACHE_INDEX_CHECK_INTERVAL` seconds per process: after
+    an index switch, workers may serve the previous results for that long.
+    """
+    if not settings.SEARCH_CACHE_ENABLED:
+        return settings.ES_INDEX
+    now = time.time()
+    if LiveIndex.NAME is None or now - LiveIndex.CHECKED_AT >= settings.SEARCH_CACHE_INDEX_CHECK_INTERVAL:
+        try:
+            indexes = sorted(es.Elasticsearch().indices.get_alias(index=settings.ES_INDEX).keys())
+            LiveIndex.NAME = indexes[0] if indexes else settings.ES_INDEX
+        except elasticsearch.TransportError as e:
+            logger.warning("could not find the index behind alias %s: %s", settings.ES_INDEX, e)
+            LiveIndex.NAME = LiveIndex.NAME or settings.ES_INDEX
+        LiveIndex.CHECKED_AT = now
+    return LiveIndex.NAME
+
+
+def make_key(**params: Any) -> str:
+    """
+    Canonical hash of the given search parameters. It does not depend on the
+    order of the parameters, and coordinates are rounded so that the same
+    location always gives the same key.
+    """
+
+    def canonical(value: Any) -> Any:
+        # The order of romes matters (e.g. boosted romes sort), do not sort lists.
+        if isinstance(value, (list, tuple)):
+            return [canonical(item) for item in value]
+        if isinstance(value, dict):
+            return {str(k): canonical(v) for k, v in value.items()}
+        if isinstance(value, float):
+            return round(value, settings.SEARCH_CACHE_COORDINATES_PRECISION)
+        return value
+
+    serialized = json.dumps(canonical(params), sort_keys=True, default=str)
+    return hashlib.sha1(serialized.encode('utf-8')).hexdigest()
+
+
+def get_ttl(now: Optional[datetime] = None) -> int:
+    """
+    Number of seconds until the randomization seed rolls over, i.e. next midnight.
+    """
+    now = now or datetime.today()
+    tomorrow = (now + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+    return max(int((tomorrow - now).total_seconds()), 1)
+
+
+def get(key: str) -> Optional[Any]:
+    if not settings.SEARCH_CACHE_ENABLED:
+        return None
+    value = get_backend().get(key)
+    logger.debug("search cache %s for key %s", "hit" if value is not None else "miss", key)
+    return value
+
+
+def store(key: str, value: Any) -> None:
+    if settings.SEARCH_CACHE_ENABLED:
+        get_backend().set(key, value, get_ttl())
+
+
+def clear() -> None:
+    get_backend().clear()
@@ -21,28 +21,34 @@ the number of hirings.
 We use the scikit-learn library: more info at
 http://scikit-learn.org/stable/documentation.html
 """
+import argparse
 from calendar import monthrange
+import functools
 import math
-from operator import getitem
+import multiprocessing as mp
 import os
 import pickle
+import resource
 import sys
 
 from datetime import datetime, timedelta
-from dateutil.relativedelta import relativedelta
 
 import pandas as pd
 import numpy as np
 from sklearn import linear_model
 from sklearn.metrics import mean_squared_error
-import sqlalchemy
-from sqlalchemy.pool import NullPool
+
+from labonneboite_common import departements as dpt
 
 from labonneboite.common.util import timeit
+from . import parallel
 from . import settings as importer_settings
+from .db import get_engine, load_df_etab_to_table
+from .hirings import add_period_hiring_columns, get_hiring_counts_query, read_hiring_counts
 from .models.computing import DpaeStatistics, Hiring, RawOffice
 from labonneboite.common import scoring as scoring_util
-from labonneboite.common.database import get_db_string
+from labonneboite.common.database import db_session
+from labonneboite.common.database import engine as db_engine
 from labonneboite.common.env import get_current_env, ENV_DEVELOPMENT
 from .debug import listen
 from .jobs.common import logger
@@ -50,10 +56,6 @@ from .jobs.common import logger
 listen()
 
 
-def get_engine():
-    return sqlalchemy.create_engine(get_db_string(), poolclass=NullPool)
-
-
 # Output additional debug info about these sirets
 # To disable, set to an empty list []
 # Sirets must be string, not int
@@ -65,6 +67,9 @@ DEBUG_SIRETS = ["19240023200018", "33530956300047", "26760168000015"]
 # default value is 'warn'
 pd.options.mode.chained_assignment = None
 
+# Memory taken by each chunk of hirings counts read from the DB, see `get_df_hiring`.
+HIRINGS_CHUNK_MAX_MEMORY = 64 * 1024 ** 2
+
 
 class NotEnoughDataException(Exception):
     pass
@@ -202,42 +207,39 @@ def get_df_etab(departement):
 
 
 @timeit
-def get_df_hiring(departement, prediction_beginning_date):
+def get_df_hiring(departement, prediction_beginning_date, chunk_max_memory=HIRINGS_CHUNK_MAX_MEMORY):
+    """
+    Returns a df_hiring dataframe
+    with one row per siret and one column per hiring_type and month (hirings total for given month)
+    for all (past) months before (now) prediction_beginning_date.
+
+    Hirings are counted by the DB and streamed by chunks of about `chunk_max_memory` bytes:
+    single hirings are never loaded in memory.
+    """
     logger.debug("reading hiring data...")
-    df_hiring = pd.read_sql_query("""
-        select
-            siret,
-            hiring_date,
-            case
-                when contract_type in (%s) then 'dpae'
-                when contract_type in (%s) then 'alt'
-            end as hiring_type
-        from %s
-        where
-            departement = %s
-            and contract_type in (%s)
-            and hiring_date < '%s'
-        """ % (
-        ', '.join([str(c_t) for c_t in Hiring.CONTRACT_TYPES_DPAE]),
-        ', '.join([str(c_t) for c_t in Hiring.CONTRACT_TYPES_ALTERNANCE]),
+    query = get_hiring_counts_query(
         Hiring.__tablename__,
         departement,
-        ', '.join([str(c_t) for c_t in Hiring.CONTRACT_TYPES_ALL]),
-        str(prediction_beginning_date.isoformat()),
-    ),
-        get_engine(),
+        prediction_beginning_date,
+        Hiring.CONTRACT_TYPES_DPAE,
+        Hiring.CONTRACT_TYPES_ALTERNANCE,
     )
-    debug_df(df_hiring, "after loading from hiring table")
-    if df_hiring.empty:
+    df_hiring = read_hiring_counts(get_engine(), query, chunk_max_memory)
+
+    if df_hiring is None:
         logger.warning("no hiring data for departement %s", departement)
         return None
-
-    df_hiring["hiring_date_month"] = pd.DatetimeIndex(df_hiring["hiring_date"]).month
-    df_hiring["hiring_date_year"] = pd.DatetimeIndex(df_hiring["hiring_date"]).year
+    debug_df(df_hiring, "after loading from hiring table")
 
     return df_hiring
 
 
+def log_peak_rss(departement, step):
+    # `ru_maxrss` is given in kilobytes.
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    logger.info("(%s) peak RSS after %s: %.1f MB", departement, step, peak_rss / 1024)
+
+
 @timeit
 def get_df_etab_with_hiring_monthly_aggregates(departement, prediction_beginning_date):
     """
@@ -247,24 +249,14 @@ def get_df_etab_with_hiring_monthly_aggregates(departement, prediction_beginning
     """
     df_etab = get_df_etab(departement)  # has one row per siret
 
-    df_dpae = get_df_hiring(departement, prediction_beginning_date)  # has one row per hiring
+    # has one row per siret and one column per month (hirings total for given month)
+    # and per hiring_type
+    df_dpae = get_df_hiring(departement, prediction_beginning_date)
+    log_peak_rss(departement, "loading hirings")
 
     if df_etab is None or df_dpae is None:
         return None
 
-    df_dpae = df_dpae.groupby(["siret", "hiring_type", "hiring_date_year", "hiring_date_month"]).count().reset_index()
-    debug_df(df_dpae, "after group by")
-    logger.debug("pivoting table dpae (%s)...", departement)
-    # FIXME understand why `values="hiring_date"` is needed at all
-    df_dpae = pd.pivot_table(df_dpae, values="hiring_date", index="siret",
-                             columns=["hiring_type", "hiring_date_year", "hiring_date_month"])
-    debug_df(df_dpae, "after pivot")
-    logger.debug("pivoting table (%s) ok!", departement)
-
-    # after this pivoting,
-    # df_dpae has one row per siret and one column per month (hirings total for given month)
-    # and per hiring_type
-
     df_dpae["siret"] = df_dpae.index
     df_dpae = df_dpae.fillna(0)
 
@@ -312,12 +304,6 @@ def compute_prediction_beginning_date():
     return prediction_beginning_date
 
 
-def total_hired_period(period):
-    def f(office):
-        return office[period]
-    return f
-
-
 # from https://stackoverflow.com/questions/7015587/python-difference-of-2-datetimes-in-months
 def months_between_dates(d1, d2):
     delta = 0
@@ -349,28 +335,6 @@ def get_features_for_lag(df_etab, prefix, training_periods, data_gap_in_periods,
     return X, features
 
 
-def get_hirings_over_period_for_office(office, prediction_beginning_date, months_per_period, minus, prefix):
-    """
-    office : one row of df_etab.
-    minus : how many periods to go back in time.
-    """
-    start_date = prediction_beginning_date + relativedelta(months=-(months_per_period * minus))
-
-    columns_of_period = []
-    for i in range(0, months_per_period):  # [0, 1, 2, ..., months_per_period - 1]
-        current_date = start_date + relativedelta(months=i)
-        columns_of_period.append('%s-%s-%s' % (prefix, current_date.year, current_date.month))
-
-    hirings_over_period = 0
-    for column in columns_of_period:
-        try:
-            hirings_over_period += getitem(office, column)
-        except KeyError:
-            pass
-
-    return hirings_over_period
-
-
 def compute_hiring_aggregates(
         df_etab, departement, prediction_beginning_date, periods, prefix, months_per_period):
     """
@@ -380,17 +344,9 @@ def compute_hiring_aggregates(
     logger.debug("computing %s hiring aggregates (%s)...", prefix, departement)
 
     # df_etab has one row per siret and one column per hiring month-aggregate and per hiring_type
-    period_count_columns = []
-    for i in range(1, periods + 1):  # [1, 2, ..., periods]
-        column = '%s-period-%s' % (prefix, i)
-        # pylint: disable=cell-var-from-loop
-        df_etab[column] = df_etab.apply(
-            lambda office: get_hirings_over_period_for_office(
-                office, prediction_beginning_date, months_per_period, minus=i, prefix=prefix,
-            ),
-            axis=1,
-        )
-        period_count_columns.append(column)
+    period_count_columns = add_period_hiring_columns(
+        df_etab, prediction_beginning_date, periods, prefix, months_per_period,
+    )
     logger.debug("finished calculating %s temporal features (%s)!", prefix, departement)
 
     check_coefficient_of_variation(df_etab, departement, period_count_columns, prefix)
@@ -455,7 +411,7 @@ def train(df_etab, departement, prediction_beginning_date, last_historical_data_
     regr = linear_model.LinearRegression()
 
     y_train_period = '%s-period-%s' % (prefix_for_fields, 2 * periods_per_year + data_gap_in_periods)
-    y_train_regr = df_etab.apply(total_hired_period(y_train_period), axis=1)
+    y_train_regr = df_etab[y_train_period]
 
     X_train, X_train_feature_names = get_features_for_lag(
         df_etab,
@@ -505,7 +461,7 @@ def train(df_etab, departement, prediction_beginning_date, last_historical_data_
     # --- compute regression metrics
     y_train_regr_pred = regr.predict(X_train)
     y_test_period = '%s-period-%s' % (prefix_for_fields, periods_per_year + data_gap_in_periods)
-    y_test_regr = df_etab.apply(total_hired_period(y_test_period), axis=1)
+    y_test_regr = df_etab[y_test_period]
     y_test_regr_pred = regr.predict(X_test)
     rmse_train = mean_squared_error(y_train_regr, y_train_regr_pred)
     rmse_test = mean_squared_error(y_test_regr, y_test_regr_pred)
@@ -556,17 +512,9 @@ def train(df_etab, departement, prediction_beginning_date, last_historical_data_
 def export_df_etab_to_db(df_etab, departement):
     logger.debug("writing sql (%s)...", departement)
 
-    def departement_to_str(x):
-        return "{:02d}".format(int(x["departement"]))
+    df_etab['departement'] = df_etab['departement'].map(lambda departement: "{:02d}".format(int(departement)))
 
-    df_etab['departement'] = df_etab.apply(departement_to_str, axis=1)
-
-    # FIXME control more precisely the schema (indexes!) of temporary tables created by to_sql,
-    # current version adds an 'index' column (which is the panda dataframe index column itself,
-    # nothing to do with our app) and makes it a primary key.
-    # see https://pandas.pydata.org/pandas-docs/stable/generated/pandas.DataFrame.to_sql.html
-    # Maybe using no index at all (no primary key) would be faster.
-    df_etab.to_sql("etablissements_%s" % departement, get_engine(), if_exists='replace', chunksize=10000)
+    load_df_etab_to_table(df_etab, "etablissements_%s" % departement, get_engine(local_infile=True))
     logger.debug("sql done (%s)!", departement)
 
 
@@ -664,14 +612,78 @@ def run(
     # Final data export.
 
     export_df_etab_to_db(df_etab, departement)
+    log_peak_rss(departement, "computing scores")
     if return_df_etab_if_successful:
         return df_etab  # only used in test_compute_score.py for inspection
     return True  # successful computation
 
 
+def get_departements_by_size(departements):
+    """
+    Returns the given departements, those with the most offices first: the longest
+    computations start first, so that they do not end up running alone.
+    """
+    df_counts = pd.read_sql_query("""
+        select departement, count(*) as office_count from %s where siret != '' group by departement
+        """ % RawOffice.__tablename__, get_engine())
+    office_counts = {}
+    for departement, office_count in zip(df_counts["departement"], df_counts["office_count"]):
+        departement = str(departement)
+        if departement.isdigit():
+            departement = "{:02d}".format(int(departement))
+        office_counts[departement] = int(office_count)
+    return sorted(departements, key=lambda departement: office_counts.get(departement, 0), reverse=True)
+
+
+def init_departement_worker():
+    # DB connections inherited from the parent process must not be shared with it.
+    db_session.remove()
+    db_engine.dispose(close=False)
+
+
+def compute_departement(departement, prediction_beginning_date):
+    """
+    Runs the computation of a departement and returns its status, see `parallel.run_departements`.
+    """
+    try:
+        df_etab = run(departement, prediction_beginning_date, return_df_etab_if_successful=True)
+    except NotEnoughDataException as e:
+        logger.warning("not enough data for departement %s: %s", departement, e)
+        return {'status': parallel.STATUS_NOT_ENOUGH_DATA, 'error': str(e)}
+    if df_etab is False:
+        return {'status': parallel.STATUS_NO_DATA}
+    return {'status': parallel.STATUS_SUCCESS, 'offices': len(df_etab)}
+
+
 @timeit
 def run_main():
-    run(departement=sys.argv[1])
+    parser = argparse.ArgumentParser(description="Compute the scores of the offices of the given departements.")
+    parser.add_argument('departements', nargs='+', help='Departements to compute, or "all".')
+    parser.add_argument('--processes', type=int, help="Number of parallel processes, defaults to the CPU count.")
+    parser.add_argument('--report', default='compute_score_report.json', help="JSON report file.")
+    args = parser.parse_args()
+
+    departements = dpt.DEPARTEMENTS if args.departements == ['all'] else args.departements
+    prediction_beginning_date = compute_prediction_beginning_date()
+    departements = get_departements_by_size(departements)
+    processes = min(args.processes or mp.cpu_count(), len(departements))
+    logger.info("computing %s departements with %s processes: %s", len(departements), processes, departements)
+
+    # Do not share DB connections with the workers.
+    db_session.remove()
+    reports = parallel.run_departements(
+        functools.partial(compute_departement, prediction_beginning_date=prediction_beginning_date),
+        departements,
+        processes,
+        initializer=init_departement_worker,
+    )
+    parallel.write_report(
+        args.report,
+        reports,
+        prediction_beginning_date=prediction_beginning_date.isoformat(),
+        processes=processes,
+    )
+    sys.exit(parallel.get_exit_status(reports))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,107 @@
+"""
+Database helpers of the importer (see `compute_score`), among which the export of the
+scored etablissements of a departement to their table with `LOAD DATA LOCAL INFILE`.
+
+This module does not depend on the importer models and settings, so that it can be tested
+and benchmarked on its own.
+"""
+import csv
+import math
+import tempfile
+
+import pandas as pd
+import sqlalchemy
+from sqlalchemy.pool import NullPool
+
+from labonneboite.common.database import get_db_string
+
+
+def get_engine(local_infile=False):
+    # `local_infile` enables `LOAD DATA LOCAL INFILE` SQL instructions.
+    connect_args = {'local_infile': 1} if local_infile else {}
+    return sqlalchemy.create_engine(get_db_string(), poolclass=NullPool, connect_args=connect_args)
+
+
+def get_sql_column_type(column, dtype):
+    """
+    Returns the MySQL type of a df_etab column, the one `DataFrame.to_sql` would use
+    except for the indexed `siret` column and `departement`.
+    """
+    if column == 'siret':
+        return 'VARCHAR(191) NOT NULL'
+    if column == 'departement':
+        return 'VARCHAR(8)'
+    if pd.api.types.is_bool_dtype(dtype):
+        return 'TINYINT(1)'
+    if pd.api.types.is_integer_dtype(dtype):
+        return 'BIGINT'
+    if pd.api.types.is_float_dtype(dtype):
+        return 'DOUBLE'
+    if pd.api.types.is_datetime64_any_dtype(dtype):
+        return 'DATETIME'
+    return 'TEXT'
+
+
+# Characters escaped by `LOAD DATA` with its default `ESCAPED BY '\\'`
+LOAD_DATA_ESCAPES = str.maketrans({'\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r', '\0': '\\0'})
+
+
+def escape_load_data_value(value):
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return value  # Written as NULL
+    return str(value).translate(LOAD_DATA_ESCAPES)
+
+
+def write_df_etab_to_tsv(df_etab, f):
+    """
+    Writes df_etab to the file object `f` in the default format of `LOAD DATA INFILE`:
+    tab separated, escaped by backslashes, NULL written as `\\N`.
+    """
+    df_tsv = df_etab.copy(deep=False)
+    for column, dtype in df_tsv.dtypes.items():
+        if pd.api.types.is_bool_dtype(dtype):
+            df_tsv[column] = df_tsv[column].astype(int)
+        elif pd.api.types.is_object_dtype(dtype):
+            df_tsv[column] = df_tsv[column].map(escape_load_data_value)
+    # Values are escaped above: as they hold no NUL character, it is a safe `quotechar`, never written.
+    df_tsv.to_csv(f, sep='\t', header=False, index=False, na_rep='\\N', quoting=csv.QUOTE_NONE, quotechar='\0',
+                  date_format='%Y-%m-%d %H:%M:%S')
+
+
+def load_df_etab_to_table(df_etab, table_name, engine):
+    """
+    Replaces the content of the table `table_name` with df_etab.
+
+    Rows are written to a temporary TSV file, loaded with `LOAD DATA LOCAL INFILE` into a new table
+    with an explicit schema, which is then swapped with the current table in an atomic `RENAME TABLE`:
+    readers never see a half-written table.
+    """
+    new_table_name = "%s_new" % table_name
+    old_table_name = "%s_old" % table_name
+    columns = ',\n'.join(
+        '`%s` %s' % (column, get_sql_column_type(column, dtype)) for column, dtype in df_etab.dtypes.items()
+    )
+
+    with tempfile.NamedTemporaryFile('w', encoding='utf-8', suffix='.tsv') as f:
+        write_df_etab_to_tsv(df_etab, f)
+        f.flush()
+
+        with engine.connect() as connection:
+            connection.exec_driver_sql("DROP TABLE IF EXISTS `%s`" % new_table_name)
+            connection.exec_driver_sql("""
+                CREATE TABLE `%s` (
+                %s
+                ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+                """ % (new_table_name, columns))
+            connection.exec_driver_sql("""
+                LOAD DATA LOCAL INFILE '%s' INTO TABLE `%s` CHARACTER SET utf8mb4 (%s)
+                """ % (f.name, new_table_name, ', '.join('`%s`' % column for column in df_etab.columns)))
+            # Building the index once all rows are loaded is faster than maintaining it.
+            connection.exec_driver_sql("ALTER TABLE `%s` ADD INDEX `siret` (`siret`)" % new_table_name)
+
+            # `RENAME TABLE` requires the current table to exist.
+            connection.exec_driver_sql("CREATE TABLE IF NOT EXISTS `%s` LIKE `%s`" % (table_name, new_table_name))
+            connection.exec_driver_sql("DROP TABLE IF EXISTS `%s`" % old_table_name)
+            connection.exec_driver_sql("RENAME TABLE `%s` TO `%s`, `%s` TO `%s`" % (
+                table_name, old_table_name, new_table_name, table_name))
+            connection.exec_driver_sql("DROP TABLE `%s`" % old_table_name)
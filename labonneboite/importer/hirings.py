@@ -0,0 +1,164 @@
+"""
+Hirings aggregates of the importer (see `compute_score`): hirings counted by the DB,
+pivoted by month, and summed by period.
+
+These functions do not depend on the importer environment (models, settings, scikit-learn),
+so that they can be tested and benchmarked on their own.
+"""
+from operator import getitem
+
+from dateutil.relativedelta import relativedelta
+import numpy as np
+import pandas as pd
+
+# Approximate memory taken by one (siret, hiring_type, year, month, count) row of a dataframe.
+HIRINGS_ROW_MEMORY = 300
+
+
+def pivot_hirings(df_hiring):
+    """
+    Returns a dataframe with one row per siret and one column per hiring_type, year and month
+    (hirings count for given month) from a dataframe with one row per siret, hiring_type, year and month.
+    """
+    # FIXME understand why `values="hiring_count"` is needed at all
+    return pd.pivot_table(df_hiring, values="hiring_count", index="siret",
+                          columns=["hiring_type", "hiring_date_year", "hiring_date_month"])
+
+
+def pivot_hiring_chunks(df_hiring_chunks):
+    """
+    Same as `pivot_hirings` for a dataframe given as chunks of rows ordered by siret: each chunk
+    is pivoted as soon as it is read, so that only the pivoted chunks are kept in memory.
+    Returns None if there are no rows at all.
+    """
+    df_pivots = []
+    df_last_siret = None
+    for df_chunk in df_hiring_chunks:
+        if df_last_siret is not None:
+            df_chunk = pd.concat([df_last_siret, df_chunk])
+        if df_chunk.empty:
+            continue
+        # The rows of the last siret of the chunk may go on in the next chunk.
+        is_last_siret = df_chunk["siret"] == df_chunk["siret"].iloc[-1]
+        df_last_siret = df_chunk[is_last_siret]
+        if not is_last_siret.all():
+            df_pivots.append(pivot_hirings(df_chunk[~is_last_siret]))
+    if df_last_siret is not None and not df_last_siret.empty:
+        df_pivots.append(pivot_hirings(df_last_siret))
+
+    if not df_pivots:
+        return None
+    # Sorted as `pd.pivot_table` sorts them.
+    return pd.concat(df_pivots).sort_index().sort_index(axis=1)
+
+
+def get_hiring_counts_query(table, departement, prediction_beginning_date,
+                            dpae_contract_types, alternance_contract_types):
+    """
+    Returns the SQL query counting the hirings of `table` made in a departement before
+    prediction_beginning_date, with one row per siret, hiring_type, year and month, ordered by siret.
+    """
+    return """
+        select
+            siret,
+            case
+                when contract_type in (%s) then 'dpae'
+                when contract_type in (%s) then 'alt'
+            end as hiring_type,
+            year(hiring_date) as hiring_date_year,
+            month(hiring_date) as hiring_date_month,
+            count(*) as hiring_count
+        from %s
+        where
+            departement = %s
+            and contract_type in (%s)
+            and hiring_date < '%s'
+        group by siret, hiring_type, hiring_date_year, hiring_date_month
+        having hiring_type is not null
+        order by siret
+        """ % (
+        ', '.join([str(c_t) for c_t in dpae_contract_types]),
+        ', '.join([str(c_t) for c_t in alternance_contract_types]),
+        table,
+        departement,
+        ', '.join([str(c_t) for c_t in list(dpae_contract_types) + list(alternance_contract_types)]),
+        str(prediction_beginning_date.isoformat()),
+    )
+
+
+def read_hiring_counts(engine, query, chunk_max_memory):
+    """
+    Returns the result of a `get_hiring_counts_query` query pivoted by `pivot_hirings`, or None if
+    it has no rows. Rows are streamed by chunks of about `chunk_max_memory` bytes.
+    """
+    chunk_size = max(1, chunk_max_memory // HIRINGS_ROW_MEMORY)
+    # Server side cursor: rows are not all buffered by the DB driver.
+    with engine.connect().execution_options(stream_results=True) as connection:
+        return pivot_hiring_chunks(pd.read_sql_query(query, connection, chunksize=chunk_size))
+
+
+def get_month_columns_of_period(prediction_beginning_date, months_per_period, minus, prefix):
+    """
+    Returns the names of the month columns (e.g. `dpae-2019-3`) of a period.
+    minus : how many periods to go back in time.
+    """
+    start_date = prediction_beginning_date + relativedelta(months=-(months_per_period * minus))
+
+    columns_of_period = []
+    for i in range(0, months_per_period):  # [0, 1, 2, ..., months_per_period - 1]
+        current_date = start_date + relativedelta(months=i)
+        columns_of_period.append('%s-%s-%s' % (prefix, current_date.year, current_date.month))
+    return columns_of_period
+
+
+def get_hirings_over_period_for_office(office, prediction_beginning_date, months_per_period, minus, prefix):
+    """
+    office : one row of df_etab.
+    minus : how many periods to go back in time.
+
+    Row by row version of `add_period_hiring_columns`, kept as a reference.
+    """
+    columns_of_period = get_month_columns_of_period(prediction_beginning_date, months_per_period, minus, prefix)
+
+    hirings_over_period = 0
+    for column in columns_of_period:
+        try:
+            hirings_over_period += getitem(office, column)
+        except KeyError:
+            pass
+
+    return hirings_over_period
+
+
+def add_period_hiring_columns(df_etab, prediction_beginning_date, periods, prefix, months_per_period):
+    """
+    Edits in place df_etab.
+    Adds one column per period containing hiring total for this hiring_type, and returns their names.
+
+    Month columns are mapped to their period once, then the months of each period are summed
+    for all offices at once. Months without any hiring in the departement have no column.
+    """
+    existing_columns = set(df_etab.columns)
+    month_columns_by_period = [
+        [
+            column
+            for column in get_month_columns_of_period(prediction_beginning_date, months_per_period, i, prefix)
+            if column in existing_columns
+        ]
+        for i in range(1, periods + 1)  # [1, 2, ..., periods]
+    ]
+
+    month_columns = [column for columns in month_columns_by_period for column in columns]
+    month_positions = {column: position for position, column in enumerate(dict.fromkeys(month_columns))}
+    month_values = df_etab[list(month_positions)].to_numpy()
+
+    period_count_columns = []
+    for i, columns in enumerate(month_columns_by_period, start=1):
+        column = '%s-period-%s' % (prefix, i)
+        if columns:
+            df_etab[column] = month_values[:, [month_positions[c] for c in columns]].sum(axis=1)
+        else:
+            # No hiring at all during this period
+            df_etab[column] = np.zeros(len(df_etab), dtype=np.int64)
+        period_count_columns.append(column)
+    return period_count_columns
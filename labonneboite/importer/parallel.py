@@ -0,0 +1,142 @@
+"""
+Computation of the scores of several departements in parallel processes (see `compute_score`).
+
+The computation of a departement is given as a function, so that this module does not depend
+on the importer environment (models, settings, scikit-learn) and can be tested on its own.
+"""
+import json
+import logging
+import multiprocessing as mp
+import os
+import queue
+import resource
+import time
+
+logger = logging.getLogger('main')
+
+# Status of a departement in the reports of `run_departements`.
+STATUS_SUCCESS = 'success'
+STATUS_NO_DATA = 'no_data'
+STATUS_NOT_ENOUGH_DATA = 'not_enough_data'
+STATUS_FAILED = 'failed'
+STATUS_CRASHED = 'crashed'
+
+FAILED_STATUSES = {STATUS_FAILED, STATUS_CRASHED}
+
+
+def run_departement(compute_departement, departement, results, initializer=None):
+    """
+    Runs `compute_departement(departement)` and puts its report in the `results` queue. This is the
+    target of the worker processes of `run_departements`.
+
+    `compute_departement` returns the status of the departement and, optionally, its number of
+    `offices` and an `error` message. Exceptions are reported as failures instead of being raised,
+    so that they do not stop the computation of other departements.
+    """
+    report = {
+        'departement': departement,
+        'pid': os.getpid(),
+        'start': time.time(),
+        'offices': None,
+        'error': None,
+    }
+    try:
+        if initializer is not None:
+            initializer()
+        report.update(compute_departement(departement))
+    except Exception as e:  # pylint: disable=broad-except
+        # Including failed sanity checks, e.g. too many score changes.
+        logger.exception("computation failed for departement %s", departement)
+        report.update({'status': STATUS_FAILED, 'error': '%s: %s' % (type(e).__name__, e)})
+    report['end'] = time.time()
+    report['duration'] = report['end'] - report['start']
+    # Each process computes a single departement: its peak memory is the one of the departement.
+    report['peak_rss_mb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    results.put(report)
+
+
+def get_crash_report(departement, process, start):
+    end = time.time()
+    return {
+        'departement': departement,
+        'pid': process.pid,
+        'start': start,
+        'offices': None,
+        'error': 'process exited with code %s' % process.exitcode,
+        'status': STATUS_CRASHED,
+        'end': end,
+        'duration': end - start,
+        'peak_rss_mb': None,
+    }
+
+
+def run_departements(compute_departement, departements, processes, initializer=None):
+    """
+    Runs `compute_departement` on the given departements with at most `processes` processes at a
+    time, and returns their reports in their order of completion.
+
+    Each departement is computed in a new process, which first calls `initializer` (e.g. to get its
+    own DB connections). Departements are started in the given order. A process which dies without
+    reporting (e.g. killed for lack of memory) is reported as crashed.
+    """
+    results = mp.Queue()
+    pending = list(departements)
+    # Processes of the departements being computed, and their start time.
+    running = {}
+    reports = []
+
+    def add_report(report):
+        process, _ = running.pop(report['departement'])
+        process.join()
+        logger.info("departement %s: %s in %.1fs", report['departement'], report['status'], report['duration'])
+        reports.append(report)
+
+    try:
+        while pending or running:
+            while pending and len(running) < processes:
+                departement = pending.pop(0)
+                process = mp.Process(target=run_departement,
+                                     args=(compute_departement, departement, results, initializer))
+                process.start()
+                running[departement] = (process, time.time())
+
+            try:
+                add_report(results.get(timeout=1))
+            except queue.Empty:
+                exited = [departement for departement, (process, _) in running.items()
+                          if process.exitcode is not None]
+                if not exited:
+                    continue
+                # The report of a process may have been sent just before it exited.
+                while True:
+                    try:
+                        add_report(results.get_nowait())
+                    except queue.Empty:
+                        break
+                for departement in exited:
+                    if departement in running:
+                        process, start = running[departement]
+                        add_report(get_crash_report(departement, process, start))
+    except BaseException:
+        for process, _ in running.values():
+            process.terminate()
+        raise
+
+    return reports
+
+
+def write_report(filename, reports, **header):
+    """
+    Writes the reports of `run_departements` as JSON, after the given `header` fields.
+    """
+    with open(filename, 'w') as f:
+        json.dump(dict(header, departements=reports), f, indent=2)
+    logger.info("report written to %s", filename)
+
+
+def get_exit_status(reports):
+    """
+    Returns the exit status of a computation: 1 if any departement failed or crashed, 0 otherwise.
+    Departements without enough data are not failures.
+    """
+    return 1 if any(report['status'] in FAILED_STATUSES for report in reports) else 0
@@ -0,0 +1,102 @@
+"""
+Benchmark the loading of the geocoding cities cache: cities read and compiled
+from the JSON files, versus cities memory-mapped from the directory written by
+the `compile_cities` script.
+
+Each mode runs in a new process, which loads the cache, then forks workers (as
+the web server does) that look up cities. Startup time, resident memory of the
+loading process and unique/proportional memory of each worker are reported.
+
+Usage:
+
+    python -m labonneboite.scripts.benchmarks.cities_cache --workers 4 --lookups 10000
+"""
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import json
+import logging
+import multiprocessing as mp
+import os
+import random
+import tempfile
+import time
+from typing import Dict, List
+
+import psutil
+
+from labonneboite.common import geocoding
+
+logging.basicConfig(level=logging.INFO, format='%(message)s')
+logger = logging.getLogger(__name__)
+
+
+def get_rss_mb() -> float:
+    return psutil.Process().memory_info().rss / 1024**2
+
+
+def look_up_cities(commune_ids: List[str], zipcodes: List[str]) -> Dict[str, float]:
+    start = time.perf_counter()
+    for commune_id, zipcode in zip(commune_ids, zipcodes):
+        geocoding.get_city_by_commune_id(commune_id)
+        geocoding.get_city_by_zipcode(zipcode)
+    duration = time.perf_counter() - start
+    memory = psutil.Process().memory_full_info()
+    return {
+        'lookups_per_s': round(len(commune_ids) / duration),
+        'uss_mb': round(memory.uss / 1024**2, 1),
+        'pss_mb': round(memory.pss / 1024**2, 1),
+    }
+
+
+def run_mode(compiled_path: str, workers: int, lookups: int, seed: int) -> Dict:
+    """
+    Load the cities cache from `compiled_path` (the JSON files are used if it does not exist) and fork workers.
+    Runs in a new process.
+    """
+    geocoding.COMPILED_CITIES_DIR = compiled_path
+    rss_before = get_rss_mb()
+    start = time.perf_counter()
+    geocoding.load_cities_cache()
+    load_duration = time.perf_counter() - start
+    rss_after = get_rss_mb()
+
+    cities = geocoding.get_cities()
+    rand = random.Random(seed)
+    positions = [rand.randrange(len(cities)) for _ in range(lookups)]
+    commune_ids = [cities[position]['commune_id'] for position in positions]
+    zipcodes = [cities[position]['zipcode'] for position in positions]
+
+    with mp.get_context('fork').Pool(workers) as pool:
+        worker_stats = pool.starmap(look_up_cities, [(commune_ids, zipcodes)] * workers)
+
+    return {
+        'load_s': round(load_duration, 3),
+        'load_rss_mb': round(rss_after - rss_before, 1),
+        'workers': worker_stats,
+    }
+
+
+def run() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--lookups', type=int, default=10000)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    report = []
+    with tempfile.TemporaryDirectory() as directory:
+        compiled_path = os.path.join(directory, 'cities_compiled')
+        geocoding.compile_cities_cache(compiled_path)
+        for mode, path in [('json', os.path.join(directory, 'missing')), ('compiled', compiled_path)]:
+            # A new process per mode, so that each one starts without any cache
+            with ProcessPoolExecutor(max_workers=1, mp_context=mp.get_context('spawn')) as executor:
+                stats = executor.submit(run_mode, path, args.workers, args.lookups, args.seed).result()
+            stats['mode'] = mode
+            report.append(stats)
+            logger.info("%s", stats)
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    run()
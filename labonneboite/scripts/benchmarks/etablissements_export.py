@@ -0,0 +1,97 @@
+"""
+Benchmark the export of scored etablissements by the importer: `DataFrame.to_sql`
+versus a TSV file loaded with `LOAD DATA LOCAL INFILE` into a swapped table
+(`db.load_df_etab_to_table`), on a synthetic departement.
+
+It requires a MySQL database accepting `LOAD DATA LOCAL INFILE` (`local_infile` server
+variable). The benchmark table is dropped at the end.
+
+Usage:
+
+    python -m labonneboite.scripts.benchmarks.etablissements_export --sirets 200000 --months 60
+"""
+import argparse
+import json
+import logging
+import time
+
+import numpy as np
+import pandas as pd
+
+from labonneboite.importer import db
+
+logging.basicConfig(level=logging.INFO, format='%(message)s')
+logger = logging.getLogger(__name__)
+
+TABLE_NAME = 'etablissements_benchmark'
+
+
+def get_df_etab(siret_count: int, month_count: int, seed: int) -> pd.DataFrame:
+    """
+    Same columns types as the df_etab of `compute_score.train`: office columns, hirings per
+    month, hirings per period and scores.
+    """
+    rand = np.random.default_rng(seed)
+    df_etab = pd.DataFrame({
+        'siret': ['%014d' % index for index in range(siret_count)],
+        'raisonsociale': ['RAISON SOCIALE %s' % index for index in range(siret_count)],
+        'enseigne': ['ENSEIGNE\t%s' % index for index in range(siret_count)],
+        'codenaf': rand.choice(['4711D', '5610A', '8810A'], siret_count),
+        'website': '',
+        'departement': '57',
+        'effectif': rand.integers(0, 1000, siret_count),
+    })
+    for prefix in ['dpae', 'alt']:
+        for month in range(month_count):
+            df_etab['%s-%s-%s' % (prefix, 2016 + month // 12, 1 + month % 12)] = rand.poisson(0.3, siret_count) * 1.0
+        for period in range(1, 13):
+            df_etab['%s-period-%s' % (prefix, period)] = rand.poisson(2, siret_count) * 1.0
+    for score in ['score', 'score_alternance']:
+        df_etab['%s_regr' % score] = rand.random(siret_count) * 10
+        df_etab[score] = rand.integers(0, 100, siret_count)
+    return df_etab
+
+
+def export_with_to_sql(df_etab: pd.DataFrame) -> None:
+    df_etab.to_sql(TABLE_NAME, db.get_engine(), if_exists='replace', chunksize=10000)
+
+
+def export_with_load_data(df_etab: pd.DataFrame) -> None:
+    db.load_df_etab_to_table(df_etab, TABLE_NAME, db.get_engine(local_infile=True))
+
+
+def run() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sirets', type=int, default=200000)
+    parser.add_argument('--months', type=int, default=60)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    df_etab = get_df_etab(args.sirets, args.months, args.seed)
+    engine = db.get_engine()
+    report = []
+    try:
+        for name, export in [('to_sql', export_with_to_sql), ('load_data', export_with_load_data)]:
+            start = time.perf_counter()
+            export(df_etab)
+            duration = time.perf_counter() - start
+            row_count = engine.execute('SELECT COUNT(*) FROM `%s`' % TABLE_NAME).scalar()
+            if row_count != len(df_etab):
+                raise ValueError("%s exported %s rows instead of %s" % (name, row_count, len(df_etab)))
+            stats = {
+                'path': name,
+                'sirets': len(df_etab),
+                'columns': len(df_etab.columns),
+                'duration_s': round(duration, 3),
+                'rows_per_s': round(len(df_etab) / duration),
+            }
+            report.append(stats)
+            logger.info("%s", stats)
+    finally:
+        engine.execute('DROP TABLE IF EXISTS `%s`' % TABLE_NAME)
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,116 @@
+"""
+Benchmark the computation of the hirings per period of the importer
+(`hirings.add_period_hiring_columns`) against the former row by row
+`DataFrame.apply`, on a synthetic departement. No database is needed.
+
+The row by row path is slow: it only runs on the first `--row-wise-sirets` offices,
+which are also used to check that both paths give identical columns.
+
+Usage:
+
+    python -m labonneboite.scripts.benchmarks.hiring_aggregates --sirets 200000 --months 60
+"""
+import argparse
+import datetime
+import json
+import logging
+import time
+from typing import List
+
+from dateutil.relativedelta import relativedelta
+import numpy as np
+import pandas as pd
+
+from labonneboite.importer import hirings
+
+logging.basicConfig(level=logging.INFO, format='%(message)s')
+logger = logging.getLogger(__name__)
+
+PREFIXES = ['dpae', 'alt']
+MONTHS_PER_PERIOD = 6
+# As computed by `compute_score.train`: training_periods + 2 * periods_per_year + data_gap_in_periods
+PERIODS = 7 + 2 * 2 + 1
+
+
+def get_df_etab(siret_count: int, month_count: int, prediction_beginning_date: datetime.date,
+                seed: int) -> pd.DataFrame:
+    """
+    One row per siret and one column per month and per hiring type, as given by
+    `compute_score.get_df_etab_with_hiring_monthly_aggregates`.
+    """
+    rand = np.random.default_rng(seed)
+    columns = {}
+    for prefix in PREFIXES:
+        for month in range(1, month_count + 1):
+            date = prediction_beginning_date + relativedelta(months=-month)
+            columns['%s-%s-%s' % (prefix, date.year, date.month)] = rand.poisson(0.3, siret_count).astype(np.float64)
+    df_etab = pd.DataFrame(columns)
+    df_etab['siret'] = ['%014d' % index for index in range(siret_count)]
+    df_etab['effectif'] = rand.integers(0, 100, siret_count)
+    return df_etab
+
+
+def add_period_hiring_columns_row_wise(df_etab: pd.DataFrame, prediction_beginning_date: datetime.date,
+                                       prefix: str) -> List[str]:
+    period_count_columns = []
+    for i in range(1, PERIODS + 1):
+        column = '%s-period-%s' % (prefix, i)
+        # pylint: disable=cell-var-from-loop
+        df_etab[column] = df_etab.apply(
+            lambda office: hirings.get_hirings_over_period_for_office(
+                office, prediction_beginning_date, MONTHS_PER_PERIOD, minus=i, prefix=prefix,
+            ),
+            axis=1,
+        )
+        period_count_columns.append(column)
+    return period_count_columns
+
+
+def add_period_hiring_columns(df_etab: pd.DataFrame, prediction_beginning_date: datetime.date,
+                              prefix: str) -> List[str]:
+    return hirings.add_period_hiring_columns(
+        df_etab, prediction_beginning_date, PERIODS, prefix, MONTHS_PER_PERIOD,
+    )
+
+
+def run() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sirets', type=int, default=200000)
+    parser.add_argument('--months', type=int, default=60)
+    parser.add_argument('--row-wise-sirets', type=int, default=20000)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    prediction_beginning_date = datetime.date(2021, 6, 1)
+    df_etab = get_df_etab(args.sirets, args.months, prediction_beginning_date, args.seed)
+
+    report = []
+    results = {}
+    for name, add_columns, siret_count in [
+            ('row_wise', add_period_hiring_columns_row_wise, min(args.row_wise_sirets, args.sirets)),
+            ('vectorized', add_period_hiring_columns, args.sirets),
+    ]:
+        df = df_etab.iloc[:siret_count].copy()
+        start = time.perf_counter()
+        for prefix in PREFIXES:
+            add_columns(df, prediction_beginning_date, prefix)
+        duration = time.perf_counter() - start
+        results[name] = df
+        stats = {
+            'path': name,
+            'sirets': siret_count,
+            'months': args.months,
+            'duration_s': round(duration, 3),
+            'sirets_per_s': round(siret_count / duration),
+        }
+        report.append(stats)
+        logger.info("%s", stats)
+
+    # Raises if columns or their types differ
+    pd.testing.assert_frame_equal(results['row_wise'], results['vectorized'].iloc[:len(results['row_wise'])])
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    run()
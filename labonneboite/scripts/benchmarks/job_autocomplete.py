@@ -0,0 +1,111 @@
+"""
+Benchmark the job label autocomplete: the in-memory `autocomplete.JobLabelIndex`
+versus the Elasticsearch `ogr` aggregation query, on a deterministic corpus of
+prefixes typed by users: the first one or two words of real job labels, the last
+one truncated, with or without accents and capitals.
+
+The Elasticsearch path only runs with `--es`, against an index created by
+`create_index`. It also reports how often both paths suggest the same first ROME.
+
+Usage:
+
+    python -m labonneboite.scripts.benchmarks.job_autocomplete --queries 5000 [--es]
+"""
+import argparse
+import json
+import logging
+import random
+import time
+from typing import Callable, Dict, List
+
+import numpy as np
+import unidecode
+
+from labonneboite.common import autocomplete
+
+logging.basicConfig(level=logging.INFO, format='%(message)s')
+logger = logging.getLogger(__name__)
+
+
+def get_prefixes(count: int, seed: int) -> List[str]:
+    rand = random.Random(seed)
+    job_labels = autocomplete.get_job_labels()
+    prefixes = []
+    while len(prefixes) < count:
+        words = [
+            word for word in rand.choice(job_labels)['ogr_description'].replace('/', ' ').split()
+            if autocomplete.get_words(word)
+        ]
+        if not words:
+            continue
+        words = words[:rand.choice([1, 1, 2])]
+        words[-1] = words[-1][:rand.randint(2, max(len(words[-1]), 2))]
+        prefix = ' '.join(words)
+        if rand.random() < 0.3:
+            prefix = unidecode.unidecode(prefix)
+        if rand.random() < 0.5:
+            prefix = prefix.lower()
+        prefixes.append(prefix)
+    return prefixes
+
+
+def measure(suggest: Callable[[str], List[Dict]], prefixes: List[str]) -> Dict:
+    durations = []
+    results = []
+    for prefix in prefixes:
+        start = time.perf_counter()
+        results.append(suggest(prefix))
+        durations.append(time.perf_counter() - start)
+    durations_us = 1e6 * np.array(durations)
+    return {
+        'queries': len(prefixes),
+        'no_suggestion': sum(1 for suggestions in results if not suggestions),
+        'mean_us': round(float(durations_us.mean()), 1),
+        'p50_us': round(float(np.percentile(durations_us, 50)), 1),
+        'p95_us': round(float(np.percentile(durations_us, 95)), 1),
+        'p99_us': round(float(np.percentile(durations_us, 99)), 1),
+    }, results
+
+
+def run() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--queries', type=int, default=5000)
+    parser.add_argument('--size', type=int, default=autocomplete.MAX_JOBS)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--es', action='store_true', help="also measure the Elasticsearch query")
+    args = parser.parse_args()
+
+    prefixes = get_prefixes(args.queries, args.seed)
+
+    start = time.perf_counter()
+    index = autocomplete.JobLabelIndex(autocomplete.get_job_labels())
+    build_duration = time.perf_counter() - start
+
+    # Suggestions are not cached by `build_job_label_suggestions` here: each query is computed.
+    paths = [('in_memory', lambda term: index.suggest(autocomplete.enrich_job_term_with_thesaurus(term), args.size))]
+    if args.es:
+        paths.append(('es', lambda term: autocomplete.build_job_label_suggestions_from_es(
+            autocomplete.enrich_job_term_with_thesaurus(term), args.size)))
+
+    report = []
+    results = {}
+    for name, suggest in paths:
+        stats, results[name] = measure(suggest, prefixes)
+        stats['path'] = name
+        if name == 'in_memory':
+            stats['build_s'] = round(build_duration, 3)
+        report.append(stats)
+        logger.info("%s", stats)
+
+    if args.es:
+        same_first_rome = sum(
+            1 for in_memory, es in zip(results['in_memory'], results['es'])
+            if in_memory and es and in_memory[0]['id'] == es[0]['id']
+        )
+        report.append({'same_first_rome': same_first_rome, 'queries': len(prefixes)})
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,123 @@
+"""
+Benchmark the hydration of search results: full `Office` ORM objects wrapped in
+`OfficeResult`, `OfficeResultRecord` built from a projection of the needed
+columns, and `OfficeResultRecord` built from the fields stored in Elasticsearch
+(no database query).
+
+It requires offices in the database (e.g. the local departement 57 dataset).
+
+Usage:
+
+    python -m labonneboite.scripts.benchmarks.office_hydration --page-sizes 10 100 --repeat 50
+"""
+import argparse
+from collections import OrderedDict
+import json
+import logging
+import time
+import tracemalloc
+from typing import Dict, List
+
+from labonneboite.common import hiring_type_util
+from labonneboite.common.database import db_session
+from labonneboite.common.es import OFFICE_RESULT_FIELD
+from labonneboite.common.models import Office
+from labonneboite.common.search import HiddenMarketFetcher
+from labonneboite.scripts.create_index import get_office_result_fields
+
+logging.basicConfig(level=logging.INFO, format='%(message)s')
+logger = logging.getLogger(__name__)
+
+
+def get_fetcher() -> HiddenMarketFetcher:
+    fetcher = HiddenMarketFetcher(
+        longitude=6.17,
+        latitude=49.12,
+        romes=['D1101'],
+        distance=10,
+        hiring_type=hiring_type_util.DPAE,
+    )
+    # Sets the position of the distance in ES sort values
+    fetcher._build_elastic_search_query()
+    return fetcher
+
+
+def get_es_offices_by_siret(page_size: int) -> 'OrderedDict[str, Dict]':
+    """
+    Fake ES hits for the first `page_size` offices of the database.
+    """
+    offices = db_session.query(Office).order_by(Office.siret).limit(page_size)
+    es_offices_by_siret = OrderedDict((office.siret, {
+        '_source': {
+            'siret': office.siret,
+            OFFICE_RESULT_FIELD: get_office_result_fields(office),
+        },
+        'sort': [None, 1.0, 2.5],
+    }) for office in offices)
+    db_session.remove()
+    return es_offices_by_siret
+
+
+def hydrate_offices(fetcher: HiddenMarketFetcher, es_offices_by_siret: 'OrderedDict[str, Dict]') -> List:
+    offices = fetcher._get_offices_from_db(es_offices_by_siret)
+    return list(fetcher._format_offices_in_office_results(offices, es_offices_by_siret, len(offices)))
+
+
+def hydrate_records(fetcher: HiddenMarketFetcher, es_offices_by_siret: 'OrderedDict[str, Dict]') -> List:
+    records = fetcher._get_office_records_from_db(es_offices_by_siret)
+    return list(fetcher._format_offices_in_office_results(records, es_offices_by_siret, len(records)))
+
+
+def hydrate_es_records(fetcher: HiddenMarketFetcher, es_offices_by_siret: 'OrderedDict[str, Dict]') -> List:
+    records = fetcher._get_office_records_from_es(es_offices_by_siret)
+    return list(fetcher._format_offices_in_office_results(records, es_offices_by_siret, len(records)))
+
+
+def measure(hydrate, fetcher, es_offices_by_siret, repeat: int) -> Dict[str, float]:
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        results = hydrate(fetcher, es_offices_by_siret)
+        # Render results as the API does, so that lazy attributes are accounted for
+        for result in results:
+            result.as_json(rome_codes=fetcher.romes, hiring_type=fetcher.hiring_type)
+        durations.append(time.perf_counter() - start)
+        # Do not let the identity map serve the next iteration
+        db_session.remove()
+
+    tracemalloc.start()
+    results = hydrate(fetcher, es_offices_by_siret)
+    _, peak_memory = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    db_session.remove()
+
+    durations.sort()
+    return {
+        'results': len(results),
+        'mean_ms': round(1000 * sum(durations) / len(durations), 3),
+        'median_ms': round(1000 * durations[len(durations) // 2], 3),
+        'peak_memory_kb': round(peak_memory / 1024, 1),
+    }
+
+
+def run() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--page-sizes', type=int, nargs='+', default=[10, 100])
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    fetcher = get_fetcher()
+    report = []
+    for page_size in args.page_sizes:
+        es_offices_by_siret = get_es_offices_by_siret(page_size)
+        for name, hydrate in [('orm', hydrate_offices), ('records', hydrate_records), ('es', hydrate_es_records)]:
+            stats = measure(hydrate, fetcher, es_offices_by_siret, args.repeat)
+            stats.update({'page_size': page_size, 'path': name})
+            report.append(stats)
+            logger.info("page_size=%s path=%s: %s", page_size, name, stats)
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    run()
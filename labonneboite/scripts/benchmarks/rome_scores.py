@@ -0,0 +1,90 @@
+"""
+Benchmark the computation of the scores by ROME of offices during indexing: the
+per-office path (`create_index.get_scores_by_rome_and_boosted_romes`) versus the
+vectorized `RomeScoresTable`, on synthetic offices. No database is needed.
+
+Usage:
+
+    python -m labonneboite.scripts.benchmarks.rome_scores --offices 100000 --batch-size 1000
+"""
+import argparse
+import json
+import logging
+import random
+import time
+from types import SimpleNamespace
+from typing import Dict, List
+
+from labonneboite.common import mapping as mapping_util
+from labonneboite.common import scoring as scoring_util
+from labonneboite.common.rome_scores import RomeScoresTable
+from labonneboite.scripts import create_index
+
+logging.basicConfig(level=logging.INFO, format='%(message)s')
+logger = logging.getLogger(__name__)
+
+
+def get_offices(count: int, seed: int) -> List[SimpleNamespace]:
+    rand = random.Random(seed)
+    nafs = sorted(mapping_util.MANUAL_NAF_ROME_MAPPING)
+    max_hiring = 2 * scoring_util.get_hirings_from_score(100)
+    return [
+        SimpleNamespace(siret='%014d' % index, naf=rand.choice(nafs), hiring=int(rand.expovariate(10 / max_hiring)))
+        for index in range(count)
+    ]
+
+
+def clear_caches() -> None:
+    for func in [
+            scoring_util._get_score_from_hirings,
+            scoring_util.get_score_adjusted_to_rome_code_and_naf_code,
+            mapping_util.get_romes_for_naf,
+    ]:
+        func.cache_clear()
+
+
+def score_per_office(offices: List[SimpleNamespace], batch_size: int) -> List[Dict[str, int]]:
+    return [create_index.get_scores_by_rome_and_boosted_romes(office)[0] for office in offices]
+
+
+def score_vectorized(offices: List[SimpleNamespace], batch_size: int) -> List[Dict[str, int]]:
+    table = RomeScoresTable()
+    scores_by_rome: List[Dict[str, int]] = []
+    for start in range(0, len(offices), batch_size):
+        scores_by_rome.extend(create_index.get_scores_by_rome_for_offices(offices[start:start + batch_size], table))
+    return scores_by_rome
+
+
+def run() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--offices', type=int, default=100000)
+    parser.add_argument('--batch-size', type=int, default=create_index.OFFICES_YIELD_PER)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    offices = get_offices(args.offices, args.seed)
+    report = []
+    results = {}
+    for name, score in [('per_office', score_per_office), ('vectorized', score_vectorized)]:
+        # Start each path with cold caches, as a new indexing process does.
+        clear_caches()
+        start = time.perf_counter()
+        results[name] = score(offices, args.batch_size)
+        duration = time.perf_counter() - start
+        stats = {
+            'path': name,
+            'offices': len(offices),
+            'duration_s': round(duration, 3),
+            'offices_per_s': round(len(offices) / duration),
+        }
+        report.append(stats)
+        logger.info("%s", stats)
+
+    if results['per_office'] != results['vectorized']:
+        raise ValueError("vectorized scores differ from per office scores")
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,183 @@
+"""
+Benchmark the Elasticsearch schemas of the scores of offices by ROME: scores
+mapped dynamically and searched with one `exists` filter per ROME, versus scores
+declared as doc values fields and searched with a terms filter on the ROME codes
+of offices (see `settings.ES_EXPLICIT_ROME_SCORES_MAPPING`).
+
+The same synthetic offices are indexed in two new indexes of the local
+Elasticsearch, one per schema, which are deleted afterwards (unless `--keep`).
+The same searches, built by `HiddenMarketFetcher`, then alternately run on both
+indexes. Their latency (measured by the client and by Elasticsearch), the size
+and fielddata memory of the indexes, and the number of searches for which both
+schemas return the same offices are reported.
+
+Usage:
+
+    python -m labonneboite.scripts.benchmarks.rome_scores_schema --offices 500000 --searches 1000
+"""
+import argparse
+import contextlib
+import json
+import logging
+import random
+import time
+from typing import Dict, Generator, List
+
+import numpy as np
+from elasticsearch.helpers import bulk
+
+from labonneboite.common import es, hiring_type_util, sorting
+from labonneboite.common.conf import settings
+from labonneboite.common.search import HiddenMarketFetcher
+
+logging.basicConfig(level=logging.INFO, format='%(message)s')
+logger = logging.getLogger(__name__)
+
+SCHEMAS = [('dynamic', False), ('explicit', True)]
+DISTANCES = [10, 30, 50, 100]
+# Metropolitan France, roughly
+MIN_LATITUDE, MAX_LATITUDE = 42.5, 51.0
+MIN_LONGITUDE, MAX_LONGITUDE = -4.5, 8.0
+
+
+@contextlib.contextmanager
+def explicit_rome_scores(enabled: bool) -> Generator[None, None, None]:
+    previous = settings.ES_EXPLICIT_ROME_SCORES_MAPPING
+    settings.ES_EXPLICIT_ROME_SCORES_MAPPING = enabled
+    try:
+        yield
+    finally:
+        settings.ES_EXPLICIT_ROME_SCORES_MAPPING = previous
+
+
+def get_office_docs(count: int, seed: int) -> Generator[Dict, None, None]:
+    """
+    Synthetic office documents, as indexed by `create_index` (without the fields only read to display them).
+    """
+    rand = random.Random(seed)
+    romes = sorted(settings.ROME_DESCRIPTIONS)
+    for position in range(count):
+        scores_by_rome = {rome: rand.randint(1, 100) for rome in rand.sample(romes, rand.randint(1, 40))}
+        yield es.add_rome_codes({
+            'siret': f'{position:014d}',
+            'naf': f'{rand.randint(100, 9999):04d}Z',
+            'score': max(scores_by_rome.values()),
+            'headcount': rand.randint(1, 12),
+            'department': f'{rand.randint(1, 95):02d}',
+            'email': 'contact@example.com' if rand.random() < 0.3 else '',
+            'flag_alternance': 0,
+            'flag_junior': int(rand.random() < 0.2),
+            'flag_senior': int(rand.random() < 0.2),
+            'flag_handicap': int(rand.random() < 0.1),
+            'flag_pmsmp': 0,
+            'locations': [{
+                'lat': rand.uniform(MIN_LATITUDE, MAX_LATITUDE),
+                'lon': rand.uniform(MIN_LONGITUDE, MAX_LONGITUDE),
+            }],
+            'scores_by_rome': scores_by_rome,
+        })
+
+
+def create_index(index: str, explicit: bool, offices: int, seed: int) -> float:
+    """
+    Create and fill an index with the given schema. Return the indexing duration.
+    """
+    with explicit_rome_scores(explicit):
+        es.create_index(index, routed_by_departement=False, explicit_rome_scores=explicit)
+        start = time.perf_counter()
+        bulk(es.new_elasticsearch_instance(), ({
+            '_index': index,
+            '_type': es.OFFICE_TYPE,
+            '_id': doc['siret'],
+            '_source': doc,
+        } for doc in get_office_docs(offices, seed)), chunk_size=5000)
+        es.Elasticsearch().indices.refresh(index=index)
+    return time.perf_counter() - start
+
+
+def get_fetchers(count: int, seed: int, sort: str) -> List[HiddenMarketFetcher]:
+    rand = random.Random(seed)
+    romes = sorted(settings.ROME_DESCRIPTIONS)
+    return [
+        HiddenMarketFetcher(
+            latitude=rand.uniform(MIN_LATITUDE, MAX_LATITUDE),
+            longitude=rand.uniform(MIN_LONGITUDE, MAX_LONGITUDE),
+            romes=rand.sample(romes, rand.choice([1, 1, 1, 2, 3])),
+            distance=rand.choice(DISTANCES),
+            sort=sort,
+            hiring_type=hiring_type_util.DPAE,
+            from_number=1,
+            to_number=10,
+        ) for _ in range(count)
+    ]
+
+
+def get_index_stats(index: str) -> Dict:
+    stats = es.Elasticsearch().indices.stats(index=index)['indices'][index]['total']
+    return {
+        'store_mb': round(stats['store']['size_in_bytes'] / 1024**2, 1),
+        'fielddata_mb': round(stats['fielddata']['memory_size_in_bytes'] / 1024**2, 1),
+    }
+
+
+def get_latency_stats(durations_ms: List[float]) -> Dict[str, float]:
+    durations = np.array(durations_ms)
+    return {
+        'mean_ms': round(float(durations.mean()), 2),
+        'p50_ms': round(float(np.percentile(durations, 50)), 2),
+        'p95_ms': round(float(np.percentile(durations, 95)), 2),
+        'p99_ms': round(float(np.percentile(durations, 99)), 2),
+    }
+
+
+def run() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--offices', type=int, default=500000)
+    parser.add_argument('--searches', type=int, default=1000)
+    parser.add_argument('--sort', default=sorting.SORT_FILTER_SCORE, choices=sorting.SORT_FILTERS)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--keep', action='store_true', help="do not delete the benchmark indexes")
+    args = parser.parse_args()
+
+    indexes = {name: f'{es.get_new_index_name()}-{name}' for name, _ in SCHEMAS}
+    report: Dict[str, Dict] = {}
+    try:
+        for name, explicit in SCHEMAS:
+            duration = create_index(indexes[name], explicit, args.offices, args.seed)
+            es.Elasticsearch().indices.clear_cache(index=indexes[name])
+            report[name] = {'offices': args.offices, 'indexing_s': round(duration, 1)}
+            logger.info("indexed %s offices in %s in %.1fs", args.offices, indexes[name], duration)
+
+        durations: Dict[str, List[float]] = {name: [] for name, _ in SCHEMAS}
+        took: Dict[str, List[float]] = {name: [] for name, _ in SCHEMAS}
+        same_results = 0
+        for fetcher in get_fetchers(args.searches, args.seed, args.sort):
+            sirets = []
+            # Schemas alternate, so that both get the same conditions
+            for name, explicit in SCHEMAS:
+                with explicit_rome_scores(explicit):
+                    query = fetcher._build_elastic_search_query()
+                start = time.perf_counter()
+                res = es.Elasticsearch().search(index=indexes[name], doc_type=es.OFFICE_TYPE, body=query)
+                durations[name].append(1000 * (time.perf_counter() - start))
+                took[name].append(res['took'])
+                sirets.append([hit['_id'] for hit in res['hits']['hits']])
+            same_results += int(sirets[0] == sirets[1])
+
+        for name, _ in SCHEMAS:
+            report[name].update(get_latency_stats(durations[name]))
+            report[name]['es_took_p50_ms'] = get_latency_stats(took[name])['p50_ms']
+            report[name]['es_took_p95_ms'] = get_latency_stats(took[name])['p95_ms']
+            report[name].update(get_index_stats(indexes[name]))
+            logger.info("%s: %s", name, report[name])
+        report['same_results'] = {'searches': args.searches, 'same': same_results}
+    finally:
+        if not args.keep:
+            for index in indexes.values():
+                es.drop_index(index)
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    run()
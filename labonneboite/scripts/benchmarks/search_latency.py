@@ -0,0 +1,337 @@
+"""
+Benchmark office searches on a reproducible synthetic corpus: latency of the
+searches made by `HiddenMarketFetcher` and number of Elasticsearch round trips
+per request, along with the indexing throughput of the corpus.
+
+The corpus is generated from a seed: offices are spread over the communes of
+`geocoding.get_cities()` (weighted by population), their NAF is weighted by its
+hirings in `MANUAL_NAF_ROME_MAPPING` and their hirings follow a log-normal
+distribution. Offices are indexed in a new index of the local Elasticsearch by
+the `create_index` code paths, with the current settings (e.g. routing or
+explicit scores by ROME), and results are built from the indexed fields: no
+database is needed.
+
+The same seed then gives the same mix of requests, as made by the web app and
+the API: ROME (weighted by hirings) x city (weighted by population) x distance
+x filters x sort x page. The search cache is disabled, so that each request
+reaches Elasticsearch. The JSON report is meant to be compared between runs.
+
+The index is deleted afterwards, unless `--keep` is given: it can then be
+searched again with `--index <name>`, without indexing the corpus again.
+
+Usage:
+
+    python -m labonneboite.scripts.benchmarks.search_latency --offices 200000 --requests 2000
+    python -m labonneboite.scripts.benchmarks.search_latency --index labonneboite-20240101000000-abcde
+"""
+import argparse
+import contextlib
+import json
+import logging
+import random
+import time
+from typing import Any, Dict, Generator, Iterator, List, NamedTuple, Optional
+
+import numpy as np
+
+from labonneboite.common import es, geocoding, hiring_type_util, search_cache, sorting
+from labonneboite.common import mapping as mapping_util
+from labonneboite.common.conf import settings
+from labonneboite.common.models import Office
+from labonneboite.common.rome_scores import RomeScoresTable
+from labonneboite.common.search import FILTERS, AudienceFilter, HiddenMarketFetcher
+from labonneboite.scripts import create_index
+
+logging.basicConfig(level=logging.INFO, format='%(message)s')
+logger = logging.getLogger(__name__)
+
+# Hirings of offices: median of about 2, 1% of offices hire more than 40 people.
+HIRINGS_MU = 0.7
+HIRINGS_SIGMA = 1.3
+# Offices are located around the center of their commune.
+COORDINATES_JITTER_DEGREES = 0.02
+# Most offices are small.
+HEADCOUNT_WEIGHTS = {
+    '00': 10, '01': 25, '02': 20, '03': 15, '11': 12, '12': 9, '21': 4, '22': 2,
+    '31': 1, '32': 1, '41': 0.5, '42': 0.3, '51': 0.1, '52': 0.05, '53': 0.05,
+}
+
+# Request mix: kind of request, distance, sort, audience, headcount filter and page.
+KIND_WEIGHTS = {'frontend': 50, 'api_list': 30, 'api_count': 10, 'api_filters': 10}
+DISTANCE_WEIGHTS = {5: 5, 10: 50, 30: 20, 50: 10, 100: 10, 3000: 5}
+SORT_WEIGHTS = {sorting.SORT_FILTER_SMART: 80, sorting.SORT_FILTER_DISTANCE: 15, sorting.SORT_FILTER_SCORE: 5}
+AUDIENCE_WEIGHTS = {AudienceFilter.ALL: 85, AudienceFilter.JUNIOR: 5, AudienceFilter.SENIOR: 5,
+                    AudienceFilter.HANDICAP: 5}
+HEADCOUNT_FILTER_WEIGHTS = {settings.HEADCOUNT_WHATEVER: 80, settings.HEADCOUNT_SMALL_ONLY: 10,
+                            settings.HEADCOUNT_BIG_ONLY: 10}
+PAGE_WEIGHTS = {1: 85, 2: 10, 3: 5}
+# Ratio of requests filtered on the main NAF of their ROME
+NAF_FILTER_RATIO = 0.1
+PAGE_SIZES = {'frontend': 20, 'api_list': 100, 'api_count': 100, 'api_filters': 100}
+
+
+class Request(NamedTuple):
+    kind: str
+    fetcher_kwargs: Dict[str, Any]
+
+
+class WeightedCities(object):
+    """
+    Cities of the geocoding cache which have coordinates, drawn by population.
+    """
+
+    def __init__(self) -> None:
+        self.cities = [city for city in geocoding.get_cities() if city['coords']['lat'] and city['coords']['lon']]
+        self.cumulative_weights = np.cumsum([city['population'] or 1 for city in self.cities]).tolist()
+        self.departements = geocoding.get_departements_of_commune_ids(
+            np.array([city['commune_id'] for city in self.cities], dtype='S5')).astype(str).tolist()
+
+    def draw(self, rand: random.Random, count: int) -> List[int]:
+        return [
+            min(position, len(self.cities) - 1)
+            for position in np.searchsorted(
+                self.cumulative_weights,
+                [rand.random() * self.cumulative_weights[-1] for _ in range(count)],
+                side='right',
+            ).tolist()
+        ]
+
+
+def choices(rand: random.Random, weights: Dict, count: int = 1) -> List:
+    return rand.choices(list(weights), weights=list(weights.values()), k=count)
+
+
+def get_corpus_batches(count: int, seed: int, cities: WeightedCities) -> Generator[List[Office], None, None]:
+    """
+    Generate the offices of the synthetic corpus by batches, as new (never saved) `Office` instances.
+    """
+    rand = random.Random(seed)
+    hirings_by_naf = {naf: sum(hirings.values()) for naf, hirings in mapping_util.MANUAL_NAF_ROME_MAPPING.items()}
+    for start in range(0, count, create_index.OFFICES_YIELD_PER):
+        size = min(create_index.OFFICES_YIELD_PER, count - start)
+        nafs = choices(rand, hirings_by_naf, size)
+        headcounts = choices(rand, HEADCOUNT_WEIGHTS, size)
+        batch = []
+        for position, city_position, naf, headcount in zip(range(start, start + size), cities.draw(rand, size),
+                                                           nafs, headcounts):
+            city = cities.cities[city_position]
+            batch.append(Office(
+                siret=f'{position:014d}',
+                company_name=f'ENTREPRISE {position}',
+                office_name='',
+                naf=naf,
+                street_number=str(rand.randint(1, 150)),
+                street_name='RUE DE LA REPUBLIQUE',
+                city_code=city['commune_id'],
+                zipcode=city['zipcode'],
+                departement=cities.departements[city_position],
+                headcount=headcount,
+                email=f'contact{position}@example.com' if rand.random() < 0.4 else '',
+                tel='0123456789' if rand.random() < 0.7 else '',
+                website='',
+                social_network='',
+                email_alternance='',
+                phone_alternance='',
+                website_alternance='',
+                contact_mode='',
+                flag_alternance=False,
+                flag_junior=rand.random() < 0.2,
+                flag_senior=rand.random() < 0.2,
+                flag_handicap=rand.random() < 0.1,
+                flag_pmsmp=rand.random() < 0.1,
+                score_alternance=0,
+                hiring=int(rand.lognormvariate(HIRINGS_MU, HIRINGS_SIGMA)),
+                has_multi_geolocations=False,
+                y=city['coords']['lat'] + rand.uniform(-COORDINATES_JITTER_DEGREES, COORDINATES_JITTER_DEGREES),
+                x=city['coords']['lon'] + rand.uniform(-COORDINATES_JITTER_DEGREES, COORDINATES_JITTER_DEGREES),
+            ))
+        yield batch
+
+
+def index_corpus(index: str, offices: int, seed: int, cities: WeightedCities) -> Dict[str, Any]:
+    """
+    Create `index` and index the corpus in it, as `create_index` does for the offices of the database.
+    """
+    es.create_index(index)
+    rome_scores_table = RomeScoresTable()
+
+    def get_actions() -> Iterator[Dict[str, Any]]:
+        for batch in get_corpus_batches(offices, seed, cities):
+            yield from create_index.get_office_actions_for_batch(batch, rome_scores_table, index)
+
+    stats = create_index.stream_bulk_actions(get_actions())
+    start = time.perf_counter()
+    es.Elasticsearch().indices.refresh(index=index)
+    refresh_duration = time.perf_counter() - start
+    return {
+        'offices': offices,
+        'indexed_offices': stats.action_count,
+        'indexing_s': round(stats.duration, 1),
+        'offices_per_s': round(offices / stats.duration),
+        'mb_sent': round(stats.byte_count / 1024**2, 1),
+        'refresh_s': round(refresh_duration, 1),
+    }
+
+
+def get_requests(count: int, seed: int, cities: WeightedCities) -> List[Request]:
+    rand = random.Random(seed)
+    hirings_by_rome = {rome: sum(hirings.values()) for rome, hirings in mapping_util.MANUAL_ROME_NAF_MAPPING.items()}
+    requests = []
+    for rome, city_position in zip(choices(rand, hirings_by_rome, count), cities.draw(rand, count)):
+        kind = choices(rand, KIND_WEIGHTS)[0]
+        page = choices(rand, PAGE_WEIGHTS)[0]
+        city = cities.cities[city_position]
+        naf_codes = None
+        if rand.random() < NAF_FILTER_RATIO:
+            naf_codes = [mapping_util.nafs_for_rome(rome)[0].code]
+        kwargs = {
+            'longitude': city['coords']['lon'],
+            'latitude': city['coords']['lat'],
+            'romes': [rome],
+            'distance': choices(rand, DISTANCE_WEIGHTS)[0],
+            'sort': choices(rand, SORT_WEIGHTS)[0],
+            'hiring_type': hiring_type_util.DPAE,
+            'from_number': (page - 1) * PAGE_SIZES[kind] + 1,
+            'to_number': page * PAGE_SIZES[kind],
+            'audience': choices(rand, AUDIENCE_WEIGHTS)[0],
+            'headcount': choices(rand, HEADCOUNT_FILTER_WEIGHTS)[0],
+            'naf_codes': naf_codes,
+        }
+        if kind == 'frontend':
+            kwargs['aggregate_by'] = ['naf']
+        elif kind == 'api_filters':
+            kwargs['aggregate_by'] = FILTERS
+        requests.append(Request(kind, kwargs))
+    return requests
+
+
+def send_request(request: Request) -> None:
+    """
+    Make the fetcher calls of a request, as the views of the web app and the API do.
+    """
+    fetcher = HiddenMarketFetcher(**request.fetcher_kwargs)
+    if request.kind == 'frontend':
+        _, aggregations = fetcher.get_offices(add_suggestions=True)
+        fetcher.get_alternative_rome_descriptions()
+        if aggregations:
+            fetcher.update_aggregations(aggregations)
+    elif request.kind == 'api_list':
+        fetcher.get_offices(add_suggestions=False)
+    elif request.kind == 'api_count':
+        fetcher.compute_office_count()
+    elif request.kind == 'api_filters':
+        fetcher.get_facets()
+    else:
+        raise ValueError(f'unknown request kind {request.kind!r}')
+
+
+@contextlib.contextmanager
+def count_round_trips() -> Generator[List[int], None, None]:
+    """
+    Count the requests sent to Elasticsearch by the client used by searches, in the yielded list.
+    """
+    transport = es.Elasticsearch().transport
+    perform_request = transport.perform_request
+    counter = [0]
+
+    def counting_perform_request(*args: Any, **kwargs: Any) -> Any:
+        counter[0] += 1
+        return perform_request(*args, **kwargs)
+
+    transport.perform_request = counting_perform_request
+    try:
+        yield counter
+    finally:
+        transport.perform_request = perform_request
+
+
+@contextlib.contextmanager
+def search_settings(index: str) -> Generator[None, None, None]:
+    """
+    Search `index`, without the search cache, and build results from the indexed fields.
+    """
+    overrides = {'ES_INDEX': index, 'SEARCH_CACHE_ENABLED': False, 'SEARCH_HYDRATE_FROM_ES': True}
+    previous = {name: getattr(settings, name) for name in overrides}
+    for name, value in overrides.items():
+        setattr(settings, name, value)
+    try:
+        yield
+    finally:
+        for name, value in previous.items():
+            setattr(settings, name, value)
+
+
+def replay(requests: List[Request], warmup: int) -> List[Dict[str, Any]]:
+    measures = []
+    with count_round_trips() as round_trips:
+        for position, request in enumerate(requests):
+            round_trips[0] = 0
+            start = time.perf_counter()
+            send_request(request)
+            duration = time.perf_counter() - start
+            if position >= warmup:
+                measures.append({'kind': request.kind, 'ms': 1000 * duration, 'round_trips': round_trips[0]})
+    return measures
+
+
+def get_stats(measures: List[Dict[str, Any]], kind: Optional[str] = None) -> Dict[str, Any]:
+    selected = [measure for measure in measures if kind is None or measure['kind'] == kind]
+    if not selected:
+        return {'requests': 0}
+    durations = np.array([measure['ms'] for measure in selected])
+    round_trips = np.array([measure['round_trips'] for measure in selected])
+    return {
+        'requests': len(selected),
+        'mean_ms': round(float(durations.mean()), 2),
+        'p50_ms': round(float(np.percentile(durations, 50)), 2),
+        'p95_ms': round(float(np.percentile(durations, 95)), 2),
+        'p99_ms': round(float(np.percentile(durations, 99)), 2),
+        'round_trips_mean': round(float(round_trips.mean()), 2),
+        'round_trips_max': int(round_trips.max()),
+    }
+
+
+def run() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--offices', type=int, default=200000)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--warmup', type=int, default=100, help="requests sent before measuring")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--index', help="search this existing index instead of indexing the corpus")
+    parser.add_argument('--keep', action='store_true', help="do not delete the index of the corpus")
+    args = parser.parse_args()
+
+    cities = WeightedCities()
+    report: Dict[str, Any] = {
+        'seed': args.seed,
+        'settings': {
+            name: getattr(settings, name)
+            for name in ['ES_OFFICES_ROUTED_BY_DEPARTEMENT', 'ES_EXPLICIT_ROME_SCORES_MAPPING']
+        },
+    }
+    index = args.index or es.get_new_index_name() + '-benchmark'
+    try:
+        if not args.index:
+            report['indexing'] = index_corpus(index, args.offices, args.seed, cities)
+            logger.info("indexing: %s", report['indexing'])
+
+        requests = get_requests(args.warmup + args.requests, args.seed, cities)
+        with search_settings(index):
+            search_cache.clear()
+            measures = replay(requests, args.warmup)
+
+        report['searches'] = {'all': get_stats(measures)}
+        for kind in KIND_WEIGHTS:
+            report['searches'][kind] = get_stats(measures, kind)
+            logger.info("%s: %s", kind, report['searches'][kind])
+    finally:
+        if not args.index and not args.keep:
+            es.drop_index(index)
+        elif not args.index:
+            logger.info("kept index %s", index)
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    run()
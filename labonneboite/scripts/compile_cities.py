@@ -0,0 +1,32 @@
+"""
+Compile the cities of the geocoding cache (`common/geocoding/data/*.json`) to the
+memory-mapped arrays loaded by `geocoding.load_cities_cache`.
+
+Run it after any change to the JSON files, before starting the web app: without
+up to date compiled cities, each process reads and compiles the JSON files itself.
+
+Usage:
+
+    python -m labonneboite.scripts.compile_cities [--path <directory>]
+"""
+import argparse
+import logging
+
+from labonneboite.common import geocoding
+from labonneboite.common.geocoding.compiled import COMPILED_CITIES_DIR
+
+logging.basicConfig(level=logging.INFO, format='%(message)s')
+logger = logging.getLogger(__name__)
+
+
+def run() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--path', default=COMPILED_CITIES_DIR)
+    args = parser.parse_args()
+
+    geocoding.compile_cities_cache(args.path)
+    logger.info("cities compiled in %s", args.path)
+
+
+if __name__ == '__main__':
+    run()
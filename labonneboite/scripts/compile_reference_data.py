@@ -0,0 +1,38 @@
+"""
+Compile the reference data CSV files (`common/data`: ROME, NAF and OGR labels,
+ROME NAF mapping, metiers en tension, contact modes) to the bundle loaded by
+`load_data.load_reference_table`, and the ROME NAF mapping to the memory-mapped
+arrays of `mapping.ROME_NAF_MATRIX`.
+
+Run it after any change to these CSV files: outdated compiled data is ignored, and
+each process then reads the CSV files itself.
+
+Usage:
+
+    python -m labonneboite.scripts.compile_reference_data [--path <file>] [--matrix-path <directory>]
+"""
+import argparse
+import logging
+
+from labonneboite.common import load_data, rome_naf_matrix
+
+logging.basicConfig(level=logging.INFO, format='%(message)s')
+logger = logging.getLogger(__name__)
+
+
+def run() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--path', default=load_data.REFERENCE_DATA_FILE)
+    parser.add_argument('--matrix-path', default=rome_naf_matrix.ROME_NAF_MATRIX_DIR)
+    args = parser.parse_args()
+
+    load_data.compile_reference_data(args.path)
+    logger.info("reference data compiled in %s", args.path)
+
+    arrays = rome_naf_matrix.compile_rome_naf_matrix(*load_data.read_rome_naf_mappings())
+    rome_naf_matrix.save_rome_naf_matrix(arrays, args.matrix_path, load_data.get_reference_data_sources())
+    logger.info("ROME NAF matrix compiled in %s", args.matrix_path)
+
+
+if __name__ == '__main__':
+    run()
@@ -3,16 +3,24 @@ import bz2
 import contextlib
 import datetime
 import glob
+import hashlib
+import itertools
+import json
 import logging
 import multiprocessing as mp
 import os
+import queue
+import resource
+import threading
+import time
 
+from collections import namedtuple
 from cProfile import Profile
-from typing import Any, Dict, Generator, List, Optional, Tuple, Type, Union
+from typing import Any, Dict, Generator, Iterable, List, Optional, Sequence, Set, Tuple, Type, Union
 
 import sqlalchemy as sa
 from elasticsearch.exceptions import NotFoundError, TransportError
-from elasticsearch.helpers import bulk
+from elasticsearch.helpers import BulkIndexError, bulk, expand_action
 from labonneboite_common import departements as dpt
 from labonneboite_common import encoding as encoding_util
 from labonneboite_common.models.office_mixin import OfficeMixin
@@ -20,15 +28,17 @@ from pyprof2calltree import convert
 from sqlalchemy import and_, inspect
 
 from labonneboite.conf import settings
-from labonneboite.common import es, geocoding, hiring_type_util
+from labonneboite.common import es, geocoding, hiring_type_util, search_cache
 from labonneboite.common import mapping as mapping_util
 from labonneboite.common import pdf as pdf_util
 from labonneboite.common import scoring as scoring_util
 from labonneboite.common.chunks import chunks
-from labonneboite.common.database import db_session
-from labonneboite.common.load_data import load_ogr_labels, load_siret_to_remove, OGR_ROME_CODES
-from labonneboite.common.models import HistoryBlacklist, Office, OfficeAdminAdd, OfficeAdminExtraGeoLocation, \
-    OfficeAdminRemove, OfficeAdminUpdate, OfficeThirdPartyUpdate
+from labonneboite.common.database import db_session, engine
+from labonneboite.common.load_data import load_ogr_labels, load_ogr_rome_mapping, load_siret_to_remove
+from labonneboite.common.models import HistoryBlacklist, IndexHighWaterMark, Office, OfficeAdminAdd, \
+    OfficeAdminExtraGeoLocation, OfficeAdminRemove, OfficeAdminUpdate, OfficeResultRecord, OfficeThirdPartyUpdate, \
+    OfficeUpdateMixin
+from labonneboite.common.rome_scores import RomeScoresTable
 from labonneboite.common.search import HiddenMarketFetcher
 from labonneboite.common.util import timeit
 
@@ -40,6 +50,20 @@ logger = logging.getLogger(__name__)
 VERBOSE_LOGGER_NAMES = ['elasticsearch', 'sqlalchemy.engine.base.Engine', 'main', 'elasticsearch.trace']
 
 ES_BULK_CHUNK_SIZE = 10000  # default value is 500
+# Offices indexing is streamed: offices are fetched from the DB by batches of OFFICES_YIELD_PER rows and
+# the resulting bulk chunks are sent by ES_BULK_THREAD_COUNT threads, with at most ES_BULK_QUEUE_SIZE
+# chunks waiting for them (see `stream_bulk_actions`). Memory thus no longer grows with the size of the departement.
+OFFICES_YIELD_PER = 1000
+ES_BULK_THREAD_COUNT = 4
+ES_BULK_QUEUE_SIZE = 4
+# Departements having more offices than this are indexed as several jobs of consecutive siret ranges.
+INDEXING_SHARD_SIZE = 50000
+# Indexing processes are reused for several jobs until their peak memory (max RSS, in bytes) exceeds this threshold.
+INDEXING_WORKER_MAX_RSS = 2 * 1024 ** 3
+# Messages sent by indexing processes.
+INDEXING_WORKER_DONE = 'done'
+INDEXING_WORKER_FAILED = 'failed'
+INDEXING_WORKER_RECYCLED = 'recycled'
 
 PSE_STUDY_IS_ENABLED = False
 
@@ -98,6 +122,9 @@ def switch_es_index() -> Generator[None, None, None]:
     for old_index_name in old_index_names:
         es.drop_index(old_index_name)
 
+    # Cached search results come from the old index
+    search_cache.clear()
+
 
 def get_verbose_loggers() -> List['logging.Logger']:
     return [logging.getLogger(logger_name) for logger_name in VERBOSE_LOGGER_NAMES]
@@ -121,31 +148,12 @@ def enable_verbose_loggers() -> None:
         verbose_logger.disabled = False
 
 
-class Counter(object):
-    """
-    Counter class without the race-condition bug.
-    Needed to be able to have a variable (counter) shared between all parallel jobs.
-    Inspired from https://stackoverflow.com/questions/2080660/python-multiprocessing-and-a-shared-counter
-    """
-
-    def __init__(self) -> None:
-        self.val = mp.Value('i', 0)
-
-    def increment(self, n: int = 1) -> None:
-        with self.val.get_lock():
-            self.val.value += n
-
-    @property
-    def value(self) -> int:
-        return self.val.value  # type: ignore
-
-
-completed_jobs_counter = Counter()
-
-
 class StatTracker:
 
     def __init__(self) -> None:
+        self.reset()
+
+    def reset(self) -> None:
         self.office_count = 0
         self.indexed_office_count = 0
         self.office_score_for_rome_count = 0
@@ -157,8 +165,8 @@ class StatTracker:
     def increment_indexed_office_count(self) -> None:
         self.indexed_office_count += 1
 
-    def increment_office_score_for_rome_count(self) -> None:
-        self.office_score_for_rome_count += 1
+    def increment_office_score_for_rome_count(self, n: int = 1) -> None:
+        self.office_score_for_rome_count += n
 
     def increment_office_score_alternance_for_rome_count(self) -> None:
         self.office_score_alternance_for_rome_count += 1
@@ -168,14 +176,71 @@ st = StatTracker()
 
 
 def bulk_actions(actions: List[Dict[str, Any]]) -> None:
-    # unfortunately parallel_bulk is not available in the current elasticsearch version
-    # http://elasticsearch-py.readthedocs.io/en/master/helpers.html
+    # See stream_bulk_actions for actions which do not fit in memory.
     logger.info("started bulk of %s actions...", len(actions))
     # each parallel job needs to use its own ES connection for maximum performance
     bulk(es.new_elasticsearch_instance(), actions, chunk_size=ES_BULK_CHUNK_SIZE)
     logger.info("completed bulk of %s actions!", len(actions))
 
 
+BulkStats = namedtuple('BulkStats', ['action_count', 'byte_count', 'duration'])
+
+
+def stream_bulk_actions(actions: Iterable[Dict[str, Any]]) -> BulkStats:
+    """
+    Send actions to ES as they are generated: they are grouped in chunks of ES_BULK_CHUNK_SIZE actions,
+    which are put in a queue of at most ES_BULK_QUEUE_SIZE chunks and sent by ES_BULK_THREAD_COUNT threads.
+    Actions are thus only generated as fast as they are sent.
+    Return the number of actions and bytes sent, and the elapsed time in seconds.
+    """
+    # each parallel job needs to use its own ES connection for maximum performance
+    client = es.new_elasticsearch_instance()
+    chunk_queue: queue.Queue = queue.Queue(maxsize=ES_BULK_QUEUE_SIZE)
+    errors: List[Exception] = []
+
+    def send_chunks() -> None:
+        while True:
+            chunk = chunk_queue.get()
+            if chunk is None:
+                return
+            # After a failure, the remaining chunks are dropped, so that the queue does not block.
+            if errors:
+                continue
+            try:
+                bulk(client, chunk, chunk_size=ES_BULK_CHUNK_SIZE)
+            except Exception as e:
+                errors.append(e)
+
+    threads = [threading.Thread(target=send_chunks, daemon=True) for _ in range(ES_BULK_THREAD_COUNT)]
+    for thread in threads:
+        thread.start()
+
+    action_count = 0
+    byte_count = 0
+    start = time.time()
+    actions = iter(actions)
+    try:
+        while not errors:
+            chunk = list(itertools.islice(actions, ES_BULK_CHUNK_SIZE))
+            if not chunk:
+                break
+            for action in chunk:
+                _, data = expand_action(action)
+                if data is not None:
+                    byte_count += len(client.transport.serializer.dumps(data).encode('utf-8'))
+            action_count += len(chunk)
+            chunk_queue.put(chunk)
+    finally:
+        for _ in threads:
+            chunk_queue.put(None)
+        for thread in threads:
+            thread.join()
+    if errors:
+        raise errors[0]
+
+    return BulkStats(action_count, byte_count, time.time() - start)
+
+
 @timeit
 def create_job_codes() -> None:
     """
@@ -185,7 +250,7 @@ def create_job_codes() -> None:
     # libelles des appelations pour les codes ROME
     ogr_labels = load_ogr_labels()
     # correspondance appellation vers rome
-    ogr_rome_codes = OGR_ROME_CODES
+    ogr_rome_codes = load_ogr_rome_mapping()
     actions = []
 
     for ogr, description in ogr_labels.items():
@@ -227,10 +292,13 @@ def create_locations() -> None:
 
 
 def get_office_as_es_doc(
-        office: OfficeMixin) -> Dict[str, Union[int, str, None, List[Dict[str, int]], Dict[str, int], Dict[str, bool]]]:
+    office: OfficeMixin,
+    scores_by_rome: Optional[Dict[str, int]] = None,
+) -> Dict[str, Union[int, str, None, List[Dict[str, int]], Dict[str, int], Dict[str, bool]]]:
     """
     Return the office as a JSON document suitable for indexation in ElasticSearch.
     The `office` parameter can be an `Office` or an `OfficeAdminAdd` instance.
+    `scores_by_rome` may be given when already computed, see `get_scores_by_rome_for_offices`.
     """
     # The `headcount` field of an `OfficeAdminAdd` instance has a `code` attribute.
     if hasattr(office.headcount, 'code'):
@@ -238,6 +306,8 @@ def get_office_as_es_doc(
     else:
         headcount = office.headcount
 
+    office_result = get_office_result_fields(office, headcount)
+
     try:
         headcount = int(headcount)
     except (ValueError, TypeError):
@@ -265,6 +335,7 @@ def get_office_as_es_doc(
         'flag_senior': int(office.flag_senior),
         'flag_handicap': int(office.flag_handicap),
         'flag_pmsmp': int(office.flag_pmsmp),
+        es.OFFICE_RESULT_FIELD: office_result,
     }
 
     if office.y and office.x:
@@ -277,12 +348,50 @@ def get_office_as_es_doc(
             },
         ]
 
-    scores_by_rome, boosted_romes = get_scores_by_rome_and_boosted_romes(office)
+    if scores_by_rome is None:
+        scores_by_rome, boosted_romes = get_scores_by_rome_and_boosted_romes(office)
+    else:
+        boosted_romes = {}
+        st.increment_office_score_for_rome_count(len(scores_by_rome))
     if scores_by_rome:
         doc['scores_by_rome'] = scores_by_rome
         doc['boosted_romes'] = boosted_romes
 
-    return doc
+    return es.add_rome_codes(doc)
+
+
+def get_scores_by_rome_for_offices(offices: Sequence[OfficeMixin],
+                                   rome_scores_table: RomeScoresTable) -> List[Dict[str, int]]:
+    """
+    Vectorized equivalent of `get_scores_by_rome_and_boosted_romes` for offices without
+    admin updates: scores of all offices are computed at once.
+    """
+    scores_by_rome = rome_scores_table.get_scores_by_rome(
+        [office.naf for office in offices],
+        [office.hiring for office in offices],
+    )
+
+    if PSE_STUDY_IS_ENABLED:
+        sirets_to_remove_pse = load_siret_to_remove()
+        for index, office in enumerate(offices):
+            if office.siret in sirets_to_remove_pse:
+                # see get_scores_by_rome_and_boosted_romes
+                scores_by_rome[index] = {rome_code: 0 for rome_code in scores_by_rome[index]}
+
+    return scores_by_rome
+
+
+def get_office_result_fields(office: OfficeMixin, headcount: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Return the office columns needed to display it in search results, exactly as
+    stored in DB. They are indexed so that search results can be built without
+    querying the DB, see `settings.SEARCH_HYDRATE_FROM_ES`.
+    """
+    fields = OfficeResultRecord.get_fields(office)
+    # `OfficeAdminAdd` instances have a headcount choice and no extra geolocations.
+    fields['headcount'] = headcount if headcount is not None else office.headcount
+    fields['has_multi_geolocations'] = bool(fields['has_multi_geolocations'])
+    return fields
 
 
 def get_scores_by_rome_and_boosted_romes(
@@ -362,106 +471,340 @@ def get_scores_by_rome_and_boosted_romes(
     return scores_by_rome, boosted_romes
 
 
+IndexingShard = namedtuple('IndexingShard', ['departement', 'siret_min', 'siret_max', 'office_count'])
+
+
 def create_offices(disable_parallel_computing: bool = False) -> None:
     """
     Populate the `office` type in ElasticSearch.
-    Run it as a parallel computation based on departements.
+    Run it as a parallel computation based on departements, largest first.
     """
-    if Profiling.ACTIVATED:
-        func = profile_create_offices_for_departement
-    else:
-        func = create_offices_for_departement
+    start = time.time()
+    shards = get_indexing_shards()
+    logger.info("indexing offices in %s jobs (%s offices)", len(shards), sum(s.office_count for s in shards))
 
     if disable_parallel_computing:
-        for departement in dpt.DEPARTEMENTS:
-            func(departement)
+        timeline = [create_offices_for_shard(shard) for shard in shards]
     else:
         # Use parallel computing on all available CPU cores.
         # Use even slightly more than avaible CPUs because in practise a job does not always
         # use 100% of a cpu.
-        # maxtasksperchild default is infinite, which means memory is never freed up, and grows indefinitely :-/
-        # maxtasksperchild=1 ensures memory is freed up after every departement computation.
-        pool = mp.Pool(processes=int(1.25 * mp.cpu_count()), maxtasksperchild=1)
-        pool.map(func, dpt.DEPARTEMENTS)
-        pool.close()
-        pool.join()
+        timeline = run_indexing_workers(shards, process_count=int(1.25 * mp.cpu_count()))
 
+    log_indexing_timeline(timeline, start)
 
-@timeit
-def create_offices_for_departement(departement: str) -> None:
-    """
-    Populate the `office` type in ElasticSearch with offices having given departement.
-    """
-    actions = []
-
-    logger.info("STARTED indexing offices for departement=%s ...", departement)
 
+def get_indexable_offices_filter() -> 'sa.sql.ColumnElement':
     # For LBB we apply two thresholds to show an office:
     # 1) its global all-rome-included score should be at least SCORE_REDUCING_MINIMUM_THRESHOLD
     # 2) its score adapted to requested rome should be at least SCORE_FOR_ROME_MINIMUM
     # For LBA we only apply the second threshold (SCORE_ALTERNANCE_FOR_ROME_MINIMUM)
     # and no longer apply the all-rome-included score threshold, in order to include
     # more relevant smaller companies.
-    all_offices = db_session.query(Office).filter(
+    return Office.hiring >= scoring_util.get_hirings_from_score(settings.SCORE_REDUCING_MINIMUM_THRESHOLD)
+
+
+def get_office_counts_by_departement() -> Dict[str, int]:
+    rows = db_session.query(Office.departement, sa.func.count(Office.siret)).filter(
+        get_indexable_offices_filter()).group_by(Office.departement)
+    return dict(rows)
+
+
+def get_indexing_shards(shard_size: int = INDEXING_SHARD_SIZE) -> List[IndexingShard]:
+    """
+    Split the offices indexing in jobs of at most `shard_size` offices: one per departement,
+    or several siret ranges for the largest departements.
+    Jobs are sorted by decreasing size, so that the largest ones do not start last and
+    delay the end of the whole indexing.
+    """
+    office_counts = get_office_counts_by_departement()
+    shards: List[IndexingShard] = []
+    for departement in dpt.DEPARTEMENTS:
+        office_count = office_counts.get(departement, 0)
+        if office_count > shard_size:
+            shards.extend(split_departement(departement, office_count, shard_size))
+        else:
+            shards.append(IndexingShard(departement, None, None, office_count))
+    # Do not share the connection used here with the indexing processes.
+    db_session.remove()
+    return sorted(shards, key=lambda shard: shard.office_count, reverse=True)
+
+
+def split_departement(departement: str, office_count: int, shard_size: int) -> List[IndexingShard]:
+    """
+    Split the offices of a departement in consecutive siret ranges of `shard_size` offices.
+    """
+    sirets = db_session.query(Office.siret).filter(
         and_(
             Office.departement == departement,
-            Office.hiring >= scoring_util.get_hirings_from_score(settings.SCORE_REDUCING_MINIMUM_THRESHOLD),
-        )).all()
-    logger.info(f"[DPT{departement}] FOUND {len(all_offices)} offices! ")
-    for office in all_offices:
+            get_indexable_offices_filter(),
+        )).order_by(Office.siret).yield_per(OFFICES_YIELD_PER)
+    boundaries: List[Optional[str]] = [None]
+    boundaries.extend(siret for index, (siret,) in enumerate(sirets) if index and index % shard_size == 0)
+    boundaries.append(None)
+
+    shards = []
+    for index, (siret_min, siret_max) in enumerate(zip(boundaries[:-1], boundaries[1:])):
+        shard_office_count = min(shard_size, office_count - index * shard_size)
+        shards.append(IndexingShard(departement, siret_min, siret_max, shard_office_count))
+    return shards
+
+
+def create_offices_for_shard(shard: IndexingShard) -> Dict[str, Any]:
+    """
+    Index the offices of the given shard and return its entry in the indexing timeline.
+    """
+    if Profiling.ACTIVATED:
+        func = profile_create_offices_for_departement
+    else:
+        func = create_offices_for_departement
+
+    start = time.time()
+    stats = func(shard.departement, shard.siret_min, shard.siret_max)
+    return {
+        'departement': shard.departement,
+        'siret_min': shard.siret_min,
+        'siret_max': shard.siret_max,
+        'pid': os.getpid(),
+        'start': start,
+        'end': time.time(),
+        'office_count': stats.action_count,
+        'byte_count': stats.byte_count,
+    }
+
+
+def run_indexing_workers(shards: List[IndexingShard],
+                         process_count: int,
+                         max_rss: int = INDEXING_WORKER_MAX_RSS) -> List[Dict[str, Any]]:
+    """
+    Index the given shards with `process_count` worker processes.
+
+    Workers pick the next shard from a shared queue as soon as they are done with the
+    previous one, so that no worker idles while shards remain. A worker is reused for
+    several shards, unless its peak memory exceeds `max_rss` bytes: it then exits after
+    its current shard and is replaced by a new process.
+
+    Return the indexing timeline, i.e. one entry per shard.
+    """
+    tasks: 'mp.Queue[Optional[IndexingShard]]' = mp.Queue()
+    for shard in shards:
+        tasks.put(shard)
+    results: 'mp.Queue[Tuple[str, int, Any]]' = mp.Queue()
+
+    def start_worker() -> mp.Process:
+        worker = mp.Process(target=indexing_worker, args=(tasks, results, max_rss))
+        worker.start()
+        return worker
+
+    workers = {}
+    for _ in range(min(process_count, len(shards))):
+        worker = start_worker()
+        workers[worker.pid] = worker
+
+    timeline: List[Dict[str, Any]] = []
+    try:
+        while len(timeline) < len(shards):
+            try:
+                message, pid, payload = results.get(timeout=10)
+            except queue.Empty:
+                for worker in workers.values():
+                    if worker.exitcode:
+                        raise RuntimeError(f"indexing process {worker.pid} died with exit code {worker.exitcode}")
+                continue
+
+            if message == INDEXING_WORKER_DONE:
+                timeline.append(payload)
+                logger.info(
+                    "COMPLETED indexing job %s of %s (departement=%s, %s offices)",
+                    len(timeline),
+                    len(shards),
+                    payload['departement'],
+                    payload['office_count'],
+                )
+            elif message == INDEXING_WORKER_FAILED:
+                raise RuntimeError(f"indexing of {payload} failed in process {pid}")
+            elif message == INDEXING_WORKER_RECYCLED:
+                logger.info("recycling indexing process %s, its memory exceeds %s bytes", pid, max_rss)
+                workers.pop(pid).join()
+                # Remaining shards are either running or queued, in which case a worker is needed.
+                if len(shards) - len(timeline) > len(workers):
+                    worker = start_worker()
+                    workers[worker.pid] = worker
+    except BaseException:
+        for worker in workers.values():
+            worker.terminate()
+        raise
+
+    for _ in workers:
+        tasks.put(None)
+    for worker in workers.values():
+        worker.join()
+
+    return timeline
+
+
+def indexing_worker(tasks: 'mp.Queue[Optional[IndexingShard]]', results: 'mp.Queue[Tuple[str, int, Any]]',
+                    max_rss: int) -> None:
+    """
+    Index shards from the `tasks` queue until it yields None, or until this process has used
+    more than `max_rss` bytes of memory.
+    """
+    # DB connections inherited from the parent process must not be used here.
+    engine.dispose(close=False)
+    pid = os.getpid()
+
+    while True:
+        shard = tasks.get()
+        if shard is None:
+            return
+        try:
+            results.put((INDEXING_WORKER_DONE, pid, create_offices_for_shard(shard)))
+        except Exception:
+            logger.exception("indexing of %s failed", shard)
+            results.put((INDEXING_WORKER_FAILED, pid, shard))
+            return
+        if get_max_rss() > max_rss:
+            results.put((INDEXING_WORKER_RECYCLED, pid, None))
+            return
+
+
+def get_max_rss() -> int:
+    """
+    Peak memory of the current process, in bytes (`ru_maxrss` is in kilobytes on Linux).
+    """
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def log_indexing_timeline(timeline: List[Dict[str, Any]], start: float) -> None:
+    end = time.time()
+    for entry in sorted(timeline, key=lambda entry: (entry['pid'], entry['start'])):
+        logger.info(
+            "[timeline] pid=%s departement=%s sirets=[%s, %s) start=+%.1fs duration=%.1fs offices=%s",
+            entry['pid'],
+            entry['departement'],
+            entry['siret_min'] or '',
+            entry['siret_max'] or '',
+            entry['start'] - start,
+            entry['end'] - entry['start'],
+            entry['office_count'],
+        )
+    logger.info(
+        "indexed %s offices in %s jobs in %.1fs",
+        sum(entry['office_count'] for entry in timeline),
+        len(timeline),
+        end - start,
+    )
+
+
+@timeit
+def create_offices_for_departement(departement: str,
+                                   siret_min: Optional[str] = None,
+                                   siret_max: Optional[str] = None) -> BulkStats:
+    """
+    Populate the `office` type in ElasticSearch with offices having given departement,
+    optionally restricted to sirets in [siret_min, siret_max).
+    """
+    job = departement
+    if siret_min or siret_max:
+        job = f"{departement} sirets=[{siret_min or ''}, {siret_max or ''})"
+    logger.info("STARTED indexing offices for departement=%s ...", job)
+
+    # Processes index several jobs: performance stats are those of the current job.
+    st.reset()
+    cache_infos = get_cache_infos()
+    stats = stream_bulk_actions(get_office_actions(departement, siret_min, siret_max))
+
+    duration = max(stats.duration, 0.001)
+    logger.info(
+        "COMPLETED indexing offices for departement=%s: %s offices (%.1f MB) in %.1fs, %.0f docs/s, %.1f MB/s",
+        job,
+        stats.action_count,
+        stats.byte_count / 1e6,
+        stats.duration,
+        stats.action_count / duration,
+        stats.byte_count / 1e6 / duration,
+    )
+
+    display_performance_stats(departement, cache_infos)
+    return stats
+
+
+def get_office_actions(departement: str,
+                       siret_min: Optional[str] = None,
+                       siret_max: Optional[str] = None) -> Generator[Dict[str, Any], None, None]:
+    """
+    Generate the ES actions indexing the offices of the given departement, optionally
+    restricted to sirets in [siret_min, siret_max).
+    Offices are streamed from the DB instead of being loaded all at once.
+    """
+    filters = [Office.departement == departement, get_indexable_offices_filter()]
+    if siret_min:
+        filters.append(Office.siret >= siret_min)
+    if siret_max:
+        filters.append(Office.siret < siret_max)
+    offices = iter(db_session.query(Office).filter(and_(*filters)).yield_per(OFFICES_YIELD_PER))
+    rome_scores_table = RomeScoresTable()
+
+    office_count = 0
+    while True:
+        batch = list(itertools.islice(offices, OFFICES_YIELD_PER))
+        if not batch:
+            break
+        office_count += len(batch)
+        yield from get_office_actions_for_batch(batch, rome_scores_table)
+
+    logger.info("[DPT%s] FOUND %s offices!", departement, office_count)
+
+
+def get_office_actions_for_batch(batch: Sequence[OfficeMixin], rome_scores_table: RomeScoresTable,
+                                 index: Optional[str] = None) -> Generator[Dict[str, Any], None, None]:
+    """
+    Generate the ES actions indexing a batch of offices in `index` (defaults to `settings.ES_INDEX`).
+    Offices without any score are left out.
+    """
+    for office, scores_by_rome in zip(batch, get_scores_by_rome_for_offices(batch, rome_scores_table)):
         st.increment_office_count()
 
-        es_doc = get_office_as_es_doc(office)
+        es_doc = get_office_as_es_doc(office, scores_by_rome)
 
         office_is_reachable = ('scores_by_rome' in es_doc) or ('scores_alternance_by_rome' in es_doc)
 
         if office_is_reachable:
             st.increment_indexed_office_count()
-            actions.append({
+            yield {
                 '_op_type': 'index',
-                '_index': settings.ES_INDEX,
+                '_index': index or settings.ES_INDEX,
                 '_type': es.OFFICE_TYPE,
                 '_id': office.siret,
                 '_source': es_doc,
-            })
-
-    bulk_actions(actions)
-
-    completed_jobs_counter.increment()
-
-    logger.info(
-        "COMPLETED indexing offices for departement=%s (%s of %s jobs completed)",
-        departement,
-        completed_jobs_counter.value,
-        len(dpt.DEPARTEMENTS),
-    )
-
-    display_performance_stats(departement)
+                **es.routing_params(es.get_office_doc_routing(es_doc), '_routing'),
+            }
 
 
-def profile_create_offices_for_departement(departement: str) -> None:
+def profile_create_offices_for_departement(departement: str,
+                                           siret_min: Optional[str] = None,
+                                           siret_max: Optional[str] = None) -> BulkStats:
     """
     Run create_offices_for_departement with profiling.
     """
     profiler: Profile = Profile()
-    command = "create_offices_for_departement('%s')" % departement
-    profiler.runctx(command, locals(), globals())
-    relative_filename = 'profiling_results/create_index_dpt%s.kgrind' % departement
+    stats = profiler.runcall(create_offices_for_departement, departement, siret_min, siret_max)
+    shard_suffix = f'_{siret_min}' if siret_min else ''
+    relative_filename = f'profiling_results/create_index_dpt{departement}{shard_suffix}.kgrind'
     filename = os.path.join(os.path.dirname(os.path.realpath(__file__)), relative_filename)
     convert(profiler.getstats(), filename)  # type: ignore
+    return stats
 
 
-def add_individual_inexistant_office(office_to_add: OfficeAdminAdd) -> None:
+def get_office_from_admin_add(office_to_add: OfficeAdminAdd) -> Office:
     """
-    Add office in ElasticSearch and MySQL DB. Do not call this function
-    directly, use add_individual_office() instead.
+    Return a new `Office` (not yet added to the DB session) holding the values of `office_to_add`.
     """
     # The `headcount` field of an `OfficeAdminAdd` instance has a `code` attribute.
     if hasattr(office_to_add.headcount, 'code'):
         headcount = office_to_add.headcount.code  # type: ignore
     else:
         headcount = office_to_add.headcount
-    # Create the new office in DB.
     new_office = Office()
     # Use `inspect` because `Office` columns are named distinctly from attributes.
     for field_name in list(inspect(Office).columns.keys()):
@@ -473,12 +816,22 @@ def add_individual_inexistant_office(office_to_add: OfficeAdminAdd) -> None:
         if field_name == 'headcount':
             value = headcount
         setattr(new_office, field_name, value)
-    db_session.add(new_office)
+    return new_office
+
+
+def add_individual_inexistant_office(office_to_add: OfficeAdminAdd) -> None:
+    """
+    Add office in ElasticSearch and MySQL DB. Do not call this function
+    directly, use add_individual_office() instead.
+    """
+    # Create the new office in DB.
+    db_session.add(get_office_from_admin_add(office_to_add))
     db_session.commit()
 
     # Create the new office in ES.
     doc = get_office_as_es_doc(office_to_add)
-    es.Elasticsearch().create(index=settings.ES_INDEX, doc_type=es.OFFICE_TYPE, id=office_to_add.siret, body=doc)
+    es.Elasticsearch().create(index=settings.ES_INDEX, doc_type=es.OFFICE_TYPE, id=office_to_add.siret, body=doc,
+                              **es.routing_params(es.get_office_doc_routing(doc)))
 
 
 def add_individual_office(office_to_add: OfficeAdminAdd) -> None:
@@ -506,14 +859,16 @@ def add_offices() -> None:
 
 
 def remove_individual_office(siret: str) -> None:
-    # Apply changes in ElasticSearch.
+    office = Office.query.filter_by(siret=siret).first()
+    # Apply changes in ElasticSearch: the document is routed by the office columns it was indexed from.
+    routing = es.get_office_routing(office.departement, office.has_multi_geolocations) if office else None
     try:
-        es.Elasticsearch().delete(index=settings.ES_INDEX, doc_type=es.OFFICE_TYPE, id=siret)
+        es.Elasticsearch().delete(index=settings.ES_INDEX, doc_type=es.OFFICE_TYPE, id=siret,
+                                  **es.routing_params(routing))
     except TransportError as e:
         if e.status_code != 404:
             raise
     # Apply changes in DB.
-    office = Office.query.filter_by(siret=siret).first()
     if office:
         office.delete()
         # Delete the current PDF.
@@ -560,111 +915,174 @@ def to_iterator(
         firstid = key.__get__(rec, key) if rec else None
 
 
+def apply_office_update(office: Office, office_to_update: Union[OfficeAdminUpdate, OfficeThirdPartyUpdate]) -> bool:
+    """
+    Apply the changes of `office_to_update` to the `office` columns, without saving them.
+    Return True if any column changed.
+    """
+    is_updated = False
+    # , "email", "tel", "website"
+    if office_to_update.new_company_name and office.company_name != office_to_update.new_company_name:
+        office.company_name = office_to_update.new_company_name
+        is_updated = True
+    if office_to_update.new_office_name and office.office_name != office_to_update.new_office_name:
+        office.office_name = office_to_update.new_office_name
+        is_updated = True
+    offices_attributes = [
+        "email_alternance", "phone_alternance", "website_alternance", "hiring", "score_alternance",
+        "social_network", "contact_mode"
+    ]
+    update_attributes = [
+        "email_alternance", "phone_alternance", "website_alternance", "hiring", "score_alternance",
+        "social_network", "contact_mode"
+    ]
+    for office_attr, update_attr in list(zip(offices_attributes, update_attributes)):
+        if getattr(office, office_attr) != getattr(office_to_update, update_attr) and getattr(
+                office_to_update, update_attr) is not None:
+            setattr(office, office_attr, getattr(office_to_update, update_attr))
+            is_updated = True
+
+    if office_to_update.remove_phone:
+        if office.tel != '':
+            office.tel = ''
+            is_updated = True
+    else:
+        if office.tel != office_to_update.new_phone:
+            office.tel = office_to_update.new_phone
+            is_updated = True
+
+    for attr in ["email", "website"]:
+        if getattr(office_to_update, f"remove_{attr}"):
+            if getattr(office, attr) != '':
+                setattr(office, attr, '')
+                is_updated = True
+        else:
+            if getattr(office, attr) != getattr(office_to_update, f"new_{attr}"):
+                setattr(office, attr, getattr(office_to_update, f"new_{attr}"))
+                is_updated = True
+
+    return is_updated
+
+
+UPDATE_CHUNK_SIZE = 500
+
+
+def get_indexed_office_docs(offices: Iterable[Office]) -> Dict[str, Dict[str, Any]]:
+    """
+    Return the documents currently indexed for the given offices of the DB, as given by `mget`
+    (with their `_source` and `_version`), by siret. Offices without document are left out.
+
+    `mget` is real-time: documents indexed since the latest refresh are found too. Documents are
+    routed by the columns they were indexed from (see `es.get_office_routing`), which must thus
+    not have been modified yet.
+    """
+    docs = {}
+    for offices_chunk in chunks(list(offices), UPDATE_CHUNK_SIZE):
+        body = {'docs': [{
+            '_id': office.siret,
+            **es.routing_params(es.get_office_routing(office.departement, office.has_multi_geolocations), '_routing'),
+        } for office in offices_chunk]}
+        res = es.Elasticsearch().mget(index=settings.ES_INDEX, doc_type=es.OFFICE_TYPE, body=body)
+        for doc in res['docs']:
+            if doc.get('found'):
+                docs[doc['_id']] = doc
+    return docs
+
+
+def bulk_actions_ignoring_missing_docs(actions: List[Dict[str, Any]]) -> List[str]:
+    """
+    Send actions to ES and return the ids of the documents which were missing (404), or which
+    changed since the `_version` given in their action (409), instead of failing.
+    Any other failure raises a `BulkIndexError`.
+    """
+    if not actions:
+        return []
+    _, errors = bulk(es.Elasticsearch(), actions, chunk_size=ES_BULK_CHUNK_SIZE, raise_on_error=False)
+    missing_ids = []
+    failed_items = []
+    for error in errors:
+        item = list(error.values())[0]
+        if item.get('status') in (404, 409):
+            missing_ids.append(item['_id'])
+        else:
+            failed_items.append(error)
+    if failed_items:
+        raise BulkIndexError(f"{len(failed_items)} document(s) failed to update.", failed_items)
+    return missing_ids
+
+
 def update_offices_by_sirets(sirets: list, office_to_update: Union[Type[OfficeAdminUpdate],
                                                                    Type[OfficeThirdPartyUpdate]]) -> None:
     """
     Update offices after office admin update
     (overload the data provided by the importer).
     """
+    update_offices_in_bulk([(siret, office_to_update) for siret in sirets])  # type: ignore
 
-    for siret in sirets:
 
-        office: Office = Office.query.filter_by(siret=siret).first()
-
-        if office:
-            is_updated = False
+def update_offices_in_bulk(updates: List[Tuple[str, Union[OfficeAdminUpdate, OfficeThirdPartyUpdate]]]) -> None:
+    """
+    Apply `(siret, office_to_update)` updates in their order, by chunks of `UPDATE_CHUNK_SIZE`: each
+    chunk takes one DB query, one `mget`, one bulk request and one DB commit.
+    """
+    for updates_chunk in chunks(updates, UPDATE_CHUNK_SIZE):
+        sirets = sorted({siret for siret, _ in updates_chunk})
+        offices = {office.siret: office for office in Office.query.filter(Office.siret.in_(sirets))}
+        indexed_docs = get_indexed_office_docs(offices.values())
+
+        updated_sirets = []
+        for siret, office_to_update in updates_chunk:
+            office = offices.get(siret)
             # Apply changes in DB.
-            # , "email", "tel", "website"
-            if office_to_update.new_company_name and office.company_name != office_to_update.new_company_name:
-                office.company_name = office_to_update.new_company_name
-                is_updated = True
-            if office_to_update.new_office_name and office.office_name != office_to_update.new_office_name:
-                office.office_name = office_to_update.new_office_name
-                is_updated = True
-            offices_attributes = [
-                "email_alternance", "phone_alternance", "website_alternance", "hiring", "score_alternance",
-                "social_network", "contact_mode"
-            ]
-            update_attributes = [
-                "email_alternance", "phone_alternance", "website_alternance", "hiring", "score_alternance",
-                "social_network", "contact_mode"
-            ]
-            for office_attr, update_attr in list(zip(offices_attributes, update_attributes)):
-                if getattr(office, office_attr) != getattr(office_to_update, update_attr) and getattr(
-                        office_to_update, update_attr) is not None:
-                    setattr(office, office_attr, getattr(office_to_update, update_attr))
-                    is_updated = True
-
-            if office_to_update.remove_phone:
-                if office.tel != '':
-                    office.tel = ''
-                    is_updated = True
-            else:
-                if office.tel != office_to_update.new_phone:
-                    office.tel = office_to_update.new_phone
-                    is_updated = True
-
-            for attr in ["email", "website"]:
-                if getattr(office_to_update, f"remove_{attr}"):
-                    if getattr(office, attr) != '':
-                        setattr(office, attr, '')
-                        is_updated = True
-                else:
-                    if getattr(office, attr) != getattr(office_to_update, f"new_{attr}"):
-                        setattr(office, attr, getattr(office_to_update, f"new_{attr}"))
-                        is_updated = True
-
-            if is_updated:
-                office.save()
-
-                # Apply changes in ElasticSearch.
-                body = {
-                    'doc': {
-                        'email': office.email,
-                        'phone': office.tel,
-                        'website': office.website,
-                        "score": office.score,
-                        'flag_alternance': 1 if office.flag_alternance else 0
-                    }
-                }
-
-                scores_by_rome, boosted_romes = get_scores_by_rome_and_boosted_romes(office, office_to_update)
-                if scores_by_rome:
-                    body['doc']['scores_by_rome'] = scores_by_rome
-                    body['doc']['boosted_romes'] = boosted_romes
-
-                # The update API makes partial updates: existing `scalar` fields are overwritten,
-                # but `objects` fields are merged together.
-                # https://www.elastic.co/guide/en/elasticsearch/guide/1.x/partial-updates.html
-                # However `scores_by_rome` and `boosted_romes` need to be overwritten because they
-                # may change over time.
-                # To do this, we perform 2 requests: the first one resets `scores_by_rome` and
-                # `boosted_romes` and the second one populates them.
-                delete_body = {
-                    'doc': {
-                        'scores_by_rome': None,
-                        'boosted_romes': None,
-                        'scores_alternance_by_rome': None,
-                        'boosted_alternance_romes': None
-                    }
-                }
-
-                # Unfortunately these cannot easily be bulked :-(
-                # The reason is there is no way to tell bulk to ignore missing documents (404)
-                # for a partial update. Tried it and failed it on Oct 2017 @vermeer.
-                es.Elasticsearch().update(index=settings.ES_INDEX,
-                                          doc_type=es.OFFICE_TYPE,
-                                          id=siret,
-                                          body=delete_body,
-                                          params={'ignore': 404})
-                es.Elasticsearch().update(index=settings.ES_INDEX,
-                                          doc_type=es.OFFICE_TYPE,
-                                          id=siret,
-                                          body=body,
-                                          params={'ignore': 404})
-
-                # Delete the current PDF thus it will be regenerated at the next download attempt.
-                pdf_util.delete_file(office)
+            if not office or not apply_office_update(office, office_to_update):
+                continue
+            if siret not in updated_sirets:
+                updated_sirets.append(siret)
+            if siret not in indexed_docs:
+                continue
+
+            # Apply changes to the indexed document.
+            doc = indexed_docs[siret]['_source']
+            doc.update({
+                'email': office.email,
+                'phone': office.tel,
+                'website': office.website,
+                "score": office.score,
+                'flag_alternance': 1 if office.flag_alternance else 0,
+                es.OFFICE_RESULT_FIELD: get_office_result_fields(office),
+            })
+            # `scores_by_rome` and `boosted_romes` are replaced as a whole, because they may change over time.
+            for field in ['scores_by_rome', 'boosted_romes', 'scores_alternance_by_rome', 'boosted_alternance_romes',
+                          *es.ROME_CODES_FIELDS.values()]:
+                doc.pop(field, None)
+            scores_by_rome, boosted_romes = get_scores_by_rome_and_boosted_romes(office, office_to_update)
+            if scores_by_rome:
+                doc['scores_by_rome'] = scores_by_rome
+                doc['boosted_romes'] = boosted_romes
+            es.add_rome_codes(doc)
+
+        db_session.commit()
+
+        # Documents are replaced as a whole, which partial updates cannot do for `scores_by_rome`. Their
+        # `_version` guarantees that documents deleted or changed since they were read are not overwritten.
+        # Updates change neither the departement nor the extra geolocations of offices, thus their routing.
+        actions = [{
+            '_op_type': 'index',
+            '_index': settings.ES_INDEX,
+            '_type': es.OFFICE_TYPE,
+            '_id': siret,
+            '_version': indexed_docs[siret]['_version'],
+            '_source': indexed_docs[siret]['_source'],
+            **es.routing_params(es.get_office_doc_routing(indexed_docs[siret]['_source']), '_routing'),
+        } for siret in updated_sirets if siret in indexed_docs]
+        missing_sirets = bulk_actions_ignoring_missing_docs(actions)
+        if missing_sirets:
+            logger.warning("%s offices were removed or changed while being updated: %s", len(missing_sirets),
+                           ', '.join(missing_sirets))
+
+        for siret in updated_sirets:
+            # Delete the current PDF thus it will be regenerated at the next download attempt.
+            pdf_util.delete_file(offices[siret])
 
 
 @timeit
@@ -677,8 +1095,12 @@ def update_offices(table: Union[Type[OfficeAdminUpdate], Type[OfficeThirdPartyUp
     # on a SIRET. As a result, it shouldn't but there may be `n` entries in `table`
     # for the same SIRET. We order the query by creation date ASC so that the most recent changes take
     # priority over any older ones.
+    updates = []
     for office_to_update in to_iterator(db_session.query(table), table.id):  # type: ignore
-        update_offices_by_sirets(table.as_list(office_to_update.sirets), office_to_update)
+        # Rows are only read: detach them so that DB commits do not expire them.
+        db_session.expunge(office_to_update)
+        updates.extend((siret, office_to_update) for siret in table.as_list(office_to_update.sirets))
+    update_offices_in_bulk(updates)
 
 
 @timeit
@@ -687,9 +1109,17 @@ def update_offices_geolocations() -> None:
     Remove or add extra geolocations to offices.
     New geolocations are entered into the system through the `OfficeAdminExtraGeoLocation` table.
     """
-    for extra_geolocation in db_session.query(OfficeAdminExtraGeoLocation).all():
-        office = Office.query.filter_by(siret=extra_geolocation.siret).first()
-        if office:
+    extra_geolocations = db_session.query(OfficeAdminExtraGeoLocation).all()
+    for extra_geolocations_chunk in chunks(extra_geolocations, UPDATE_CHUNK_SIZE):
+        sirets = [extra_geolocation.siret for extra_geolocation in extra_geolocations_chunk]
+        offices = {office.siret: office for office in Office.query.filter(Office.siret.in_(sirets))}
+        # Extra geolocations change the routing of offices routed by departement, see `es.get_office_routing`.
+        indexed_docs = get_indexed_office_docs(offices.values()) if settings.ES_OFFICES_ROUTED_BY_DEPARTEMENT else None
+        actions = []
+        for extra_geolocation in extra_geolocations_chunk:
+            office = offices.get(extra_geolocation.siret)
+            if not office:
+                continue
             locations = []
             if office.y and office.x:
                 locations.append({'lat': office.y, 'lon': office.x})
@@ -698,17 +1128,240 @@ def update_offices_geolocations() -> None:
                 office.has_multi_geolocations = True
             else:
                 office.has_multi_geolocations = False
-            # Apply changes in DB.
-            office.save()
-            # Apply changes in ElasticSearch.
-            body = {'doc': {'locations': locations}}
-            es.Elasticsearch().update(
-                index=settings.ES_INDEX,
-                doc_type=es.OFFICE_TYPE,
-                id=office.siret,
-                body=body,
-                params={'ignore': 404},
-            )
+            routing = None
+            if indexed_docs is not None:
+                if office.siret not in indexed_docs:
+                    continue
+                doc = indexed_docs[office.siret]['_source']
+                routing = es.get_office_doc_routing(doc)
+                new_routing = es.get_office_routing(doc['department'], office.has_multi_geolocations)
+                if new_routing != routing:
+                    # The document moves to another shard: it is deleted and indexed again as a whole.
+                    doc['locations'] = locations
+                    doc[es.OFFICE_RESULT_FIELD]['has_multi_geolocations'] = office.has_multi_geolocations
+                    actions.extend([{
+                        '_op_type': 'delete',
+                        '_index': settings.ES_INDEX,
+                        '_type': es.OFFICE_TYPE,
+                        '_id': office.siret,
+                        '_routing': routing,
+                    }, {
+                        '_op_type': 'index',
+                        '_index': settings.ES_INDEX,
+                        '_type': es.OFFICE_TYPE,
+                        '_id': office.siret,
+                        '_source': doc,
+                        '_routing': new_routing,
+                    }])
+                    continue
+            # Partial updates replace `locations` and merge `office_result`.
+            actions.append({
+                '_op_type': 'update',
+                '_index': settings.ES_INDEX,
+                '_type': es.OFFICE_TYPE,
+                '_id': office.siret,
+                'doc': {
+                    'locations': locations,
+                    es.OFFICE_RESULT_FIELD: {
+                        'has_multi_geolocations': office.has_multi_geolocations
+                    },
+                },
+                **es.routing_params(routing, '_routing'),
+            })
+        # Apply changes in DB.
+        db_session.commit()
+        # Apply changes in ElasticSearch: offices which are not indexed are skipped.
+        bulk_actions_ignoring_missing_docs(actions)
+
+
+# Admin tables whose changes are applied by `update_offices_delta`, in the order `update_data` applies them.
+# `OfficeAdminExtraGeoLocation` is left out, as `update_data` does not apply extra geolocations either.
+DELTA_TABLES: List[Type[Union[OfficeAdminAdd, OfficeAdminRemove, OfficeAdminUpdate, OfficeThirdPartyUpdate]]] = [
+    OfficeAdminAdd, OfficeAdminRemove, OfficeAdminUpdate, OfficeThirdPartyUpdate
+]
+DELTA_CHUNK_SIZE = 1000
+
+
+def get_high_water_marks() -> Dict[str, datetime.datetime]:
+    """
+    Return the most recent `date_created` or `date_updated` of each admin table, by table name.
+    Empty tables are left out.
+    """
+    high_water_marks = {}
+    for table in DELTA_TABLES:
+        dates = db_session.query(sa.func.max(table.date_created), sa.func.max(table.date_updated)).one()
+        dates = [date for date in dates if date is not None]
+        if dates:
+            high_water_marks[table.__tablename__] = max(dates)
+    return high_water_marks
+
+
+def load_high_water_marks() -> Dict[str, datetime.datetime]:
+    """
+    Return the high-water marks saved by the latest update of the offices index, by table name.
+    """
+    return {mark.table_name: mark.high_water_mark for mark in db_session.query(IndexHighWaterMark)}
+
+
+def save_high_water_marks(high_water_marks: Dict[str, datetime.datetime]) -> None:
+    for table_name, high_water_mark in high_water_marks.items():
+        mark = db_session.query(IndexHighWaterMark).filter_by(table_name=table_name).first()
+        if not mark:
+            mark = IndexHighWaterMark(table_name=table_name)
+            db_session.add(mark)
+        mark.high_water_mark = high_water_mark
+        mark.date_updated = datetime.datetime.utcnow()
+    db_session.commit()
+
+
+def get_changed_sirets(table: Type[Union[OfficeAdminAdd, OfficeAdminRemove, OfficeAdminUpdate,
+                                         OfficeThirdPartyUpdate]],
+                       since: Optional[datetime.datetime]) -> Set[str]:
+    """
+    Return the sirets of the rows of `table` created or updated since the given date, or of
+    all its rows if `since` is None.
+    Rows updated at exactly `since` are included: applying them twice is harmless, see
+    `get_office_delta_actions`, while missing them is not.
+    """
+    query = db_session.query(table)
+    if since is not None:
+        query = query.filter(sa.or_(table.date_created >= since, table.date_updated >= since))
+    sirets: Set[str] = set()
+    for row in query:
+        if isinstance(row, OfficeUpdateMixin):
+            sirets.update(row.as_list(row.sirets))
+        else:
+            sirets.add(row.siret)
+    return sirets
+
+
+def get_es_doc_hash(doc: Dict[str, Any]) -> str:
+    """
+    Return a hash of the content of an office document, independent of its keys order.
+    """
+    return hashlib.sha1(json.dumps(doc, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def get_office_delta_docs(sirets: Iterable[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+    """
+    Apply the admin changes of the given sirets to the offices in DB, and return the office
+    documents they should have in ES, by siret: admin changes are applied as `update_data` does.
+    Offices which should not be indexed map to None.
+    DB changes are committed once per chunk of sirets.
+    """
+    sirets_to_remove = {siret for (siret,) in db_session.query(OfficeAdminRemove.siret)}
+    offices_to_add = {office_to_add.siret: office_to_add for office_to_add in db_session.query(OfficeAdminAdd)}
+    # Update rows of each siret, in the order `update_data` applies them.
+    offices_to_update: Dict[str, List[Union[OfficeAdminUpdate, OfficeThirdPartyUpdate]]] = {}
+    for table in [OfficeAdminUpdate, OfficeThirdPartyUpdate]:
+        for office_to_update in db_session.query(table).order_by(table.id):
+            for siret in table.as_list(office_to_update.sirets):
+                offices_to_update.setdefault(siret, []).append(office_to_update)
+
+    docs: Dict[str, Optional[Dict[str, Any]]] = {}
+    for sirets_chunk in chunks(sorted(sirets), DELTA_CHUNK_SIZE):
+        offices = {office.siret: office for office in Office.query.filter(Office.siret.in_(sirets_chunk))}
+        for siret in sirets_chunk:
+            office = offices.get(siret)
+            if siret in sirets_to_remove:
+                if office:
+                    office.delete(commit=False)
+                    pdf_util.delete_file(office)
+                docs[siret] = None
+                continue
+
+            # Offices added by admins are indexed as given, as in `add_individual_inexistant_office`.
+            office_to_index: OfficeMixin = office
+            if not office:
+                if siret not in offices_to_add:
+                    docs[siret] = None
+                    continue
+                office = get_office_from_admin_add(offices_to_add[siret])
+                db_session.add(office)
+                office_to_index = offices_to_add[siret]
+
+            if siret in offices_to_update:
+                for office_to_update in offices_to_update[siret]:
+                    apply_office_update(office, office_to_update)
+                # As in `update_offices_by_sirets`, the most recent update row gives the scores.
+                scores_by_rome, boosted_romes = get_scores_by_rome_and_boosted_romes(office, office_to_update)
+                doc = get_office_as_es_doc(office, scores_by_rome)
+                if scores_by_rome:
+                    doc['boosted_romes'] = boosted_romes
+            else:
+                doc = get_office_as_es_doc(office_to_index)
+
+            office_is_reachable = ('scores_by_rome' in doc) or ('scores_alternance_by_rome' in doc)
+            docs[siret] = doc if office_is_reachable else None
+        db_session.commit()
+    return docs
+
+
+def get_office_delta_actions(sirets: Set[str]) -> List[Dict[str, Any]]:
+    """
+    Return the bulk actions which bring the documents of the given sirets up to date: documents
+    whose content hash did not change are left untouched.
+    """
+    # Documents are read before `get_office_delta_docs` changes the offices they are routed by.
+    indexed_docs: Dict[str, Dict[str, Any]] = {}
+    for sirets_chunk in chunks(sorted(sirets), DELTA_CHUNK_SIZE):
+        indexed_docs.update(get_indexed_office_docs(Office.query.filter(Office.siret.in_(sirets_chunk))))
+    actions = []
+    for siret, doc in get_office_delta_docs(sirets).items():
+        indexed_doc = indexed_docs[siret]['_source'] if siret in indexed_docs else None
+        indexed_routing = es.get_office_doc_routing(indexed_doc) if indexed_doc is not None else None
+        routing = es.get_office_doc_routing(doc) if doc is not None else None
+        # Documents whose routing changed are deleted from their former shard.
+        if indexed_doc is not None and (doc is None or routing != indexed_routing):
+            actions.append({
+                '_op_type': 'delete',
+                '_index': settings.ES_INDEX,
+                '_type': es.OFFICE_TYPE,
+                '_id': siret,
+                **es.routing_params(indexed_routing, '_routing'),
+            })
+        if doc is None:
+            continue
+        if indexed_doc is None or routing != indexed_routing or get_es_doc_hash(doc) != get_es_doc_hash(indexed_doc):
+            actions.append({
+                '_op_type': 'index',
+                '_index': settings.ES_INDEX,
+                '_type': es.OFFICE_TYPE,
+                '_id': siret,
+                '_source': doc,
+                **es.routing_params(routing, '_routing'),
+            })
+    return actions
+
+
+@timeit
+def update_offices_delta() -> None:
+    """
+    Apply to the live offices index the admin changes made since the latest update, instead of
+    replaying all of them: only the offices of the sirets of admin rows created or updated since
+    the saved high-water marks are recomputed.
+
+    Deleted admin rows, and sirets removed from the `sirets` of an update row, are not noticed:
+    they are taken into account by the next full run.
+    """
+    # Read the new high-water marks first, so that rows changed while we run are picked by the next run.
+    high_water_marks = get_high_water_marks()
+    saved_high_water_marks = load_high_water_marks()
+
+    sirets: Set[str] = set()
+    for table in DELTA_TABLES:
+        changed_sirets = get_changed_sirets(table, saved_high_water_marks.get(table.__tablename__))
+        logger.info("[delta] %s sirets changed in %s", len(changed_sirets), table.__tablename__)
+        sirets.update(changed_sirets)
+
+    actions = get_office_delta_actions(sirets)
+    logger.info("[delta] %s documents to update out of %s changed sirets", len(actions), len(sirets))
+    if actions:
+        bulk_actions(actions)
+        # Cached search results may hold outdated offices
+        search_cache.clear()
+
+    save_high_water_marks(high_water_marks)
 
 
 def get_latest_scam_emails() -> List[str]:
@@ -732,26 +1385,49 @@ def get_latest_scam_emails() -> List[str]:
 @timeit
 def remove_scam_emails() -> None:
     scam_emails = get_latest_scam_emails()
+    removed_count = 0
     for scam_emails_chunk in chunks(scam_emails, 100):
         query = Office.query.filter(Office.email.in_(scam_emails_chunk))
-        office_count = query.count()
-        if office_count:
+        offices = query.all()
+        if offices:
             history = []
-            for office in query.all():
+            for office in offices:
                 history.append(HistoryBlacklist(email=office.email, datetime_removal=datetime.datetime.now()))
             db_session.add_all(history)
             query.update({Office.email: ''}, synchronize_session="fetch")
             db_session.commit()
+
+            # Emails are also displayed from the indexed documents, see `settings.SEARCH_HYDRATE_FROM_ES`.
+            # Partial updates merge `office_result`. Offices which are not indexed are skipped.
+            actions = [{
+                '_op_type': 'update',
+                '_index': settings.ES_INDEX,
+                '_type': es.OFFICE_TYPE,
+                '_id': office.siret,
+                'doc': {
+                    'email': '',
+                    es.OFFICE_RESULT_FIELD: {
+                        'email': '',
+                    },
+                },
+                **es.routing_params(es.get_office_routing(office.departement, office.has_multi_geolocations),
+                                    '_routing'),
+            } for office in offices]
+            bulk_actions_ignoring_missing_docs(actions)
+            removed_count += len(offices)
         logger.info(
             "Removed a chunk of %d scam emails from %d offices.",
             len(scam_emails_chunk),
-            office_count,
+            len(offices),
         )
+    if removed_count:
+        # Cached search results may hold scam emails
+        search_cache.clear()
 
 
 @timeit
 def sanity_check_rome_codes() -> None:
-    ogr_rome_mapping = OGR_ROME_CODES
+    ogr_rome_mapping = load_ogr_rome_mapping()
     rome_labels = settings.ROME_DESCRIPTIONS
     rome_naf_mapping = mapping_util.MANUAL_ROME_NAF_MAPPING
 
@@ -819,14 +1495,32 @@ def sanity_check_rome_codes() -> None:
             logger.info("%s|%s|%s", rome_id, rome_labels[rome_id], len(offices))
 
 
-def display_performance_stats(departement: str) -> None:
-    methods = [
-        '_get_score_from_hirings',
-        'get_hirings_from_score',
-        'get_score_adjusted_to_rome_code_and_naf_code',
-    ]
-    for method in methods:
-        logger.info("[DPT%s] %s : %s", departement, method, getattr(scoring_util, method).cache_info())
+CACHED_SCORING_METHODS = [
+    '_get_score_from_hirings',
+    'get_hirings_from_score',
+    'get_score_adjusted_to_rome_code_and_naf_code',
+]
+
+
+def get_cache_infos() -> Dict[str, Any]:
+    return {method: getattr(scoring_util, method).cache_info() for method in CACHED_SCORING_METHODS}
+
+
+def display_performance_stats(departement: str, cache_infos_at_start: Dict[str, Any]) -> None:
+    """
+    Log the stats of the current job. Caches are kept from one job to the next: their hits and misses
+    are counted since `cache_infos_at_start`.
+    """
+    for method, cache_info in get_cache_infos().items():
+        start = cache_infos_at_start[method]
+        logger.info(
+            "[DPT%s] %s : hits=%s misses=%s currsize=%s",
+            departement,
+            method,
+            cache_info.hits - start.hits,
+            cache_info.misses - start.misses,
+            cache_info.currsize,
+        )
 
     logger.info(
         "[DPT%s] indexed %s of %s offices and %s score_for_rome and %s scores_alternance_by_rome",
@@ -838,13 +1532,26 @@ def display_performance_stats(departement: str) -> None:
     )
 
 
-def update_data(create_full: bool, create_partial: bool, disable_parallel_computing: bool) -> None:
+def update_data(create_full: bool,
+                create_partial: bool,
+                disable_parallel_computing: bool,
+                delta: bool = False) -> None:
     logger.info("[update data] Creation of ES index")
     if create_partial:
         with switch_es_index():
             create_offices_for_departement('57')
         return
 
+    if delta:
+        logger.info("[update data] Update offices changed since the latest update (delta)")
+        update_offices_delta()
+        logger.info("[update data] Remove scam emails")
+        remove_scam_emails()
+        return
+
+    # All admin changes made until now are replayed below
+    high_water_marks = get_high_water_marks()
+
     if create_full:
         with switch_es_index():
             create_offices(disable_parallel_computing)
@@ -864,6 +1571,8 @@ def update_data(create_full: bool, create_partial: bool, disable_parallel_comput
 
     # update_offices_geolocations()
 
+    save_high_water_marks(high_water_marks)
+
     logger.info("[update data] Remove scam emails")
     remove_scam_emails()
 
@@ -874,18 +1583,20 @@ def update_data(create_full: bool, create_partial: bool, disable_parallel_comput
 
 def update_data_profiling_wrapper(create_full: bool,
                                   create_partial: bool,
-                                  disable_parallel_computing: bool = False) -> None:
+                                  disable_parallel_computing: bool = False,
+                                  delta: bool = False) -> None:
     if Profiling.ACTIVATED:
         logger.info("STARTED run with profiling")
         profiler = Profile()
-        profiler.runctx("update_data(create_full, create_partial, disable_parallel_computing)", locals(), globals())
+        profiler.runctx("update_data(create_full, create_partial, disable_parallel_computing, delta)", locals(),
+                        globals())
         relative_filename = 'profiling_results/create_index_run.kgrind'
         filename = os.path.join(os.path.dirname(os.path.realpath(__file__)), relative_filename)
         convert(profiler.getstats(), filename)  # type: ignore
         logger.info("COMPLETED run with profiling: exported profiling result as %s", filename)
     else:
         logger.info("STARTED run without profiling")
-        update_data(create_full, create_partial, disable_parallel_computing)
+        update_data(create_full, create_partial, disable_parallel_computing, delta)
         logger.info("COMPLETED run without profiling")
 
 
@@ -898,6 +1609,11 @@ def run() -> None:
                         help=("Disable parallel computing and run only a single office indexing"
                               " job (departement 57) instead. This is required in order"
                               " to do a profiling from inside a job."))
+    parser.add_argument('-d',
+                        '--delta',
+                        action='store_true',
+                        help=("Only update the offices of the admin changes made since the latest run,"
+                              " in the live index."))
     parser.add_argument('-p',
                         '--profile',
                         action='store_true',
@@ -906,10 +1622,12 @@ def run() -> None:
 
     if args.full and args.partial:
         raise ValueError('Cannot create both partial and full index at the same time')
+    if args.delta and (args.full or args.partial):
+        raise ValueError('Cannot update the index by delta while creating a new index')
     if args.profile:
         Profiling.ACTIVATED = True
 
-    update_data_profiling_wrapper(args.full, args.partial)
+    update_data_profiling_wrapper(args.full, args.partial, delta=args.delta)
 
 
 if __name__ == '__main__':
@@ -51,9 +51,6 @@ class DatagouvTest(TestCase):
 
 class DepartmentApiTest(TestCase):
 
-    def setUp(self):
-        datagouv.fetch_json.cache_clear()
-
     def test_autocomplete_cal(self):
         fixture = get_fixture('autocomplete-cal.json', 'geo.api.gouv.fr')
         departments = datagouv.format_departments(fixture)
@@ -75,9 +72,6 @@ class DepartmentApiTest(TestCase):
 
 class AdresseApiTest(TestCase):
 
-    def setUp(self):
-        datagouv.fetch_json.cache_clear()
-
     def test_get_coordinates(self):
         fixture = get_fixture('search-lelab.json')
         features = fixture['features']
@@ -1,5 +1,12 @@
-from unittest import TestCase
+import tempfile
+from unittest import mock, TestCase
+
+import numpy as np
+
 from labonneboite.common import geocoding
+from labonneboite.common.geocoding.compiled import CompiledCities, compile_cities, load_compiled_cities, \
+    save_compiled_cities
+from labonneboite.common.geocoding.spatial import BoundingBoxes, CitiesIndex
 
 
 class GeocodingTest(TestCase):
@@ -57,3 +64,179 @@ class GeocodingTest(TestCase):
         saint_julien_les_metz = geocoding.get_city_by_zipcode("57070", "saint-julien-les-metz")
         self.assertEqual(vantoux['commune_id'], '57693')
         self.assertEqual(saint_julien_les_metz['commune_id'], '57616')
+
+    def test_get_all_cities_from_departement(self):
+        for departement in ["57", "2A", "97", "971"]:
+            expected = [city for city in geocoding.get_cities() if city['commune_id'].startswith(departement)]
+            self.assertTrue(expected)
+            self.assertEqual(geocoding.get_all_cities_from_departement(departement), expected)
+        self.assertEqual(geocoding.get_all_cities_from_departement("AAAAA"), [])
+
+    def test_nearest_city(self):
+        paris4eme = geocoding.get_city_by_zipcode("75004")
+        city = geocoding.nearest_city(paris4eme['coords']['lat'], paris4eme['coords']['lon'])
+        self.assertEqual(city['commune_id'], paris4eme['commune_id'])
+
+        # Metz
+        city = geocoding.nearest_city(49.1196, 6.1764)
+        self.assertEqual(city['commune_id'], '57463')
+
+    def test_cities_within(self):
+        latitude, longitude = 49.1196, 6.1764
+        cities = geocoding.cities_within(latitude, longitude, 5)
+        commune_ids = [city['commune_id'] for city, _ in cities]
+        self.assertEqual(commune_ids[0], '57463')
+        self.assertIn('57480', commune_ids)  # Montigny-lès-Metz
+        self.assertNotIn('57672', commune_ids)  # Thionville
+        distances = [distance for _, distance in cities]
+        self.assertEqual(distances, sorted(distances))
+        self.assertTrue(all(distance <= 5 for distance in distances))
+
+        # Same cities as a scan of all cities
+        expected = sorted(
+            city['commune_id'] for city in geocoding.get_cities()
+            if geocoding.get_distance_between_commune_id_and_coordinates(city['commune_id'], latitude, longitude) < 4.9
+        )
+        self.assertTrue(set(expected) <= set(commune_ids))
+
+    def test_get_offline_address(self):
+        addresses = geocoding.get_offline_address(49.1196, 6.1764, limit=2)
+        self.assertEqual(len(addresses), 2)
+        self.assertEqual(addresses[0], {
+            'label': 'Metz 57000',
+            'zipcode': '57000',
+            'city': 'Metz',
+            'city_code': '57463',
+        })
+
+        # Middle of the Atlantic ocean
+        self.assertEqual(geocoding.get_offline_address(45, -30), [])
+
+    def test_get_address_is_offline(self):
+        with mock.patch.object(geocoding.settings, 'REVERSE_GEOCODING_USE_API', False), \
+                mock.patch.object(geocoding.datagouv, 'reverse') as reverse:
+            addresses = geocoding.get_address(49.1196, 6.1764, limit=1)
+        reverse.assert_not_called()
+        self.assertEqual(addresses, geocoding.get_offline_address(49.1196, 6.1764, limit=1))
+
+    def test_get_address_from_api(self):
+        api_addresses = [{'label': '1 Rue Serpenoise 57000 Metz', 'zipcode': '57000', 'city': 'Metz', 'city_code': '57463'}]
+        with mock.patch.object(geocoding.settings, 'REVERSE_GEOCODING_USE_API', True):
+            with mock.patch.object(geocoding.datagouv, 'reverse', return_value=api_addresses):
+                self.assertEqual(geocoding.get_address(49.1196, 6.1764, limit=1), api_addresses)
+            # The API is down
+            with mock.patch.object(geocoding.datagouv, 'reverse', return_value=[]):
+                addresses = geocoding.get_address(49.1196, 6.1764, limit=1)
+        self.assertEqual(addresses[0]['city_code'], '57463')
+
+
+class CitiesIndexTest(TestCase):
+
+    @staticmethod
+    def city(commune_id, lat, lon):
+        return {'commune_id': commune_id, 'coords': {'lat': lat, 'lon': lon}}
+
+    def test_empty_index(self):
+        index = CitiesIndex.from_cities([])
+        self.assertIsNone(index.nearest_city(48.85, 2.35))
+        self.assertEqual(index.cities_within(48.85, 2.35, 100), [])
+
+    def test_nearest_city_far_away(self):
+        index = CitiesIndex.from_cities([self.city('97411', -20.88, 55.45), self.city('75056', 48.85, 2.35)])
+        self.assertEqual(index.nearest_city(-21, 55)['commune_id'], '97411')
+        self.assertEqual(index.nearest_city(49, 2)['commune_id'], '75056')
+        # In the middle of the Pacific ocean
+        self.assertEqual(index.nearest_city(-15, -170)['commune_id'], '97411')
+
+    def test_cities_within_across_antimeridian(self):
+        index = CitiesIndex.from_cities([self.city('west', 0, 179.99), self.city('east', 0, -179.99), self.city('far', 0, 170)])
+        commune_ids = [city['commune_id'] for city, _ in index.cities_within(0, 179.995, 5)]
+        self.assertEqual(commune_ids, ['west', 'east'])
+
+
+class BoundingBoxesTest(TestCase):
+
+    def test_within(self):
+        # Metz and Thionville (57), Nancy (54), Paris (75)
+        boxes = BoundingBoxes(
+            np.array([b'57', b'54', b'57', b'75']),
+            np.array([49.12, 48.69, 49.36, 48.86]),
+            np.array([6.18, 6.18, 6.17, 2.35]),
+        )
+        self.assertEqual(boxes.within(49.12, 6.18, 1), [b'57'])
+        # Between Metz and Nancy
+        self.assertEqual(boxes.within(48.90, 6.18, 25), [b'54', b'57'])
+        self.assertEqual(boxes.within(48.90, 6.18, 500), [b'54', b'57', b'75'])
+        # In the box of 57, far from its cities
+        self.assertEqual(boxes.within(49.25, 6.175, 1), [b'57'])
+        self.assertEqual(boxes.within(45.0, 5.0, 10), [])
+
+    def test_departements_of_commune_ids(self):
+        departements = geocoding.get_departements_of_commune_ids(np.array([b'57463', b'2A004', b'2B033', b'97411']))
+        self.assertEqual(departements.tolist(), [b'57', b'20', b'20', b'97'])
+
+
+class CompiledCitiesTest(TestCase):
+
+    cities = [{
+        'name': 'Metz',
+        'slug': 'metz',
+        'commune_id': '57463',
+        'zipcodes': ['57000', '57050', '57070'],
+        'zipcode': '57000',
+        'population': 117619,
+        'coords': {'lon': 6.1955, 'lat': 49.1048},
+    }, {
+        'name': 'Vantoux',
+        'slug': 'vantoux',
+        'commune_id': '57693',
+        'zipcodes': ['57070'],
+        'zipcode': '57070',
+        'population': 893,
+        'coords': {'lon': 6.2307, 'lat': 49.1342},
+    }, {
+        'name': 'Saint-Julien-lès-Metz',
+        'slug': 'saint-julien-les-metz',
+        'commune_id': '57616',
+        'zipcodes': ['57070'],
+        'zipcode': '57070',
+        'population': 3179,
+        'coords': {'lon': 6.2055, 'lat': 49.1331},
+    }, {
+        'name': 'Ajaccio',
+        'slug': 'ajaccio',
+        'commune_id': '2A004',
+        'zipcodes': ['20000', '20090'],
+        'zipcode': '20000',
+        'population': 68587,
+        'coords': {'lon': 8.7369, 'lat': 41.9189},
+    }]
+
+    def assert_compiled_cities(self, compiled):
+        self.assertEqual(len(compiled), 4)
+        self.assertEqual(list(compiled), self.cities)
+        self.assertEqual(compiled[-1], self.cities[-1])
+        self.assertEqual(compiled.get_position_by_commune_id('57616'), 2)
+        self.assertIsNone(compiled.get_position_by_commune_id('57'))
+        self.assertIsNone(compiled.get_position_by_commune_id('576160'))
+        self.assertEqual(compiled.get_positions_by_zipcode('57070'), [1, 2])
+        self.assertEqual(compiled.get_positions_by_zipcode('57050'), [])
+        self.assertEqual(compiled.get_positions_by_commune_id_prefix('57'), [0, 1, 2])
+        self.assertEqual(compiled.get_positions_by_commune_id_prefix('576'), [1, 2])
+        self.assertEqual(compiled.get_positions_by_commune_id_prefix('2A'), [3])
+        self.assertEqual(compiled.get_positions_by_commune_id_prefix('20'), [])
+
+    def test_compiled_cities(self):
+        self.assert_compiled_cities(CompiledCities(compile_cities(self.cities)))
+
+    def test_save_and_load_compiled_cities(self):
+        with tempfile.TemporaryDirectory() as directory:
+            self.assertIsNone(load_compiled_cities(directory, {'cities.json': 'abc'}))
+            save_compiled_cities(compile_cities(self.cities), directory, {'cities.json': 'abc'})
+            self.assert_compiled_cities(load_compiled_cities(directory, {'cities.json': 'abc'}))
+            # Outdated compiled cities
+            self.assertIsNone(load_compiled_cities(directory, {'cities.json': 'def'}))
+
+    def test_duplicate_commune_ids(self):
+        with self.assertRaises(ValueError):
+            compile_cities(self.cities + self.cities[:1])
@@ -0,0 +1,125 @@
+import threading
+from unittest import mock, TestCase
+
+from labonneboite.common import search_cache
+from labonneboite.common.geocoding import cache, datagouv
+from labonneboite.tests.common.test_search_cache import FakeRedis
+
+
+class GeocodingCacheTest(TestCase):
+
+    def setUp(self):
+        self.backend = search_cache.LocalCacheBackend(maxsize=10)
+        patchers = [
+            mock.patch.object(cache.settings, 'GEOCODING_CACHE_ENABLED', True),
+            mock.patch.object(cache.BACKEND_POOL, 'backend', self.backend),
+            mock.patch.object(cache, 'STATS', cache.Stats()),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_normalized_keys(self):
+        self.assertEqual('saint-etienne place du peuple', cache.normalize_query('  Saint-Étienne  Place du PEUPLE '))
+        self.assertEqual(
+            cache.make_key('search', address='Metz ', limit=10),
+            cache.make_key('search', limit=10, address='METZ'),
+        )
+        self.assertNotEqual(cache.make_key('search', address='Metz'), cache.make_key('reverse', address='Metz'))
+        self.assertEqual(
+            cache.make_key('reverse', latitude=49.119601, longitude=6.176402),
+            cache.make_key('reverse', latitude=49.11961, longitude=6.17644),
+        )
+
+    def test_hits_and_misses(self):
+        fetch = mock.Mock(return_value=[{'label': 'Metz'}])
+        first = cache.get_or_fetch('key', fetch)
+        first[0]['value'] = 'modified by the caller'
+        second = cache.get_or_fetch('key', fetch)
+
+        self.assertEqual([{'label': 'Metz'}], second)
+        fetch.assert_called_once_with()
+        self.assertEqual({'hits': 1, 'negative_hits': 0, 'misses': 1, 'coalesced': 0}, cache.get_stats())
+
+    def test_negative_caching(self):
+        fetch = mock.Mock(return_value=[])
+        with mock.patch.object(self.backend, 'set', wraps=self.backend.set) as backend_set, \
+                mock.patch.object(cache.settings, 'GEOCODING_CACHE_NEGATIVE_TTL', 60):
+            self.assertEqual([], cache.get_or_fetch('key', fetch))
+            self.assertEqual([], cache.get_or_fetch('key', fetch))
+        backend_set.assert_called_once_with('key', [], 60)
+        fetch.assert_called_once_with()
+        self.assertEqual({'hits': 1, 'negative_hits': 1, 'misses': 1, 'coalesced': 0}, cache.get_stats())
+
+    def test_errors_are_not_cached(self):
+        fetch = mock.Mock(side_effect=[KeyError('code'), [{'label': 'Metz'}]])
+        with self.assertRaises(KeyError):
+            cache.get_or_fetch('key', fetch)
+        self.assertEqual([{'label': 'Metz'}], cache.get_or_fetch('key', fetch))
+
+    def test_concurrent_lookups_are_coalesced(self):
+        fetch_started = threading.Event()
+        release_fetch = threading.Event()
+
+        def fetch():
+            fetch_started.set()
+            release_fetch.wait(5)
+            return [{'label': 'Metz'}]
+
+        fetch = mock.Mock(side_effect=fetch)
+        results = []
+        leader = threading.Thread(target=lambda: results.append(cache.get_or_fetch('key', fetch)))
+        leader.start()
+        fetch_started.wait(5)
+        followers = [
+            threading.Thread(target=lambda: results.append(cache.get_or_fetch('key', fetch))) for _ in range(3)
+        ]
+        for follower in followers:
+            follower.start()
+        # Wait for the followers to join the call in progress
+        while cache.get_stats()['coalesced'] < 3:
+            threading.Event().wait(0.001)
+        release_fetch.set()
+        for thread in [leader] + followers:
+            thread.join(5)
+
+        fetch.assert_called_once_with()
+        self.assertEqual([[{'label': 'Metz'}]] * 4, results)
+        self.assertEqual({'hits': 0, 'negative_hits': 0, 'misses': 4, 'coalesced': 3}, cache.get_stats())
+
+    def test_disabled_cache(self):
+        fetch = mock.Mock(return_value=[{'label': 'Metz'}])
+        with mock.patch.object(cache.settings, 'GEOCODING_CACHE_ENABLED', False):
+            cache.get_or_fetch('key', fetch)
+            cache.get_or_fetch('key', fetch)
+        self.assertEqual(2, fetch.call_count)
+
+    def test_shared_backend(self):
+        cache.set_backend(search_cache.RedisCacheBackend(FakeRedis(), prefix='lbb:geocoding'))
+        cache.get_or_fetch('key', mock.Mock(return_value=[{'label': 'Metz'}]))
+        fetch = mock.Mock()
+        self.assertEqual([{'label': 'Metz'}], cache.get_or_fetch('key', fetch))
+        fetch.assert_not_called()
+
+    def test_shared_backend_from_settings(self):
+        with mock.patch.object(cache.settings, 'CACHE_REDIS_URL', 'redis://localhost:6379/0'), \
+                mock.patch.object(cache.BACKEND_POOL, 'backend', None), \
+                mock.patch.object(search_cache, 'new_redis_client', mock.Mock(return_value=FakeRedis())):
+            backend = cache.get_backend()
+        self.assertIsInstance(backend, search_cache.RedisCacheBackend)
+        self.assertEqual('lbb:geocoding', backend.prefix)
+
+    def test_search_uses_cache(self):
+        def get(url, params, timeout):
+            # Empty results of the departments API are lists
+            body = [] if url == datagouv.settings.API_DEPARTMENTS_URL else {'features': []}
+            return mock.Mock(status_code=200, json=mock.Mock(return_value=body))
+
+        with mock.patch.object(datagouv.requests, 'get', side_effect=get) as requests_get:
+            self.assertEqual([], datagouv.search('Saint-Étienne'))
+            self.assertEqual([], datagouv.search('saint-etienne '))
+            # Addresses and departments
+            self.assertEqual(2, requests_get.call_count)
+            datagouv.reverse(49.1196, 6.1764, limit=1)
+            datagouv.reverse(49.1196, 6.1764, limit=1)
+            self.assertEqual(3, requests_get.call_count)
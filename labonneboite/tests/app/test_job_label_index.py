@@ -0,0 +1,97 @@
+from unittest import mock, TestCase
+
+from labonneboite.common import autocomplete
+
+
+class JobLabelIndexTest(TestCase):
+
+    job_labels = [{
+        'ogr_code': '10974',
+        'ogr_description': 'Animateur commercial / Animatrice commerciale',
+        'rome_code': 'D1501',
+        'rome_description': 'Animation de vente',
+    }, {
+        'ogr_code': '12345',
+        'ogr_description': 'Animateur / Animatrice de vente',
+        'rome_code': 'D1501',
+        'rome_description': 'Animation de vente',
+    }, {
+        'ogr_code': '38446',
+        'ogr_description': 'Secrétaire',
+        'rome_code': 'M1607',
+        'rome_description': 'Secrétariat',
+    }, {
+        'ogr_code': '38454',
+        'ogr_description': 'Secrétaire comptable',
+        'rome_code': 'M1608',
+        'rome_description': 'Secrétariat comptable',
+    }, {
+        'ogr_code': '11174',
+        'ogr_description': 'Boulanger / Boulangère',
+        'rome_code': 'D1102',
+        'rome_description': 'Boulangerie - viennoiserie',
+    }]
+
+    def setUp(self):
+        self.index = autocomplete.JobLabelIndex(self.job_labels)
+
+    def test_get_words(self):
+        self.assertEqual(['secretaire', 'enfer'], autocomplete.get_words("Secrétaire de l'enfer"))
+        self.assertEqual(['soeur'], autocomplete.get_words("Sœur"))
+
+    def test_suggestion_format(self):
+        self.assertEqual([{
+            'id': 'D1102',
+            'label': 'Boulangerie - viennoiserie (Boulanger / Boulangère, ...)',
+            'value': 'Boulangerie - viennoiserie (Boulanger / Boulangère, ...)',
+            'occupation': 'boulangerie-viennoiserie',
+            'score': mock.ANY,
+        }], self.index.suggest('boulang'))
+
+    def test_best_job_label_per_rome(self):
+        suggestions = self.index.suggest('animateur vente')
+        self.assertEqual(['D1501'], [suggestion['id'] for suggestion in suggestions])
+        # The job label containing both words is the best one
+        self.assertEqual('Animation de vente (Animateur / Animatrice de vente, ...)', suggestions[0]['label'])
+
+    def test_ranking(self):
+        suggestions = self.index.suggest('SECRETAIRE')
+        self.assertEqual(['M1607', 'M1608'], [suggestion['id'] for suggestion in suggestions])
+        self.assertGreater(suggestions[0]['score'], suggestions[1]['score'])
+        self.assertEqual(['M1608', 'M1607'], [suggestion['id'] for suggestion in self.index.suggest('secr compta')])
+        self.assertEqual(['M1607'], [suggestion['id'] for suggestion in self.index.suggest('secr', size=1)])
+
+    def test_no_match(self):
+        self.assertEqual([], self.index.suggest('unicorn'))
+        self.assertEqual([], self.index.suggest(''))
+        self.assertEqual([], self.index.suggest('de la'))
+
+    def test_real_job_labels(self):
+        index = autocomplete.get_job_label_index()
+        self.assertEqual('D1102', index.suggest('boulang', size=1)[0]['id'])
+        self.assertEqual('M1607', index.suggest('secrétaire', size=1)[0]['id'])
+
+
+class BuildJobLabelSuggestionsTest(TestCase):
+
+    def setUp(self):
+        autocomplete.build_job_label_suggestions.cache_clear()
+        self.addCleanup(autocomplete.build_job_label_suggestions.cache_clear)
+        patcher = mock.patch.object(autocomplete.settings, 'JOB_AUTOCOMPLETE_IN_MEMORY', True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_in_memory_suggestions(self):
+        with mock.patch.object(autocomplete, 'build_job_label_suggestions_from_es') as from_es:
+            suggestions = autocomplete.build_job_label_suggestions('ios', size=3)
+        from_es.assert_not_called()
+        self.assertEqual(3, len(suggestions))
+        # The thesaurus replaces "ios" by "informatique"
+        self.assertIn('informatique', suggestions[0]['label'].lower())
+
+    def test_es_fallback(self):
+        es_suggestions = [{'id': 'M1805', 'label': '', 'value': '', 'occupation': '', 'score': 1.0}]
+        with mock.patch.object(autocomplete, 'build_job_label_suggestions_from_es',
+                               return_value=es_suggestions) as from_es:
+            self.assertEqual(es_suggestions, autocomplete.build_job_label_suggestions('formaticien', size=1))
+        from_es.assert_called_once_with('formaticien', 1)
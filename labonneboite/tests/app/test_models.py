@@ -3,7 +3,7 @@ import datetime
 from labonneboite.common import scoring
 from labonneboite.conf import settings
 from labonneboite.common.database import db_session
-from labonneboite.common.models import Office, OfficeResult, OfficeAdminExtraGeoLocation
+from labonneboite.common.models import Office, OfficeResult, OfficeResultRecord, OfficeAdminExtraGeoLocation
 from labonneboite.tests.test_base import DatabaseTest
 
 
@@ -130,3 +130,28 @@ class OfficeAdminExtraGeoLocationTest(DatabaseTest):
 
         self.assertDictContainsSubset(office_json, office_result_json)
         self.assertDictContainsSubset({'distance': 10}, office_result_json)
+
+    def test_office_result_record_as_json(self):
+        office = Office(
+            siret='00000000000001',
+            company_name='1',
+            headcount='11',
+            city_code='57070',
+            zipcode='57070',
+            naf='4646Z',
+            departement='57',
+            hiring=scoring.get_hirings_from_score(90),
+            x=6.166667,
+            y=49.133333,
+            score_alternance=80,
+        )
+        office.save()
+
+        row = db_session.query(*OfficeResultRecord.get_columns()).filter(Office.siret == office.siret).one()
+        office_record = OfficeResultRecord(row, position=1)
+        office_record.distance = 10
+        office_result = OfficeResult(office, distance=10, position=1)
+
+        self.assertFalse(hasattr(office_record, '__dict__'))
+        for rome_codes in [None, ['D1101']]:
+            self.assertEqual(office_result.as_json(rome_codes=rome_codes), office_record.as_json(rome_codes=rome_codes))
@@ -0,0 +1,62 @@
+import os
+import pickle
+import tempfile
+from unittest import mock, TestCase
+
+from labonneboite.common import load_data
+
+
+class ReferenceDataTest(TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'reference_data.pickle')
+
+    def test_compiled_tables_match_csv_files(self):
+        load_data.compile_reference_data(self.path)
+        tables = load_data.read_reference_data(self.path)
+
+        self.assertEqual(set(load_data.REFERENCE_TABLES), set(tables))
+        for name, read_table in load_data.REFERENCE_TABLES.items():
+            self.assertEqual(read_table(), pickle.loads(tables[name]), name)
+
+    def test_missing_bundle(self):
+        self.assertIsNone(load_data.read_reference_data(self.path))
+
+    def test_outdated_bundle_is_ignored(self):
+        load_data.compile_reference_data(self.path)
+        sources = load_data.get_reference_data_sources()
+        sources['naf_labels.csv'] = 'modified'
+
+        with mock.patch.object(load_data, 'get_reference_data_sources', return_value=sources):
+            self.assertIsNone(load_data.read_reference_data(self.path))
+        with mock.patch.object(load_data, 'REFERENCE_DATA_VERSION', load_data.REFERENCE_DATA_VERSION + 1):
+            self.assertIsNone(load_data.read_reference_data(self.path))
+
+    def test_tables_are_read_from_csv_files_without_bundle(self):
+        with mock.patch.object(load_data, 'load_reference_data', return_value=None):
+            self.assertEqual('Défense', load_data.load_reference_table('naf_labels')['8422Z'])
+
+    def test_rome_codes(self):
+        self.assertIsInstance(load_data.load_ogr_rome_mapping(), dict)
+        self.assertEqual(set(load_data.load_ogr_rome_mapping().values()), set(load_data.load_rome_codes()))
+
+    def test_rome_naf_mappings(self):
+        rome_naf_mapping, naf_rome_mapping = load_data.load_rome_naf_mappings()
+        for rome, hirings_by_naf in rome_naf_mapping.items():
+            for naf, hirings in hirings_by_naf.items():
+                self.assertEqual(hirings, naf_rome_mapping[naf][rome])
+
+    def test_file_stamps(self):
+        path = os.path.join(os.path.dirname(self.path), 'source.csv')
+        with open(path, 'w') as f:
+            f.write('a|b\n')
+        stamps = load_data.get_file_stamps([path])
+        self.assertEqual(['source.csv'], list(stamps))
+        self.assertEqual(4, stamps['source.csv']['size'])
+        self.assertEqual(stamps, load_data.get_file_stamps([path]))
+
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000))
+        self.assertNotEqual(stamps, load_data.get_file_stamps([path]))
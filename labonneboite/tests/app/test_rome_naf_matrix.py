@@ -0,0 +1,83 @@
+import tempfile
+from unittest import TestCase
+
+from labonneboite.common import mapping as mapping_util
+from labonneboite.common import rome_naf_matrix
+
+
+class RomeNafMatrixTest(TestCase):
+
+    ROME_NAF_MAPPING = {
+        'D1507': {'4711D': 30, '4711F': 10},
+        'D1505': {'4711F': 10, '1071C': 5, '4711D': 30},
+        'H2102': {'1071C': 15},
+    }
+    NAF_ROME_MAPPING = {
+        '4711D': {'D1507': 30, 'D1505': 30},
+        '4711F': {'D1507': 10, 'D1505': 10},
+        '1071C': {'D1505': 5, 'H2102': 15},
+    }
+
+    def setUp(self):
+        self.arrays = rome_naf_matrix.compile_rome_naf_matrix(self.ROME_NAF_MAPPING, self.NAF_ROME_MAPPING)
+        self.matrix = rome_naf_matrix.RomeNafMatrix(self.arrays)
+
+    def test_lookups(self):
+        self.assertEqual(6, len(self.matrix))
+        self.assertEqual(30, self.matrix.get_hirings('D1505', '4711D'))
+        self.assertEqual(0.25, self.matrix.get_affinity('D1505', '1071C'))
+        self.assertEqual(0.5, self.matrix.get_affinity('D1507', '4711F'))
+        self.assertEqual(45, self.matrix.get_total_rome_hirings('D1505'))
+        self.assertEqual(20, self.matrix.get_total_naf_hirings('1071C'))
+        self.assertIsNone(self.matrix.get_position('H2102', '4711D'))
+        self.assertIsNone(self.matrix.get_position('A1101', '4711D'))
+        with self.assertRaises(KeyError):
+            self.matrix.get_affinity('H2102', '4711D')
+
+    def test_rows_and_columns(self):
+        self.assertEqual(
+            [('4711F', 10, 0.5), ('1071C', 5, 0.25), ('4711D', 30, 0.5)],
+            self.matrix.get_nafs_for_rome('D1505'),
+        )
+        self.assertEqual(['4711D', '4711F', '1071C'],
+                         [naf for naf, _, _ in self.matrix.get_nafs_for_rome('D1505', by_hirings=True)])
+        self.assertEqual(['D1505', 'H2102'], [rome for rome, _, _ in self.matrix.get_romes_for_naf('1071C')])
+        self.assertEqual(['H2102', 'D1505'],
+                         [rome for rome, _, _ in self.matrix.get_romes_for_naf('1071C', by_hirings=True)])
+        # Same hirings: first ROME of the mapping first
+        self.assertEqual(['D1507', 'D1505'],
+                         [rome for rome, _, _ in self.matrix.get_romes_for_naf('4711D', by_hirings=True)])
+        self.assertEqual([], self.matrix.get_romes_for_naf('0000Z'))
+        self.assertEqual([], self.matrix.get_nafs_for_rome('A1101'))
+
+    def test_save_and_load(self):
+        with tempfile.TemporaryDirectory() as path:
+            self.assertIsNone(rome_naf_matrix.load_rome_naf_matrix(path, {'a.csv': 'sha1'}))
+            rome_naf_matrix.save_rome_naf_matrix(self.arrays, path, {'a.csv': 'sha1'})
+
+            self.assertIsNone(rome_naf_matrix.load_rome_naf_matrix(path, {'a.csv': 'other'}))
+            matrix = rome_naf_matrix.load_rome_naf_matrix(path, {'a.csv': 'sha1'})
+            self.assertEqual(self.matrix.get_nafs_for_rome('D1505'), matrix.get_nafs_for_rome('D1505'))
+            self.assertEqual(self.matrix.get_romes_for_naf('1071C', True), matrix.get_romes_for_naf('1071C', True))
+
+    def test_mismatching_mappings(self):
+        with self.assertRaises(ValueError):
+            naf_rome_mapping = dict(self.NAF_ROME_MAPPING, **{'4711D': {'H2102': 30, 'D1505': 30}})
+            rome_naf_matrix.compile_rome_naf_matrix(self.ROME_NAF_MAPPING, naf_rome_mapping)
+
+    def test_mapping_helpers(self):
+        for naf, hirings_by_rome in mapping_util.MANUAL_NAF_ROME_MAPPING.items():
+            self.assertEqual(list(hirings_by_rome), mapping_util.get_romes_for_naf(naf))
+            self.assertEqual(sum(hirings_by_rome.values()), mapping_util.get_total_naf_hirings(naf))
+            romes = [rome.code for rome in mapping_util.romes_for_naf(naf)]
+            self.assertEqual(sorted(hirings_by_rome), sorted(romes))
+            hirings = [hirings_by_rome[rome] for rome in romes]
+            self.assertEqual(sorted(hirings, reverse=True), hirings)
+        with self.assertRaises(KeyError):
+            mapping_util.get_romes_for_naf('0000Z')
+        self.assertEqual([], mapping_util.romes_for_naf('0000Z'))
+
+        nafs = mapping_util.nafs_for_rome('D1507')
+        self.assertEqual(set(mapping_util.MANUAL_ROME_NAF_MAPPING['D1507']), {naf.code for naf in nafs})
+        for naf in nafs:
+            self.assertEqual(naf.affinity, mapping_util.get_affinity_between_rome_and_naf('D1507', naf.code))
@@ -0,0 +1,48 @@
+import math
+from types import SimpleNamespace
+import unittest
+
+from labonneboite.common import mapping as mapping_util
+from labonneboite.common import scoring as scoring_util
+from labonneboite.common.rome_scores import RomeScoresTable
+from labonneboite.scripts import create_index
+
+
+class RomeScoresTableTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.table = RomeScoresTable()
+
+    def test_thresholds_match_scores(self):
+        for score, threshold in enumerate(self.table.thresholds.tolist(), start=1):
+            self.assertGreaterEqual(scoring_util.get_score_from_hirings(threshold), score)
+            self.assertLess(scoring_util.get_score_from_hirings(math.nextafter(threshold, 0)), score)
+
+    def test_scores_by_rome_parity(self):
+        hirings = list(range(0, 600, 3)) + [1000, 123456]
+        nafs = sorted(mapping_util.MANUAL_NAF_ROME_MAPPING)[::10] + ['0000Z']
+        pairs = [(naf, hiring) for naf in nafs for hiring in hirings]
+        all_scores_by_rome = self.table.get_scores_by_rome([naf for naf, _ in pairs], [hiring for _, hiring in pairs])
+        for (naf, hiring), scores_by_rome in zip(pairs, all_scores_by_rome):
+            office = SimpleNamespace(siret='00000000000001', naf=naf, hiring=hiring)
+            expected_scores_by_rome, _ = create_index.get_scores_by_rome_and_boosted_romes(office)
+            self.assertEqual(expected_scores_by_rome, scores_by_rome, (naf, hiring))
+
+    def test_scores_by_rome_for_offices(self):
+        offices = [
+            SimpleNamespace(siret='00000000000001', naf='4711D', hiring=120),
+            SimpleNamespace(siret='00000000000002', naf='0000Z', hiring=120),
+            SimpleNamespace(siret='00000000000003', naf='4711D', hiring=120),
+            SimpleNamespace(siret='00000000000004', naf='4646Z', hiring=10),
+        ]
+        scores_by_rome = create_index.get_scores_by_rome_for_offices(offices, self.table)
+
+        self.assertEqual(
+            [create_index.get_scores_by_rome_and_boosted_romes(office)[0] for office in offices],
+            scores_by_rome,
+        )
+        self.assertEqual({}, scores_by_rome[1])
+        # Offices with the same NAF and hirings do not share their scores.
+        self.assertIsNot(scores_by_rome[0], scores_by_rome[2])
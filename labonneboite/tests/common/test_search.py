@@ -4,8 +4,9 @@ import os
 import json
 from typing import Sequence
 
-from labonneboite.common.search import AudienceFilter, HiddenMarketFetcher, hiring_type_util, settings, sorting
-from labonneboite.common import search
+from labonneboite.common.search import (AudienceFilter, FILTERS, HiddenMarketFetcher, hiring_type_util, settings,
+                                        sorting)
+from labonneboite.common import es, search
 
 PROPS_SUFFIX = '.props.json'
 RESULT_SUFFIX = '.result.json'
@@ -73,3 +74,281 @@ class TestHiddenMarketFetcher(unittest.TestCase):
                     self.fail(f'Invalid props in {self.test_dir}/{name}{PROPS_SUFFIX} : {e}')
                 result = fetcher._build_elastic_search_query()
                 self.assertDictEqual(expected_result, result, f"in subTest({name})\n{json.dumps(result)}")
+
+
+class TestHiddenMarketFetcherMultiSearch(unittest.TestCase):
+
+    def _get_fetcher(self):
+        return HiddenMarketFetcher(
+            longitude=2.123,
+            latitude=1.256,
+            romes=['E1107'],
+            distance=10,
+            from_number=1,
+            to_number=10,
+        )
+
+    @staticmethod
+    def _mock_msearch(totals):
+        """
+        Answer the requests of the successive msearch calls with the next total in `totals`.
+        """
+        totals = iter(totals)
+
+        def msearch(body, **_):
+            headers = body[::2]
+            return {'responses': [{'hits': {'total': next(totals), 'hits': []}} for _ in headers]}
+
+        return Mock(msearch=Mock(side_effect=msearch))
+
+    def test_get_offices_with_suggestions(self):
+        fetcher = self._get_fetcher()
+        # offices, then alternative rome E1103, distances 30, 50 and 3000
+        es_mock = self._mock_msearch([0, 4, 2, 2, 7])
+        with patch('labonneboite.common.es.Elasticsearch', Mock(return_value=es_mock)):
+            offices, aggregations = fetcher.get_offices(add_suggestions=True)
+
+        self.assertEqual(2, es_mock.msearch.call_count)
+        body = es_mock.msearch.call_args_list[0][1]['body']
+        self.assertEqual(2, len(body))
+        self.assertEqual({}, body[0])
+        self.assertIn('sort', body[1])
+        body = es_mock.msearch.call_args_list[1][1]['body']
+        self.assertEqual(8, len(body))
+        self.assertEqual([{'search_type': 'count'}] * 4, body[::2])
+        self.assertEqual([], offices)
+        self.assertEqual({}, aggregations)
+        self.assertEqual(0, fetcher.office_count)
+        self.assertEqual({'E1103': 4}, fetcher.alternative_rome_codes)
+        self.assertEqual([(30, ('30 km', 2)), (3000, ('France entière', 7))],
+                         list(fetcher.alternative_distances.items()))
+
+    def test_get_offices_more_results_than_a_page(self):
+        fetcher = self._get_fetcher()
+        es_mock = self._mock_msearch([11])
+        with patch('labonneboite.common.es.Elasticsearch', Mock(return_value=es_mock)), \
+                patch.object(HiddenMarketFetcher, '_fetch_offices', return_value=([], {})):
+            fetcher.get_offices(add_suggestions=True)
+
+        # Suggestions are not needed: no count is sent.
+        self.assertEqual(1, es_mock.msearch.call_count)
+        self.assertEqual(2, len(es_mock.msearch.call_args[1]['body']))
+        self.assertEqual(11, fetcher.office_count)
+        self.assertEqual({}, fetcher.alternative_rome_codes)
+        self.assertEqual({}, fetcher.alternative_distances)
+
+    def test_get_offices_without_suggestions(self):
+        fetcher = self._get_fetcher()
+        es_mock = self._mock_msearch([0])
+        with patch('labonneboite.common.es.Elasticsearch', Mock(return_value=es_mock)):
+            fetcher.get_offices()
+
+        self.assertEqual(1, es_mock.msearch.call_count)
+        self.assertEqual(2, len(es_mock.msearch.call_args[1]['body']))
+        self.assertEqual({}, fetcher.alternative_rome_codes)
+        es_mock.count.assert_not_called()
+
+    def test_get_offices_out_of_range_page(self):
+        fetcher = self._get_fetcher()
+        fetcher.from_number = 21
+        fetcher.to_number = 30
+        es_mock = self._mock_msearch([5])
+        es_mock.search.return_value = {'hits': {'total': 5, 'hits': []}}
+        with patch('labonneboite.common.es.Elasticsearch', Mock(return_value=es_mock)), \
+                patch.object(search, 'Elasticsearch', Mock(return_value=es_mock)):
+            fetcher.get_offices()
+
+        self.assertEqual(5, fetcher.office_count)
+        self.assertEqual(1, fetcher.from_number)
+        self.assertEqual(6, fetcher.to_number)
+        es_mock.search.assert_called_once()
+        self.assertEqual(0, es_mock.search.call_args[1]['body']['from'])
+
+
+class TestHiddenMarketFetcherRouting(unittest.TestCase):
+
+    def _get_fetcher(self, **kwargs):
+        kwargs.setdefault('longitude', 6.18)
+        kwargs.setdefault('latitude', 49.12)
+        return HiddenMarketFetcher(romes=['E1107'], distance=10, from_number=1, to_number=10, **kwargs)
+
+    @patch.object(settings, 'ES_OFFICES_ROUTED_BY_DEPARTEMENT', False)
+    def test_not_routed(self):
+        self.assertIsNone(self._get_fetcher()._get_routing())
+
+    @patch.object(settings, 'ES_OFFICES_ROUTED_BY_DEPARTEMENT', True)
+    @patch.object(settings, 'ES_ROUTING_MARGIN_KM', 10)
+    def test_routing(self):
+        with patch.object(search.geocoding, 'departements_within', return_value=['57', '54']) as departements_within:
+            self.assertEqual('54,57,multi', self._get_fetcher()._get_routing())
+            departements_within.assert_called_once_with(49.12, 6.18, 20)
+            self.assertEqual('57,multi', self._get_fetcher(departments=['57', '67'])._get_routing())
+        self.assertEqual('67,multi', self._get_fetcher(latitude=None, longitude=None, departments=['67'])._get_routing())
+        self.assertIsNone(self._get_fetcher(latitude=None, longitude=None)._get_routing())
+
+    @patch.object(settings, 'ES_OFFICES_ROUTED_BY_DEPARTEMENT', True)
+    def test_routed_multi_search(self):
+        fetcher = self._get_fetcher()
+        es_mock = TestHiddenMarketFetcherMultiSearch._mock_msearch([0, 4, 2, 2, 7])
+
+        def departements_within(latitude, longitude, km):
+            return ['57'] if km < 100 else ['54', '57']
+
+        with patch('labonneboite.common.es.Elasticsearch', Mock(return_value=es_mock)), \
+                patch.object(search.geocoding, 'departements_within', side_effect=departements_within):
+            fetcher.get_offices(add_suggestions=True)
+
+        self.assertEqual([{'routing': '57,multi'}], es_mock.msearch.call_args_list[0][1]['body'][::2])
+        headers = es_mock.msearch.call_args_list[1][1]['body'][::2]
+        self.assertEqual({'search_type': 'count', 'routing': '57,multi'}, headers[0])
+        self.assertEqual({'search_type': 'count', 'routing': '54,57,multi'}, headers[-1])
+
+
+class TestHiddenMarketFetcherExplicitRomeScores(unittest.TestCase):
+
+    @patch.object(settings, 'ES_EXPLICIT_ROME_SCORES_MAPPING', True)
+    def test_rome_in_scores_filter(self):
+        self.assertEqual({'terms': {'rome_codes': ['E1107', 'E1103']}},
+                         HiddenMarketFetcher._build_rome_in_scores_filter(['E1107', 'E1103'], hiring_type_util.DPAE))
+        self.assertEqual({'terms': {'alternance_rome_codes': ['E1107']}},
+                         HiddenMarketFetcher._build_rome_in_scores_filter(['E1107'], hiring_type_util.ALTERNANCE))
+
+    @patch.object(settings, 'ES_EXPLICIT_ROME_SCORES_MAPPING', False)
+    def test_rome_in_scores_filter_dynamic(self):
+        self.assertEqual({'bool': {'should': [{'exists': {'field': 'scores_by_rome.E1107'}}]}},
+                         HiddenMarketFetcher._build_rome_in_scores_filter(['E1107'], hiring_type_util.DPAE))
+
+    def test_add_rome_codes(self):
+        with patch.object(settings, 'ES_EXPLICIT_ROME_SCORES_MAPPING', False):
+            self.assertEqual({'scores_by_rome': {'E1107': 10}}, es.add_rome_codes({'scores_by_rome': {'E1107': 10}}))
+        with patch.object(settings, 'ES_EXPLICIT_ROME_SCORES_MAPPING', True):
+            self.assertEqual({'scores_by_rome': {'E1107': 10, 'E1103': 20}, 'rome_codes': ['E1103', 'E1107']},
+                             es.add_rome_codes({'scores_by_rome': {'E1107': 10, 'E1103': 20}}))
+            self.assertEqual({'scores_by_rome': {}}, es.add_rome_codes({'scores_by_rome': {}}))
+
+
+class TestHiddenMarketFetcherFacets(unittest.TestCase):
+
+    def _get_fetcher(self):
+        return HiddenMarketFetcher(
+            longitude=2.123,
+            latitude=1.256,
+            romes=['rome1'],
+            distance=10,
+            headcount=settings.HEADCOUNT_BIG_ONLY,
+            naf_codes=['naf1'],
+            aggregate_by=FILTERS,
+        )
+
+    def test_build_facets_query(self):
+        query = self._get_fetcher()._build_facets_query(FILTERS)
+        naf_filter = {'terms': {'naf': ['naf1']}}
+        headcount_filter = {'range': {'headcount': {'gte': settings.HEADCOUNT_BIG_ONLY_MINIMUM}}}
+
+        self.assertEqual(0, query['size'])
+        self.assertNotIn('sort', query)
+        main_filters = query['query']['filtered']['filter']['bool']['must']
+        self.assertNotIn(naf_filter, main_filters)
+        self.assertNotIn(headcount_filter, main_filters)
+        self.assertIn({'geo_distance': {'distance': '3000km', 'locations': {'lat': 1.256, 'lon': 2.123}}},
+                      main_filters)
+
+        post_filters = query['post_filter']['bool']['must']
+        self.assertIn(naf_filter, post_filters)
+        self.assertIn(headcount_filter, post_filters)
+
+        self.assertEqual({'naf', 'headcount', 'hiring_type', 'distance'}, set(query['aggs']))
+        naf_facet_filters = query['aggs']['naf']['filter']['bool']['must']
+        self.assertNotIn(naf_filter, naf_facet_filters)
+        self.assertIn(headcount_filter, naf_facet_filters)
+        self.assertEqual({'terms': {'field': 'naf'}}, query['aggs']['naf']['aggs']['naf'])
+
+        contract_aggs = query['aggs']['hiring_type']['aggs']
+        self.assertEqual(
+            {'bool': {'should': [{'exists': {'field': 'scores_alternance_by_rome.rome1'}}]}},
+            contract_aggs[hiring_type_util.CONTRACT_ALTERNANCE]['filter'],
+        )
+        self.assertEqual(
+            {'bool': {'should': [{'exists': {'field': 'scores_by_rome.rome1'}}]}},
+            contract_aggs[hiring_type_util.CONTRACT_DPAE]['filter'],
+        )
+
+    def test_get_facets_single_request(self):
+        fetcher = self._get_fetcher()
+        es_mock = Mock()
+        es_mock.search.return_value = {
+            'hits': {'total': 3, 'hits': []},
+            'aggregations': {
+                'naf': {'doc_count': 5, 'naf': {'buckets': [{'key': 'naf1', 'doc_count': 3}]}},
+                'headcount': {'doc_count': 4, 'headcount': {'buckets': [
+                    {'key': 11, 'doc_count': 1},
+                    {'key': 21, 'doc_count': 3},
+                ]}},
+                'hiring_type': {'doc_count': 6, 'alternance': {'doc_count': 2}, 'dpae': {'doc_count': 3}},
+                'distance': {'doc_count': 8, 'distance': {'buckets': [
+                    {'key': '*-10.0', 'doc_count': 3},
+                    {'key': '*-3000.0', 'doc_count': 8},
+                ]}},
+            },
+        }
+        with patch.object(search, 'Elasticsearch', Mock(return_value=es_mock)):
+            aggregations = fetcher.get_facets()
+
+        es_mock.search.assert_called_once()
+        self.assertEqual(3, fetcher.office_count)
+        self.assertEqual({
+            'naf': [{'code': 'naf1', 'count': 3, 'label': None}],
+            'headcount': {'small': 1, 'big': 3},
+            'contract': {'alternance': 2, 'dpae': 3},
+            'distance': {'less_10_km': 3, 'france': 8},
+        }, aggregations)
+
+
+class TestHiddenMarketFetcherHydrateFromEs(unittest.TestCase):
+
+    @staticmethod
+    def _get_es_office(siret, **office_result):
+        source = {'siret': siret}
+        if office_result:
+            office_result.update(siret=siret, city_code='57463', zipcode='57050')
+            source[search.OFFICE_RESULT_FIELD] = office_result
+        return {'_source': source, 'sort': [1.5]}
+
+    def test_get_office_results_without_db(self):
+        fetcher = HiddenMarketFetcher(6.17, 49.12, romes=['D1101'], distance=10)
+        fetcher._distance_sort_index = 0
+        es_res = {'hits': {'total': 2, 'hits': [
+            self._get_es_office('00000000000001', office_name='office 1', naf='4711D', headcount='11'),
+            self._get_es_office('00000000000002', office_name='office 2', naf='4646Z', headcount='21'),
+        ]}}
+
+        with patch.object(settings, 'SEARCH_HYDRATE_FROM_ES', True), \
+                patch.object(HiddenMarketFetcher, '_get_office_records_from_db') as get_office_records_from_db:
+            offices = fetcher._get_office_results_from_es_results(es_res)
+
+        get_office_records_from_db.assert_not_called()
+        self.assertEqual(['00000000000001', '00000000000002'], [office.siret for office in offices])
+        self.assertEqual([1, 2], [office.position for office in offices])
+        self.assertEqual(['office 1', 'office 2'], [office.office_name for office in offices])
+        self.assertEqual([1.5, 1.5], [office.distance for office in offices])
+        self.assertEqual('D1101', offices[0].matched_rome)
+
+    def test_get_office_results_with_missing_fields(self):
+        fetcher = HiddenMarketFetcher(6.17, 49.12, romes=['D1101'], distance=10)
+        fetcher._distance_sort_index = 0
+        es_res = {'hits': {'total': 2, 'hits': [
+            self._get_es_office('00000000000001'),
+            self._get_es_office('00000000000002', office_name='office 2', naf='4646Z', headcount='21'),
+        ]}}
+        db_record = search.OfficeResultRecord.from_fields({
+            'siret': '00000000000001', 'office_name': 'office 1', 'naf': '4711D', 'city_code': '57463', 'zipcode': '57050'
+        })
+
+        with patch.object(settings, 'SEARCH_HYDRATE_FROM_ES', True), \
+                patch.object(HiddenMarketFetcher, '_get_office_records_from_db',
+                             Mock(return_value=[db_record])) as get_office_records_from_db:
+            offices = fetcher._get_office_results_from_es_results(es_res)
+
+        get_office_records_from_db.assert_called_once()
+        self.assertEqual(['00000000000001'], list(get_office_records_from_db.call_args[0][0].keys()))
+        self.assertEqual(['office 1', 'office 2'], [office.office_name for office in offices])
@@ -0,0 +1,120 @@
+from datetime import datetime
+import unittest
+from unittest.mock import Mock, patch
+
+from labonneboite.common import search_cache
+from labonneboite.common.search import HiddenMarketFetcher
+
+
+class FakeRedis(object):
+    """
+    Minimal in-memory implementation of the redis-py commands used by the search cache.
+    """
+
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, ex=None):
+        self.data[key] = value
+
+    def incr(self, key):
+        self.data[key] = int(self.data.get(key) or 0) + 1
+        return self.data[key]
+
+
+class SearchCacheTest(unittest.TestCase):
+
+    def test_local_backend_expiration(self):
+        backend = search_cache.LocalCacheBackend(maxsize=2)
+        with patch.object(search_cache.time, 'time', Mock(return_value=1000)):
+            backend.set('key', {'hits': 1}, ttl=10)
+            self.assertEqual({'hits': 1}, backend.get('key'))
+        with patch.object(search_cache.time, 'time', Mock(return_value=1010)):
+            self.assertIsNone(backend.get('key'))
+
+    def test_local_backend_lru_eviction(self):
+        backend = search_cache.LocalCacheBackend(maxsize=2)
+        backend.set('a', 1, ttl=10)
+        backend.set('b', 2, ttl=10)
+        backend.get('a')
+        backend.set('c', 3, ttl=10)
+        self.assertEqual(1, backend.get('a'))
+        self.assertIsNone(backend.get('b'))
+        self.assertEqual(3, backend.get('c'))
+
+    def test_redis_backend_clear(self):
+        backend = search_cache.RedisCacheBackend(FakeRedis())
+        backend.set('key', {'hits': [1, 2]}, ttl=10)
+        self.assertEqual({'hits': [1, 2]}, backend.get('key'))
+        backend.clear()
+        self.assertIsNone(backend.get('key'))
+
+    def test_make_key(self):
+        self.assertEqual(
+            search_cache.make_key(romes=['A1101'], latitude=48.856613, longitude=2.352222),
+            search_cache.make_key(longitude=2.35222249, latitude=48.85661, romes=['A1101']),
+        )
+        self.assertNotEqual(
+            search_cache.make_key(romes=['A1101', 'A1102']),
+            search_cache.make_key(romes=['A1102', 'A1101']),
+        )
+
+    def test_ttl_ends_at_seed_rollover(self):
+        self.assertEqual(3600, search_cache.get_ttl(datetime(2022, 2, 17, 23, 0, 0)))
+        self.assertEqual(24 * 3600, search_cache.get_ttl(datetime(2022, 2, 17, 0, 0, 0)))
+
+    def test_redis_backend_from_settings(self):
+        with patch.object(search_cache.settings, 'CACHE_REDIS_URL', 'redis://localhost:6379/0'), \
+                patch.object(search_cache.BACKEND_POOL, 'backend', None), \
+                patch.object(search_cache, 'new_redis_client', Mock(return_value=FakeRedis())):
+            self.assertIsInstance(search_cache.get_backend(), search_cache.RedisCacheBackend)
+
+    def test_live_index_is_checked_periodically(self):
+        es_mock = Mock()
+        es_mock.indices.get_alias.return_value = {'labonneboite-1': {}}
+        with patch.object(search_cache.settings, 'SEARCH_CACHE_ENABLED', True), \
+                patch.object(search_cache.settings, 'SEARCH_CACHE_INDEX_CHECK_INTERVAL', 60), \
+                patch.object(search_cache.LiveIndex, 'NAME', None), \
+                patch.object(search_cache.LiveIndex, 'CHECKED_AT', 0), \
+                patch.object(search_cache.es, 'Elasticsearch', Mock(return_value=es_mock)):
+            with patch.object(search_cache.time, 'time', Mock(return_value=1000)):
+                self.assertEqual('labonneboite-1', search_cache.get_live_index())
+            es_mock.indices.get_alias.return_value = {'labonneboite-2': {}}
+            with patch.object(search_cache.time, 'time', Mock(return_value=1059)):
+                self.assertEqual('labonneboite-1', search_cache.get_live_index())
+            with patch.object(search_cache.time, 'time', Mock(return_value=1060)):
+                self.assertEqual('labonneboite-2', search_cache.get_live_index())
+            self.assertEqual(2, es_mock.indices.get_alias.call_count)
+
+    def test_get_offices_uses_cache(self):
+        backend = search_cache.RedisCacheBackend(FakeRedis())
+        es_mock = Mock()
+        es_mock.msearch.return_value = {'responses': [{'hits': {'total': 0, 'hits': []}}]}
+        es_mock.indices.get_alias.return_value = {'labonneboite-1': {}}
+
+        def get_offices():
+            fetcher = HiddenMarketFetcher(2.123, 1.256, romes=['E1107'], distance=10, from_number=1, to_number=10)
+            fetcher.get_offices()
+            return fetcher
+
+        with patch.object(search_cache.settings, 'SEARCH_CACHE_ENABLED', True), \
+                patch.object(search_cache.BACKEND_POOL, 'backend', backend), \
+                patch.object(search_cache.LiveIndex, 'NAME', None), \
+                patch.object(search_cache.LiveIndex, 'CHECKED_AT', 0), \
+                patch('labonneboite.common.es.Elasticsearch', Mock(return_value=es_mock)):
+            get_offices()
+            get_offices()
+            self.assertEqual(1, es_mock.msearch.call_count)
+
+            search_cache.clear()
+            get_offices()
+            self.assertEqual(2, es_mock.msearch.call_count)
+
+            # Another index is put behind the alias
+            es_mock.indices.get_alias.return_value = {'labonneboite-2': {}}
+            search_cache.LiveIndex.CHECKED_AT = 0
+            get_offices()
+            self.assertEqual(3, es_mock.msearch.call_count)
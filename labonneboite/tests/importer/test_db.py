@@ -0,0 +1,63 @@
+import datetime
+import io
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from labonneboite.importer import db
+
+LOAD_DATA_UNESCAPES = {'\\': '\\', 't': '\t', 'n': '\n', 'r': '\r', '0': '\0'}
+
+
+def read_load_data_tsv(content):
+    """
+    Rows of a TSV file as read by `LOAD DATA INFILE` with its default format: NULL is `\\N`, and
+    backslashes escape the field and line terminators.
+    """
+
+    def unescape(field):
+        if field == '\\N':
+            return None
+        chars = iter(field)
+        return ''.join(LOAD_DATA_UNESCAPES[next(chars)] if char == '\\' else char for char in chars)
+
+    return [[unescape(field) for field in line.split('\t')] for line in content.split('\n')[:-1]]
+
+
+class ExportDfEtabTest(unittest.TestCase):
+
+    def test_same_values_as_dataframe(self):
+        df_etab = pd.DataFrame({
+            'siret': ['00000000000001', '00000000000002', '00000000000003'],
+            'raisonsociale': ['TAB\tTAB', 'BACKSLASH \\N\\', 'NEW\nLINE "QUOTED" \'SINGLE\''],
+            'website': [None, '', 'http://example.com'],
+            'flag': [True, False, True],
+            'effectif': [1, 20, 300],
+            'score_regr': [0.5, np.nan, 1e-7],
+            'date': [datetime.datetime(2021, 6, 1, 12, 30), pd.NaT, datetime.datetime(2021, 1, 1)],
+        })
+        f = io.StringIO()
+        db.write_df_etab_to_tsv(df_etab, f)
+
+        self.assertEqual([
+            ['00000000000001', 'TAB\tTAB', None, '1', '1', '0.5', '2021-06-01 12:30:00'],
+            ['00000000000002', 'BACKSLASH \\N\\', '', '0', '20', None, None],
+            ['00000000000003', 'NEW\nLINE "QUOTED" \'SINGLE\'', 'http://example.com', '1', '300', '1e-07',
+             '2021-01-01 00:00:00'],
+        ], read_load_data_tsv(f.getvalue()))
+
+    def test_sql_column_types(self):
+        df_etab = pd.DataFrame({
+            'siret': ['00000000000001'],
+            'departement': ['57'],
+            'raisonsociale': ['NAME'],
+            'flag': [True],
+            'effectif': [1],
+            'score_regr': [0.5],
+            'date': [datetime.datetime(2021, 6, 1)],
+        })
+        self.assertEqual(
+            ['VARCHAR(191) NOT NULL', 'VARCHAR(8)', 'TEXT', 'TINYINT(1)', 'BIGINT', 'DOUBLE', 'DATETIME'],
+            [db.get_sql_column_type(column, dtype) for column, dtype in df_etab.dtypes.items()],
+        )
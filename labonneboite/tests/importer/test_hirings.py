@@ -0,0 +1,144 @@
+import datetime
+import unittest
+
+from dateutil.relativedelta import relativedelta
+import numpy as np
+import pandas as pd
+
+from labonneboite.importer import db, hirings
+from labonneboite.tests.test_base import DatabaseTest
+
+
+class PeriodHiringColumnsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.prediction_beginning_date = datetime.date(2021, 6, 1)
+        rand = np.random.default_rng(42)
+        columns = {}
+        for month in range(1, 25):
+            date = self.prediction_beginning_date + relativedelta(months=-month)
+            # Months without any hiring in the departement have no column
+            if month % 7:
+                columns['dpae-%s-%s' % (date.year, date.month)] = rand.poisson(0.5, 50).astype(np.float64)
+        self.df_etab = pd.DataFrame(columns)
+        self.df_etab['siret'] = ['%014d' % index for index in range(50)]
+
+    def test_same_columns_as_row_wise(self):
+        # Periods 5 and 6 are before the first month column.
+        periods = 6
+        df_vectorized = self.df_etab.copy()
+        columns = hirings.add_period_hiring_columns(df_vectorized, self.prediction_beginning_date, periods, 'dpae', 6)
+
+        df_row_wise = self.df_etab.copy()
+        for i in range(1, periods + 1):
+            # pylint: disable=cell-var-from-loop
+            df_row_wise['dpae-period-%s' % i] = df_row_wise.apply(
+                lambda office: hirings.get_hirings_over_period_for_office(
+                    office, self.prediction_beginning_date, 6, minus=i, prefix='dpae',
+                ),
+                axis=1,
+            )
+
+        self.assertEqual(['dpae-period-%s' % i for i in range(1, periods + 1)], columns)
+        pd.testing.assert_frame_equal(df_row_wise, df_vectorized)
+
+
+class PivotHiringChunksTest(unittest.TestCase):
+
+    def setUp(self):
+        rand = np.random.default_rng(42)
+        rows = []
+        for siret in ['%014d' % index for index in range(20)]:
+            for hiring_type in ['alt', 'dpae']:
+                for month in sorted(rand.choice(range(1, 13), 3, replace=False)):
+                    rows.append((siret, hiring_type, 2020, month, int(rand.integers(1, 5))))
+        self.df_hiring = pd.DataFrame(
+            rows, columns=['siret', 'hiring_type', 'hiring_date_year', 'hiring_date_month', 'hiring_count'])
+
+    def test_same_pivot_as_whole_dataframe(self):
+        expected = hirings.pivot_hirings(self.df_hiring)
+        # Chunks split the rows of sirets, some of them are empty.
+        for chunk_size in [1, 5, 7, len(self.df_hiring)]:
+            chunks = [self.df_hiring.iloc[start:start + chunk_size]
+                      for start in range(0, len(self.df_hiring), chunk_size)]
+            chunks.append(self.df_hiring.iloc[:0])
+            pd.testing.assert_frame_equal(expected, hirings.pivot_hiring_chunks(chunks))
+
+    def test_no_rows(self):
+        self.assertIsNone(hirings.pivot_hiring_chunks([self.df_hiring.iloc[:0]]))
+        self.assertIsNone(hirings.pivot_hiring_chunks([]))
+
+
+class HiringCountsTest(DatabaseTest):
+    """
+    Test the hirings counted by the DB against the former groupby/pivot of every hiring row.
+    """
+    TABLE = 'test_hirings'
+    DPAE_CONTRACT_TYPES = [1, 2]
+    ALTERNANCE_CONTRACT_TYPES = [11]
+
+    def setUp(self):
+        super().setUp()
+        self.engine = db.get_engine()
+        self.engine.execute("drop table if exists %s" % self.TABLE)
+        self.engine.execute("""
+            create table %s (
+                siret varchar(14) not null,
+                departement varchar(8) not null,
+                contract_type int not null,
+                hiring_date date not null
+            )
+            """ % self.TABLE)
+        self.addCleanup(self.engine.execute, "drop table %s" % self.TABLE)
+
+        self.prediction_beginning_date = datetime.date(2021, 6, 1)
+        rand = np.random.default_rng(42)
+        rows = []
+        for siret in ['%014d' % index for index in range(30)]:
+            for _ in range(rand.integers(1, 20)):
+                rows.append((
+                    siret,
+                    rand.choice(['57', '67']),
+                    # Contract type 3 is neither dpae nor alternance.
+                    int(rand.choice([1, 2, 3, 11])),
+                    # Some hirings are after prediction_beginning_date.
+                    self.prediction_beginning_date + datetime.timedelta(days=int(rand.integers(-800, 60))),
+                ))
+        pd.DataFrame(rows, columns=['siret', 'departement', 'contract_type', 'hiring_date']).to_sql(
+            self.TABLE, self.engine, if_exists='append', index=False)
+
+    def get_former_pivot(self):
+        df_hiring = pd.read_sql_query("""
+            select
+                siret,
+                hiring_date,
+                case
+                    when contract_type in (1, 2) then 'dpae'
+                    when contract_type in (11) then 'alt'
+                end as hiring_type
+            from %s
+            where
+                departement = 57
+                and contract_type in (1, 2, 11)
+                and hiring_date < '%s'
+            """ % (self.TABLE, self.prediction_beginning_date.isoformat()), self.engine)
+        df_hiring["hiring_date_month"] = pd.DatetimeIndex(df_hiring["hiring_date"]).month
+        df_hiring["hiring_date_year"] = pd.DatetimeIndex(df_hiring["hiring_date"]).year
+        df_hiring = df_hiring.groupby(
+            ["siret", "hiring_type", "hiring_date_year", "hiring_date_month"]).count().reset_index()
+        return pd.pivot_table(df_hiring, values="hiring_date", index="siret",
+                              columns=["hiring_type", "hiring_date_year", "hiring_date_month"])
+
+    def test_same_pivot_as_former_groupby(self):
+        expected = self.get_former_pivot()
+        query = hirings.get_hiring_counts_query(self.TABLE, '57', self.prediction_beginning_date,
+                                                self.DPAE_CONTRACT_TYPES, self.ALTERNANCE_CONTRACT_TYPES)
+        # Chunks of a single row, of a few rows, and a single chunk.
+        for chunk_rows in [1, 7, 10000]:
+            df_hiring = hirings.read_hiring_counts(self.engine, query, chunk_rows * hirings.HIRINGS_ROW_MEMORY)
+            pd.testing.assert_frame_equal(expected, df_hiring, check_dtype=False, check_column_type=False)
+
+    def test_no_hirings(self):
+        query = hirings.get_hiring_counts_query(self.TABLE, '2', self.prediction_beginning_date,
+                                                self.DPAE_CONTRACT_TYPES, self.ALTERNANCE_CONTRACT_TYPES)
+        self.assertIsNone(hirings.read_hiring_counts(self.engine, query, hirings.HIRINGS_ROW_MEMORY))
@@ -0,0 +1,80 @@
+import json
+import os
+import tempfile
+import unittest
+
+from labonneboite.importer import parallel
+
+
+def compute_stub_departement(departement):
+    if departement == '01':
+        return {'status': parallel.STATUS_SUCCESS, 'offices': 10}
+    if departement == '02':
+        raise ValueError("too many score changes")
+    if departement == '03':
+        # The process dies without reporting, e.g. killed for lack of memory.
+        os._exit(3)
+    if departement == '04':
+        return {'status': parallel.STATUS_NOT_ENOUGH_DATA, 'error': "not enough hirings"}
+    return {'status': parallel.STATUS_NO_DATA}
+
+
+class RunDepartementsTest(unittest.TestCase):
+
+    def test_reports(self):
+        reports = parallel.run_departements(compute_stub_departement, ['01', '02', '03', '04', '05'], 2)
+
+        reports = {report['departement']: report for report in reports}
+        self.assertEqual(['01', '02', '03', '04', '05'], sorted(reports))
+        self.assertEqual({
+            '01': (parallel.STATUS_SUCCESS, 10, None),
+            '02': (parallel.STATUS_FAILED, None, "ValueError: too many score changes"),
+            '03': (parallel.STATUS_CRASHED, None, "process exited with code 3"),
+            '04': (parallel.STATUS_NOT_ENOUGH_DATA, None, "not enough hirings"),
+            '05': (parallel.STATUS_NO_DATA, None, None),
+        }, {
+            departement: (report['status'], report['offices'], report['error'])
+            for departement, report in reports.items()
+        })
+        # Each departement is computed in its own process.
+        pids = [report['pid'] for report in reports.values()]
+        self.assertEqual(len(pids), len(set(pids)))
+        self.assertNotIn(os.getpid(), pids)
+        for report in reports.values():
+            self.assertGreaterEqual(report['duration'], 0)
+        self.assertGreater(reports['01']['peak_rss_mb'], 0)
+        self.assertIsNone(reports['03']['peak_rss_mb'])
+
+        self.assertEqual(1, parallel.get_exit_status(reports.values()))
+
+    def test_exit_status(self):
+        reports = parallel.run_departements(compute_stub_departement, ['01', '04', '05'], 4)
+        self.assertEqual(0, parallel.get_exit_status(reports))
+        reports = parallel.run_departements(compute_stub_departement, ['01', '03'], 1)
+        self.assertEqual(1, parallel.get_exit_status(reports))
+
+    def test_initializer(self):
+        reports = parallel.run_departements(compute_stub_departement, ['01', '05'], 1, initializer=os.getpid)
+        self.assertEqual({parallel.STATUS_SUCCESS, parallel.STATUS_NO_DATA},
+                         {report['status'] for report in reports})
+
+        def failing_initializer():
+            raise RuntimeError("no DB connection")
+
+        reports = parallel.run_departements(compute_stub_departement, ['01'], 1, initializer=failing_initializer)
+        self.assertEqual(parallel.STATUS_FAILED, reports[0]['status'])
+        self.assertEqual("RuntimeError: no DB connection", reports[0]['error'])
+
+    def test_write_report(self):
+        reports = parallel.run_departements(compute_stub_departement, ['01', '02'], 2)
+        with tempfile.NamedTemporaryFile(suffix='.json') as f:
+            parallel.write_report(f.name, reports, prediction_beginning_date='2021-06-01', processes=2)
+            with open(f.name) as report_file:
+                report = json.load(report_file)
+
+        self.assertEqual('2021-06-01', report['prediction_beginning_date'])
+        self.assertEqual(2, report['processes'])
+        self.assertEqual(
+            [('01', parallel.STATUS_SUCCESS), ('02', parallel.STATUS_FAILED)],
+            sorted((report['departement'], report['status']) for report in report['departements']),
+        )
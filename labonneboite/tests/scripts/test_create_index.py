@@ -1,6 +1,9 @@
 import datetime
-from unittest import mock
+import json
+import os
+from unittest import mock, TestCase
 
+from elasticsearch.helpers import BulkIndexError
 from flask import url_for
 from social_flask_sqlalchemy.models import UserSocialAuth
 
@@ -89,11 +92,19 @@ class CreateIndexBaseTest(DatabaseTest):
         count = self.es.count(index=settings.ES_INDEX, doc_type=es.OFFICE_TYPE, body={'query': {'match_all': {}}})
         self.assertEqual(count['count'], 2 + 1)
         # Ensure that the office is the one that has been indexed in ES.
-        res = self.es.get(index=settings.ES_INDEX, doc_type=es.OFFICE_TYPE, id=self.office1.siret)
+        res = self.get_office_doc(self.office1)
         self.assertEqual(res['_source']['email'], self.office1.email)
-        res = self.es.get(index=settings.ES_INDEX, doc_type=es.OFFICE_TYPE, id=self.office2.siret)
+        res = self.get_office_doc(self.office2)
         self.assertEqual(res['_source']['email'], self.office2.email)
 
+    def get_office_doc(self, office, has_multi_geolocations=False):
+        """
+        Get the document of an office, routed as it is indexed (see `es.get_office_routing`).
+        """
+        routing = es.get_office_routing(office.departement, has_multi_geolocations)
+        return self.es.get(index=settings.ES_INDEX, doc_type=es.OFFICE_TYPE, id=office.siret,
+                           **es.routing_params(routing))
+
 
 class DeleteOfficeAdminTest(CreateIndexBaseTest):
 
@@ -296,9 +307,231 @@ class UtilsTest(CreateIndexBaseTest):
             'siret': '78548035101646',
             'headcount': 12,
             'email': 'supermarche@match.com',
+            'office_result': {
+                'siret': '78548035101646',
+                'company_name': 'SUPERMARCHES MATCH',
+                'office_name': 'SUPERMARCHES MATCH',
+                'naf': '4711D',
+                'street_number': '45',
+                'street_name': 'AVENUE ANDRE MALRAUX',
+                'city_code': '57463',
+                'zipcode': '57000',
+                'departement': '57',
+                'headcount': '12',
+                'email': 'supermarche@match.com',
+                'tel': '0387787878',
+                'website': 'http://www.supermarchesmatch.fr',
+                'social_network': None,
+                'email_alternance': '',
+                'phone_alternance': None,
+                'website_alternance': None,
+                'contact_mode': None,
+                'flag_alternance': False,
+                'flag_junior': False,
+                'flag_senior': False,
+                'flag_handicap': False,
+                'flag_pmsmp': False,
+                'score_alternance': 90,
+                'x': 6.17952,
+                'y': 49.1044,
+                'hiring': 120,
+                'has_multi_geolocations': False,
+            },
         }
         self.assertDictEqual(doc, expected_doc)
 
+    def test_get_office_actions(self):
+        actions = list(script.get_office_actions('57'))
+        self.assertEqual([self.office1.siret], [action['_id'] for action in actions])
+        self.assertEqual(script.get_office_as_es_doc(self.office1), actions[0]['_source'])
+
+    def test_stream_bulk_actions(self):
+        self.es.delete(index=settings.ES_INDEX, doc_type=es.OFFICE_TYPE, id=self.office1.siret)
+
+        stats = script.stream_bulk_actions(script.get_office_actions('57'))
+        self.es.indices.flush(index=settings.ES_INDEX)
+
+        self.assertEqual(1, stats.action_count)
+        self.assertGreater(stats.byte_count, 0)
+        res = self.es.get(index=settings.ES_INDEX, doc_type=es.OFFICE_TYPE, id=self.office1.siret)
+        self.assertEqual(res['_source']['email'], self.office1.email)
+
+    def test_get_indexing_shards(self):
+        office3 = Office(
+            siret="78548035101648",
+            company_name="SUPERMARCHES MATCH",
+            office_name="SUPERMARCHES MATCH",
+            naf="4711D",
+            city_code="57463",
+            zipcode="57000",
+            departement="57",
+            headcount="12",
+            hiring=120,
+            x=6.17952,
+            y=49.1044,
+        )
+        office3.save()
+
+        shards = script.get_indexing_shards(shard_size=1)
+
+        # Departement 57 is split in 2 shards, each departement without office is a shard.
+        self.assertEqual(len(shards), len(script.dpt.DEPARTEMENTS) + 1)
+        self.assertEqual([
+            script.IndexingShard('57', None, office3.siret, 1),
+            script.IndexingShard('57', office3.siret, None, 1),
+        ], [shard for shard in shards if shard.departement == '57'])
+        # Largest shards come first.
+        self.assertEqual(3, len([shard for shard in shards[:3] if shard.office_count == 1]))
+
+        actions = list(script.get_office_actions('57', office3.siret, None))
+        self.assertEqual([office3.siret], [action['_id'] for action in actions])
+
+    def test_create_offices_for_shard(self):
+        shard = script.IndexingShard('57', None, None, 1)
+        entry = script.create_offices_for_shard(shard)
+        self.assertEqual('57', entry['departement'])
+        self.assertEqual(1, entry['office_count'])
+        self.assertLessEqual(entry['start'], entry['end'])
+
+
+class StreamBulkActionsTest(TestCase):
+    """
+    Test stream_bulk_actions() without Elasticsearch.
+    """
+
+    def setUp(self):
+        self.client = mock.Mock()
+        self.client.transport.serializer.dumps.side_effect = json.dumps
+        patchers = [
+            mock.patch.object(script.es, 'new_elasticsearch_instance', return_value=self.client),
+            mock.patch.object(script, 'ES_BULK_CHUNK_SIZE', 2),
+            mock.patch.object(script, 'ES_BULK_QUEUE_SIZE', 1),
+            mock.patch.object(script, 'ES_BULK_THREAD_COUNT', 2),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    @staticmethod
+    def get_actions(count):
+        for position in range(count):
+            yield {'_index': 'index', '_type': es.OFFICE_TYPE, '_id': str(position), '_source': {'siret': position}}
+
+    def test_stream_bulk_actions(self):
+        with mock.patch.object(script, 'bulk') as bulk:
+            stats = script.stream_bulk_actions(self.get_actions(5))
+
+        self.assertEqual(5, stats.action_count)
+        self.assertEqual(5 * len(json.dumps({'siret': 0})), stats.byte_count)
+        self.assertEqual(3, bulk.call_count)
+        sent_ids = sorted(action['_id'] for call in bulk.call_args_list for action in call[0][1])
+        self.assertEqual([str(position) for position in range(5)], sent_ids)
+
+    def test_actions_are_generated_as_they_are_sent(self):
+        generated = []
+        generated_when_sent = []
+
+        def get_actions():
+            for action in self.get_actions(20):
+                generated.append(action)
+                yield action
+
+        def bulk(client, chunk, **kwargs):
+            generated_when_sent.append(len(generated))
+
+        with mock.patch.object(script, 'ES_BULK_THREAD_COUNT', 1), mock.patch.object(script, 'bulk', bulk):
+            script.stream_bulk_actions(get_actions())
+
+        # Besides the chunks already sent, at most one chunk is being sent, one is queued and one is generated.
+        for sent_count, generated_count in enumerate(generated_when_sent):
+            self.assertLessEqual(generated_count, (sent_count + 3) * script.ES_BULK_CHUNK_SIZE)
+
+    def test_failure(self):
+        with mock.patch.object(script, 'bulk', side_effect=BulkIndexError("failed", [])):
+            with self.assertRaises(BulkIndexError):
+                script.stream_bulk_actions(self.get_actions(100))
+
+
+def create_offices_for_shard(shard):
+    """
+    Stand-in for `create_index.create_offices_for_shard` in indexing processes, which fails for departement '00'.
+    """
+    if shard.departement == '00':
+        raise ValueError("indexing failed")
+    return {'departement': shard.departement, 'pid': os.getpid(), 'office_count': shard.office_count}
+
+
+class RunIndexingWorkersTest(TestCase):
+    """
+    Test run_indexing_workers() without Elasticsearch nor DB.
+    """
+
+    def setUp(self):
+        # Indexing processes are forked: they inherit the patched function.
+        patcher = mock.patch.object(script, 'create_offices_for_shard', create_offices_for_shard)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        script.logger.setLevel(script.logging.CRITICAL)
+
+    @staticmethod
+    def get_shards(*departements):
+        return [script.IndexingShard(departement, None, None, 10) for departement in departements]
+
+    def test_workers_are_reused(self):
+        timeline = script.run_indexing_workers(self.get_shards('57', '44', '75', '13'), process_count=2)
+
+        self.assertEqual(['13', '44', '57', '75'], sorted(entry['departement'] for entry in timeline))
+        self.assertLessEqual(len({entry['pid'] for entry in timeline}), 2)
+
+    def test_workers_are_recycled(self):
+        # Any process exceeds a zero memory threshold: each one indexes a single shard.
+        timeline = script.run_indexing_workers(self.get_shards('57', '44', '75', '13'), process_count=2, max_rss=0)
+
+        self.assertEqual(['13', '44', '57', '75'], sorted(entry['departement'] for entry in timeline))
+        self.assertEqual(4, len({entry['pid'] for entry in timeline}))
+
+    def test_failure_aborts_indexing(self):
+        with self.assertRaises(RuntimeError):
+            script.run_indexing_workers(self.get_shards('00', '57', '44'), process_count=1)
+
+
+class GetIndexedOfficeDocsTest(TestCase):
+    """
+    Test get_indexed_office_docs() without Elasticsearch.
+    """
+
+    def test_documents_are_routed_by_departement(self):
+        offices = [
+            Office(siret="78548035101646", departement="57", has_multi_geolocations=False),
+            Office(siret="78548035101647", departement="44", has_multi_geolocations=True),
+        ]
+        es_mock = mock.Mock()
+        es_mock.mget.return_value = {'docs': [
+            {'_id': "78548035101646", 'found': True, '_version': 2, '_source': {'siret': "78548035101646"}},
+            {'_id': "78548035101647", 'found': False},
+        ]}
+
+        with mock.patch.object(script.settings, 'ES_OFFICES_ROUTED_BY_DEPARTEMENT', True), \
+                mock.patch.object(script.es, 'Elasticsearch', return_value=es_mock):
+            docs = script.get_indexed_office_docs(offices)
+
+        self.assertEqual(["78548035101646"], list(docs))
+        self.assertEqual(2, docs["78548035101646"]['_version'])
+        self.assertEqual([
+            {'_id': "78548035101646", '_routing': "57"},
+            {'_id': "78548035101647", '_routing': es.MULTI_GEOLOCATIONS_ROUTING},
+        ], es_mock.mget.call_args[1]['body']['docs'])
+
+    def test_documents_are_not_routed(self):
+        es_mock = mock.Mock()
+        es_mock.mget.return_value = {'docs': [{'_id': "78548035101646", 'found': False}]}
+
+        with mock.patch.object(script.settings, 'ES_OFFICES_ROUTED_BY_DEPARTEMENT', False), \
+                mock.patch.object(script.es, 'Elasticsearch', return_value=es_mock):
+            self.assertEqual({}, script.get_indexed_office_docs([Office(siret="78548035101646", departement="57")]))
+
+        self.assertEqual([{'_id': "78548035101646"}], es_mock.mget.call_args[1]['body']['docs'])
+
 
 class AddOfficesTest(CreateIndexBaseTest):
     """
@@ -441,6 +674,9 @@ class UpdateOfficesTest(CreateIndexBaseTest):
         self.assertEqual(res['_source']['email'], office.email)
         self.assertEqual(res['_source']['phone'], office.tel)
         self.assertEqual(res['_source']['website'], office.website)
+        self.assertEqual(res['_source']['office_result']['company_name'], office.company_name)
+        self.assertEqual(res['_source']['office_result']['office_name'], office.office_name)
+        self.assertEqual(res['_source']['office_result']['email'], office.email)
 
         # Global score should always be the same.
         self.assertEqual(res['_source']['score'], office.score)
@@ -450,6 +686,90 @@ class UpdateOfficesTest(CreateIndexBaseTest):
         for rome in mapping_util.romes_for_naf(office.naf):
             self.assertTrue(res['_source']['boosted_romes'][rome.code])
 
+    def test_update_offices_in_bulk(self):
+        """
+        Test `update_offices` with several updates of the same offices: they take a single bulk request,
+        the most recent update wins and missing offices are skipped.
+        """
+        for index in range(3):
+            OfficeAdminUpdate(
+                sirets='\n'.join([self.office1.siret, self.office2.siret, '00000000000000']),
+                name="Update %s" % index,
+                new_email="foo%s@pole-emploi.fr" % index,
+                new_phone=self.office1.tel,
+                new_website=self.office1.website,
+            ).save()
+
+        with mock.patch.object(script, 'bulk', wraps=script.bulk) as bulk:
+            script.update_offices(OfficeAdminUpdate)
+        bulk.assert_called_once()
+
+        for siret in [self.office1.siret, self.office2.siret]:
+            self.assertEqual(Office.get(siret).email, "foo2@pole-emploi.fr")
+            res = self.es.get(index=settings.ES_INDEX, doc_type=es.OFFICE_TYPE, id=siret)
+            self.assertEqual(res['_source']['email'], "foo2@pole-emploi.fr")
+            self.assertIn('scores_by_rome', res['_source'])
+
+    def test_bulk_actions_ignoring_missing_docs(self):
+        actions = [{
+            '_op_type': 'update',
+            '_index': settings.ES_INDEX,
+            '_type': es.OFFICE_TYPE,
+            '_id': siret,
+            'doc': {
+                'email': 'foo@pole-emploi.fr'
+            },
+        } for siret in [self.office1.siret, '00000000000000']]
+
+        self.assertEqual(['00000000000000'], script.bulk_actions_ignoring_missing_docs(actions))
+
+        res = self.es.get(index=settings.ES_INDEX, doc_type=es.OFFICE_TYPE, id=self.office1.siret)
+        self.assertEqual(res['_source']['email'], 'foo@pole-emploi.fr')
+
+    def test_update_offices_before_refresh(self):
+        """
+        Test `update_offices` on a document indexed since the latest refresh: it is read in real time.
+        """
+        self.es.indices.put_settings(index=settings.ES_INDEX, body={'index': {'refresh_interval': '-1'}})
+        self.addCleanup(self.es.indices.put_settings, index=settings.ES_INDEX,
+                        body={'index': {'refresh_interval': '1s'}})
+        script.add_individual_office(OfficeAdminAdd(
+            siret="78548035101648",
+            company_name="SUPERMARCHES MATCH",
+            office_name="SUPERMARCHES MATCH",
+            naf="4711D",
+            street_number="45",
+            street_name="AVENUE ANDRE MALRAUX",
+            city_code="57463",
+            zipcode="57000",
+            email="supermarche@match.com",
+            tel="0387787878",
+            website="http://www.supermarchesmatch.fr",
+            flag_alternance=0,
+            flag_junior=0,
+            flag_senior=0,
+            flag_handicap=0,
+            departement="57",
+            headcount="12",
+            score=90,
+            score_alternance=75,
+            x=6.17952,
+            y=49.1044,
+            reason="Demande de mise en avant",
+        ))
+        OfficeAdminUpdate(
+            sirets="78548035101648",
+            name="SUPERMARCHES MATCH",
+            new_email="foo@pole-emploi.fr",
+            new_phone="",
+            new_website="",
+        ).save()
+
+        script.update_offices(OfficeAdminUpdate)
+
+        res = self.es.get(index=settings.ES_INDEX, doc_type=es.OFFICE_TYPE, id="78548035101648")
+        self.assertEqual(res['_source']['email'], "foo@pole-emploi.fr")
+
     def test_update_office_with_blank_new_name_companny_office(self):
         """
         Test `update_offices` to update an office: update names, email and website, keep current phone.
@@ -1011,6 +1331,7 @@ class UpdateOfficesGeolocationsTest(CreateIndexBaseTest):
 
         office = Office.get(self.office1.siret)
         self.assertTrue(office.has_multi_geolocations)
+        self.assertTrue(res['_source']['office_result']['has_multi_geolocations'])
 
         # Make `extra_geolocation` instance out-of-date.
         extra_geolocation.date_end = datetime.datetime.now() - datetime.timedelta(days=1)
@@ -1031,3 +1352,241 @@ class UpdateOfficesGeolocationsTest(CreateIndexBaseTest):
 
         office = Office.get(self.office1.siret)
         self.assertFalse(office.has_multi_geolocations)
+        self.assertFalse(res['_source']['office_result']['has_multi_geolocations'])
+
+
+class UpdateOfficesDeltaTest(CreateIndexBaseTest):
+    """
+    Test update_offices_delta().
+    """
+
+    def test_update_offices_delta(self):
+        office_to_update = OfficeAdminUpdate(
+            sirets=self.office1.siret,
+            name=self.office1.company_name,
+            new_email="foo@pole-emploi.fr",
+            new_phone=self.office1.tel,
+            new_website=self.office1.website,
+            boost=True,
+        )
+        office_to_update.save()
+        office_to_remove = OfficeAdminRemove(
+            siret=self.office2.siret,
+            name=self.office2.company_name,
+            reason="N/A",
+            initiative=False,
+        )
+        office_to_remove.save()
+
+        script.update_offices_delta()
+        self.es.indices.flush(index=settings.ES_INDEX)
+
+        office = Office.get(self.office1.siret)
+        self.assertEqual(office.email, "foo@pole-emploi.fr")
+        res = self.es.get(index=settings.ES_INDEX, doc_type=es.OFFICE_TYPE, id=self.office1.siret)
+        self.assertEqual(res['_source']['email'], "foo@pole-emploi.fr")
+        self.assertEqual(res['_source']['office_result']['email'], "foo@pole-emploi.fr")
+        for rome in mapping_util.romes_for_naf(office.naf):
+            self.assertTrue(res['_source']['boosted_romes'][rome.code])
+
+        self.assertIsNone(Office.get(self.office2.siret))
+        self.assertFalse(self.es.exists(index=settings.ES_INDEX, doc_type=es.OFFICE_TYPE, id=self.office2.siret))
+
+        self.assertEqual({
+            OfficeAdminUpdate.__tablename__: office_to_update.date_created,
+            OfficeAdminRemove.__tablename__: office_to_remove.date_created,
+        }, script.load_high_water_marks())
+
+    def test_update_offices_delta_skips_unchanged_offices(self):
+        office_to_update = OfficeAdminUpdate(
+            sirets=self.office1.siret,
+            name=self.office1.company_name,
+            new_email="foo@pole-emploi.fr",
+            new_phone=self.office1.tel,
+            new_website=self.office1.website,
+        )
+        office_to_update.save()
+        script.update_offices_delta()
+        self.es.indices.flush(index=settings.ES_INDEX)
+
+        # The update row is at the high-water mark: it is applied again, without any change.
+        with mock.patch.object(script, 'bulk_actions') as bulk_actions:
+            script.update_offices_delta()
+        bulk_actions.assert_not_called()
+
+        # Only the offices of rows changed since the latest run are recomputed.
+        office_to_update.new_website = "https://foo.pole-emploi.fr"
+        office_to_update.date_updated = datetime.datetime.utcnow()
+        office_to_update.save()
+        with mock.patch.object(script, 'get_office_delta_actions', return_value=[]) as get_office_delta_actions:
+            script.update_offices_delta()
+        get_office_delta_actions.assert_called_once_with({self.office1.siret})
+
+    def test_update_data_saves_high_water_marks(self):
+        office_to_remove = OfficeAdminRemove(
+            siret=self.office2.siret,
+            name=self.office2.company_name,
+            reason="N/A",
+            initiative=False,
+        )
+        office_to_remove.save()
+
+        script.update_data(create_full=False, create_partial=False, disable_parallel_computing=True)
+
+        self.assertEqual({OfficeAdminRemove.__tablename__: office_to_remove.date_created},
+                         script.load_high_water_marks())
+        since = office_to_remove.date_created + datetime.timedelta(seconds=1)
+        self.assertEqual(set(), script.get_changed_sirets(OfficeAdminRemove, since))
+        self.assertEqual({self.office2.siret}, script.get_changed_sirets(OfficeAdminRemove, None))
+
+
+class RemoveScamEmailsTest(CreateIndexBaseTest):
+    """
+    Test remove_scam_emails().
+    """
+
+    def test_remove_scam_emails(self):
+        with mock.patch.object(script, 'get_latest_scam_emails', return_value=[self.office1.email]):
+            script.remove_scam_emails()
+        self.es.indices.flush(index=settings.ES_INDEX)
+
+        self.assertEqual('', Office.get(self.office1.siret).email)
+        res = self.es.get(index=settings.ES_INDEX, doc_type=es.OFFICE_TYPE, id=self.office1.siret)
+        self.assertEqual('', res['_source']['email'])
+        self.assertEqual('', res['_source']['office_result']['email'])
+
+        # Other offices are left unchanged.
+        res = self.es.get(index=settings.ES_INDEX, doc_type=es.OFFICE_TYPE, id=self.office2.siret)
+        self.assertEqual(self.office2.email, res['_source']['office_result']['email'])
+
+
+class RoutedByDepartementTest(CreateIndexBaseTest):
+    """
+    Test indexing, searching, updating and removing offices routed by departement
+    (see `settings.ES_OFFICES_ROUTED_BY_DEPARTEMENT`).
+    """
+
+    def setUp(self):
+        # The index is created routed by `DatabaseTest.setUp`.
+        patcher = mock.patch.object(settings, 'ES_OFFICES_ROUTED_BY_DEPARTEMENT', True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        super(RoutedByDepartementTest, self).setUp()
+
+    def search_sirets(self, departements):
+        res = self.es.search(
+            index=settings.ES_INDEX,
+            doc_type=es.OFFICE_TYPE,
+            body={'query': {'ids': {'values': [self.office1.siret, self.office2.siret]}}},
+            routing=es.get_search_routing(departements),
+        )
+        return sorted(hit['_id'] for hit in res['hits']['hits'])
+
+    def is_indexed(self, office, routing):
+        return self.es.exists(index=settings.ES_INDEX, doc_type=es.OFFICE_TYPE, id=office.siret, routing=routing)
+
+    def count_docs(self, office):
+        """
+        Number of documents of an office in all the shards of the index.
+        """
+        body = {'query': {'ids': {'values': [office.siret]}}}
+        return self.es.count(index=settings.ES_INDEX, doc_type=es.OFFICE_TYPE, body=body)['count']
+
+    def test_create_offices(self):
+        # The routings of these tests are sent to distinct shards.
+        self.assertTrue(self.is_indexed(self.office1, '57'))
+        self.assertFalse(self.is_indexed(self.office1, '44'))
+        self.assertTrue(self.is_indexed(self.office2, '44'))
+        self.assertFalse(self.is_indexed(self.office2, '57'))
+
+        self.assertEqual([self.office1.siret], self.search_sirets(['57']))
+        self.assertEqual([self.office2.siret], self.search_sirets(['44']))
+        self.assertEqual([self.office1.siret, self.office2.siret], self.search_sirets(['57', '44']))
+
+    def test_update_offices(self):
+        office_to_update = OfficeAdminUpdate(
+            sirets=self.office1.siret,
+            name=self.office1.company_name,
+            new_email="foo@pole-emploi.fr",
+            new_phone=self.office1.tel,
+            new_website=self.office1.website,
+        )
+        office_to_update.save()
+
+        script.update_offices(OfficeAdminUpdate)
+        self.es.indices.flush(index=settings.ES_INDEX)
+
+        res = self.get_office_doc(self.office1)
+        self.assertEqual(res['_source']['email'], "foo@pole-emploi.fr")
+        self.assertEqual(res['_source']['office_result']['email'], "foo@pole-emploi.fr")
+        self.assertEqual([self.office1.siret], self.search_sirets(['57']))
+
+    def test_update_offices_geolocations(self):
+        extra_geolocation = OfficeAdminExtraGeoLocation(
+            siret=self.office1.siret,
+            codes="75110\n13055",  # Paris 10 + Marseille
+        )
+        extra_geolocation.save(commit=True)
+
+        script.update_offices_geolocations()
+        self.es.indices.flush(index=settings.ES_INDEX)
+
+        # The office is moved to the offices with multiple geolocations, which are searched from any departement.
+        res = self.get_office_doc(self.office1, has_multi_geolocations=True)
+        self.assertEqual(3, len(res['_source']['locations']))
+        self.assertFalse(self.is_indexed(self.office1, '57'))
+        self.assertEqual(1, self.count_docs(self.office1))
+        self.assertEqual([self.office1.siret, self.office2.siret], self.search_sirets(['44']))
+
+        extra_geolocation.date_end = datetime.datetime.now() - datetime.timedelta(days=1)
+        extra_geolocation.update()
+
+        script.update_offices_geolocations()
+        self.es.indices.flush(index=settings.ES_INDEX)
+
+        # The office is moved back to its departement.
+        res = self.get_office_doc(self.office1)
+        self.assertEqual(1, len(res['_source']['locations']))
+        self.assertFalse(self.is_indexed(self.office1, es.MULTI_GEOLOCATIONS_ROUTING))
+        self.assertEqual(1, self.count_docs(self.office1))
+        self.assertEqual([self.office2.siret], self.search_sirets(['44']))
+
+    def test_update_offices_delta(self):
+        office_to_update = OfficeAdminUpdate(
+            sirets=self.office1.siret,
+            name=self.office1.company_name,
+            new_email="foo@pole-emploi.fr",
+            new_phone=self.office1.tel,
+            new_website=self.office1.website,
+        )
+        office_to_update.save()
+        office_to_remove = OfficeAdminRemove(
+            siret=self.office2.siret,
+            name=self.office2.company_name,
+            reason="N/A",
+            initiative=False,
+        )
+        office_to_remove.save()
+
+        script.update_offices_delta()
+        self.es.indices.flush(index=settings.ES_INDEX)
+
+        res = self.get_office_doc(self.office1)
+        self.assertEqual(res['_source']['email'], "foo@pole-emploi.fr")
+        self.assertEqual(0, self.count_docs(self.office2))
+        self.assertEqual([self.office1.siret], self.search_sirets(['57', '44']))
+
+    def test_remove_offices(self):
+        OfficeAdminRemove(
+            siret=self.office1.siret,
+            name=self.office1.company_name,
+            reason="N/A",
+            initiative=False,
+        ).save()
+
+        script.remove_offices()
+        self.es.indices.flush(index=settings.ES_INDEX)
+
+        self.assertIsNone(Office.get(self.office1.siret))
+        self.assertEqual(0, self.count_docs(self.office1))
+        self.assertEqual([self.office2.siret], self.search_sirets(['57', '44']))
@@ -13,6 +13,7 @@ from labonneboite.common import sorting
 from labonneboite.common.models import Office
 from labonneboite.common.search import HiddenMarketFetcher
 from labonneboite.conf import settings
+from labonneboite.scripts import create_index
 from labonneboite.tests.web.api.test_api_base import ApiBaseTest
 
 
@@ -178,6 +179,30 @@ class ApiCompanyListTest(ApiBaseTest):
             rv = self.app.get(self.url_for("api.company_list", **params))
             self.assertEqual(rv.status_code, 200)
 
+    def test_hydrate_from_es_gives_same_results(self):
+        # Index the office fields needed to build results, as `create_index` does.
+        for office in Office.query.all():
+            self.es.update(index=settings.ES_INDEX, doc_type=es.OFFICE_TYPE, id=office.siret, body={
+                'doc': {es.OFFICE_RESULT_FIELD: create_index.get_office_result_fields(office)},
+            })
+        self.es.indices.flush(index=settings.ES_INDEX)
+
+        with self.test_request_context():
+            params = self.add_security_params({
+                'commune_id': self.positions['bayonville_sur_mad']['commune_id'],
+                'rome_codes': 'D1405',
+                'user': 'labonneboite',
+            })
+            rv = self.app.get(self.url_for("api.company_list", **params))
+            with mock.patch.object(settings, 'SEARCH_HYDRATE_FROM_ES', True), \
+                    mock.patch.object(HiddenMarketFetcher, '_get_office_records_from_db') as get_office_records_from_db:
+                rv_from_es = self.app.get(self.url_for("api.company_list", **params))
+
+        get_office_records_from_db.assert_not_called()
+        self.assertEqual(rv.status_code, 200)
+        self.assertGreater(self.get_json(rv)['companies_count'], 0)
+        self.assertEqual(rv.data, rv_from_es.data)
+
     def test_unknown_contract(self):
         with self.test_request_context():
             params = self.add_security_params({
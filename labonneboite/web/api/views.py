@@ -12,14 +12,14 @@ from labonneboite.common import mapping as mapping_util
 from labonneboite.common import pagination
 from labonneboite.common import hiring_type_util
 from labonneboite.common.locations import Location
-from labonneboite.common.load_data import ROME_CODES
+from labonneboite.common.load_data import load_rome_codes
 from labonneboite.common.models import Office, OfficeResult
 from labonneboite.common.fetcher import InvalidFetcherArgument
 from labonneboite.common.constants import Scope
 from labonneboite.common.util import get_enum_from_value
 from labonneboite.web.api import util as api_util
 from labonneboite.conf import settings
-from labonneboite.common.search import HiddenMarketFetcher, AudienceFilter, FILTERS, DISTANCE_FILTER_MAX
+from labonneboite.common.search import HiddenMarketFetcher, AudienceFilter, FILTERS
 from flask_cors import cross_origin
 
 apiBlueprint = Blueprint('api', __name__)
@@ -250,25 +250,10 @@ def company_filter_list():
     # Add aggregations
     fetcher.aggregate_by = FILTERS
 
-    _, aggregations = fetcher.get_offices(add_suggestions=False)
-
-    if 'contract' in aggregations:
-        raise ValueError("Error, contract aggregation should only be computed at a later step.")
-
     result = {}
     if fetcher.aggregate_by:
-        result['filters'] = aggregations
-
-        # If a filter or more are selected, the aggregations returned by fetcher.get_offices()
-        # will be filtered too... To avoid that, we are doing additionnal ES calls (one by filter activated).
-        if 'naf_codes' in request.args and 'naf' in fetcher.aggregate_by:
-            result['filters']['naf'] = fetcher.get_naf_aggregations()
-        if 'headcount' in request.args and 'headcount' in fetcher.aggregate_by:
-            result['filters']['headcount'] = fetcher.get_headcount_aggregations()
-        if 'distance' in fetcher.aggregate_by and fetcher.distance != DISTANCE_FILTER_MAX:
-            result['filters']['distance'] = fetcher.get_distance_aggregations()
-        if 'hiring_type' in fetcher.aggregate_by:
-            result['filters']['contract'] = fetcher.get_contract_aggregations()
+        # Each filter is aggregated regardless of its own value, all in a single ES call.
+        result['filters'] = fetcher.get_facets()
 
     result.update(get_result(fetcher, commune_id=None, departments=None, add_url=False, add_count=False))
 
@@ -526,7 +511,7 @@ def get_page_and_page_size(request_args):
 
 def validate_rome_codes(rome_code_list):
     for rome in rome_code_list:
-        if rome not in ROME_CODES:  # ROME_CODES contains ascii data but rome is unicode.
+        if rome not in load_rome_codes():  # ROME codes contain ascii data but rome is unicode.
             msg = 'Unknown rome_code: %s - Possible reasons: 1) %s 2) %s' % (
                 rome, 'This rome_code does not exist.', 'This rome code exists but is very recent and thus \
                     we do not have enough data yet to build relevant results for it. \
@@ -390,7 +390,8 @@ def entreprises():
     alternative_rome_descriptions = fetcher.get_alternative_rome_descriptions()
 
     # If a filter or more are selected, the aggregations returned by fetcher.get_offices()
-    # will be filtered too... To avoid that, we are doing additionnal calls (one by filter activated)
+    # will be filtered too... To avoid that, the facets of the activated filters are computed
+    # again in an additional call.
     if aggregations:
         fetcher.update_aggregations(aggregations)
 